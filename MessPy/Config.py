@@ -13,6 +13,21 @@ class Config:
     conf_path: str = p
     data_directory: Path = Path("C:") / "results"
     testing = False
+    # Replace devices, which fail to initialize, by their mocks
+    mock_failed_devices: bool = False
+    # Record spans of the acquisition, see MessPy.tracing
+    trace: bool = False
+    # Laser repetition rate, the achieved shot rate is compared to it
+    rep_rate_hz: float = 1000.0
+    # Port of the Prometheus metrics endpoint, None to disable it
+    metrics_port: int | None = None
+    # How often a block with lost frames or triggers is read again
+    max_reacquire: int = 2
+    # dtype of the arrays derived from the raw data, "float32" halves memory
+    # traffic and file sizes. Sums and means are accumulated in float64.
+    precision: str = "float64"
+    # Threads of the 2D FFTs, -1 uses all cores
+    fft_workers: int = -1
     last_results: dict = attr.Factory(dict)
 
     def save(self, fname=p):
@@ -25,14 +40,20 @@ class Config:
             d = pickle.load(f)
             return d
 
+    def update_from(self, fname):
+        """Takes the saved values. Fields added after the file was written are
+        missing in its pickle, these keep their defaults."""
+        saved = vars(Config.load(fname))
+        for key in attr.fields_dict(Config):
+            if key in saved:
+                setattr(self, key, saved[key])
+
 
 config = Config()
 config_available = os.path.exists(p)
 if config_available:
     try:
-        f = attr.asdict(Config.load(p))
-        for key, val in f.items():
-            setattr(config, key, val)
+        config.update_from(p)
     except (EOFError, IOError, AttributeError):
         pass
 
@@ -10,7 +10,11 @@ from PySide6.QtCore import QObject, QTimer, Signal, Slot
 
 
 import MessPy.Instruments.interfaces as I
+from MessPy import metrics
+from MessPy.Instruments.motion import watch_device
+from MessPy.Instruments.signal_processing import InvalidBlockError
 from MessPy.Config import config
+from MessPy.tracing import span, tracer
 from MessPy.HwRegistry import (
     _cam,
     _cam2,
@@ -39,6 +43,8 @@ class Cam(QObject):
     shots: int = attrib(init=False)
 
     last_read: T.Optional[I.Reading] = attrib(init=False)
+    # monotonic time of the end of the last reading, for the shot rate
+    last_read_end: T.Optional[float] = attrib(init=False, default=None)
     wavelengths: np.ndarray = attrib(init=False)
     wavenumbers: np.ndarray = attrib(init=False)
     disp_axis: np.ndarray = attrib(init=False)
@@ -52,7 +58,7 @@ class Cam(QObject):
         self.shots = self.cam.shots
         if self.shots > 1000:
             self.set_shots(20)
-        self.read_cam()
+        self.read_block()
         c: I.ICAm = self.cam
         self.channels = c.channels
         self.lines = c.lines
@@ -98,14 +104,45 @@ class Cam(QObject):
         except ValueError:
             pass
 
-    @Slot()
-    def read_cam(self, two_dim=False):
+    def read_block(self) -> I.Reading:
+        """Reads a single block, which may be invalid."""
         logger.trace("Reading cam")
+        t0 = time.monotonic()
         rd = self.cam.make_reading()
+        t1 = time.monotonic()
+        self.update_metrics(rd, t0, t1)
+        if not rd.valid:
+            metrics.invalid_blocks.inc(cam=self.cam.name)
+            logger.warning(f"Invalid block of {self.cam.name}: {rd.reason}")
         self.last_read = rd
-        # self.sigReadCompleted.emit()
         return rd
 
+    @Slot()
+    def read_cam(self, two_dim=False):
+        """Reads a block, blocks with lost frames or triggers are read again
+        up to `config.max_reacquire` times, then `InvalidBlockError` is raised."""
+        for _ in range(config.max_reacquire + 1):
+            rd = self.read_block()
+            if rd.valid:
+                return rd
+        raise InvalidBlockError(
+            f"{self.cam.name}: {config.max_reacquire + 1} invalid blocks, last: {rd.reason}"
+        )
+
+    def update_metrics(self, rd: I.Reading, t0: float, t1: float):
+        name = self.cam.name
+        metrics.reading_seconds.observe(t1 - t0, cam=name)
+        metrics.busy_seconds.inc(t1 - t0, activity="acquire")
+        metrics.shots.inc(rd.shots, cam=name)
+        if rd.rejected_shots:
+            metrics.rejected_shots.inc(rd.rejected_shots, cam=name)
+        # Over the whole cycle, hence the dead time between readings counts
+        cycle = t1 - (self.last_read_end if self.last_read_end is not None else t0)
+        self.last_read_end = t1
+        if cycle > 0:
+            metrics.shot_rate.set(rd.shots / cycle, cam=name)
+            metrics.shot_efficiency.set(rd.shots / cycle / config.rep_rate_hz, cam=name)
+
     def start_two_reading(self):
         pass
 
@@ -156,6 +193,125 @@ class Cam(QObject):
             logger.error("No reference installed")
 
 
+@define(auto_attribs=True, slots=False)
+class GroupReading:
+    """Readings of a `CamGroup`, shot `i` of the block has the global index `first_shot + i`.
+
+    `common` is the global range [start, stop) covered by all cams.
+    """
+
+    readings: T.Dict[str, I.Reading]
+    first_shot: int
+    common: T.Tuple[int, int]
+    starts: T.Dict[str, int]
+    problems: T.List[str]
+
+    @property
+    def aligned(self) -> bool:
+        return not self.problems
+
+    def common_slice(self, name: str) -> slice:
+        """Slice of the shots of cam `name` which all cams have seen."""
+        start = self.common[0] - self.starts[name]
+        return slice(start, start + self.common[1] - self.common[0])
+
+    def aligned_full_data(self, name: str) -> np.ndarray:
+        sl = self.common_slice(name)
+        return np.stack([d[..., sl] for d in self.readings[name].line_data])
+
+
+@define(auto_attribs=True, slots=False)
+class CamGroup:
+    """Reads several cams together and checks that their blocks cover the same laser shots.
+
+    All cams are started together behind a barrier, so they arm on the same
+    trigger. The first read maps the hardware shot counter of each cam
+    (`Reading.first_shot`) onto a global shot index. Later blocks which start
+    at another index than expected mean dropped shots, blocks of different
+    length mean misaligned cams. Cams without a shot counter are assumed to
+    stay in step.
+    """
+
+    cams: T.List[Cam]
+    timeout: float = 30
+    next_shot: int = 0
+    offsets: T.Dict[str, int] = Factory(dict)
+    dropped: T.Dict[str, int] = Factory(dict)
+    misaligned_blocks: int = 0
+    last_read: T.Optional[GroupReading] = None
+
+    def arm(self):
+        """Forget the mapping of the hardware counters, e.g. after changing the shots."""
+        self.offsets.clear()
+
+    def read(self) -> GroupReading:
+        """Reads all cams. If the block of a cam is invalid, all cams read
+        again behind a new barrier, up to `config.max_reacquire` times, then
+        `InvalidBlockError` is raised."""
+        for _ in range(config.max_reacquire + 1):
+            # Checked every time, the invalid blocks used up shots too
+            rd = self.check(self._read_blocks())
+            invalid = {n: r.reason for n, r in rd.readings.items() if not r.valid}
+            if not invalid:
+                return rd
+        raise InvalidBlockError(
+            f"{config.max_reacquire + 1} invalid blocks, last: {invalid}"
+        )
+
+    def _read_blocks(self) -> T.Dict[str, I.Reading]:
+        barrier = threading.Barrier(len(self.cams), timeout=self.timeout)
+        errors = []
+
+        def read_cam(cam: Cam):
+            try:
+                barrier.wait()
+                cam.read_block()
+            except Exception as e:
+                errors.append(e)
+                barrier.abort()
+
+        threads = [threading.Thread(target=read_cam, args=(c,)) for c in self.cams]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+        return {c.name: c.last_read for c in self.cams}
+
+    def check(self, readings: T.Dict[str, I.Reading]) -> GroupReading:
+        first_shot = self.next_shot
+        problems = []
+        starts = {}
+        for name, rd in readings.items():
+            if rd.first_shot is None:
+                starts[name] = first_shot
+                continue
+            offset = self.offsets.setdefault(name, rd.first_shot - first_shot)
+            starts[name] = rd.first_shot - offset
+            if (lost := starts[name] - first_shot) != 0:
+                self.dropped[name] = self.dropped.get(name, 0) + lost
+                if lost > 0:
+                    metrics.dropped_shots.inc(lost, cam=name)
+                problems.append(f"{name}: block starts {lost} shots off")
+        ends = {name: starts[name] + rd.shots for name, rd in readings.items()}
+        if len(set(ends.values())) > 1:
+            problems.append(f"Blocks end at different shots: {ends}")
+        common = (max(starts.values()), min(ends.values()))
+        if problems:
+            self.misaligned_blocks += 1
+            logger.warning("Cams not aligned: " + "; ".join(problems))
+        self.next_shot = max(ends.values())
+        self.last_read = GroupReading(
+            readings=readings,
+            first_shot=first_shot,
+            common=common,
+            starts=starts,
+            problems=problems,
+        )
+        return self.last_read
+
+
 @define(auto_attribs=True, slots=False)
 class DelayLine(QObject):
     _dl: I.IDelayLine = _dl
@@ -179,25 +335,28 @@ class DelayLine(QObject):
             raise
         self.moving = True
         logger.info(f"Moving delay line to {pos_fs} fs")
-        self._dl.move_fs(pos_fs, do_wait=do_wait)
+        fut = self._dl.move_fs(pos_fs, do_wait=False)
+        if fut is None:
+            fut = watch_device(self._dl)
+        fut.add_done_callback(self._move_done)
         if not do_wait:
             self.wait_and_update()
         else:
             logger.info("Waiting for delay line to finish moving")
-            while _dl.is_moving():
-                time.sleep(0.1)
+            fut.result()
             self.moving = False
         self.pos = self._dl.get_pos_fs()
         self.sigPosChanged.emit(self.pos)
 
+    def _move_done(self, fut):
+        self.moving = False
+
     def wait_and_update(self):
-        "Wait until not moving. Do update position while moving"
+        "Update the position until the move is completed."
         self.pos = self._dl.get_pos_fs()
         self.sigPosChanged.emit(self.pos)
-        if self._dl.is_moving():
+        if self.moving:
             QTimer.singleShot(100, self.wait_and_update)
-        else:
-            self.moving = False
 
     def get_pos(self) -> float:
         return self._dl.get_pos_fs()
@@ -248,28 +407,38 @@ class Controller(QObject):
             self.cam_list.append(self.cam2)
         else:
             self.cam2 = None
+        self.cam_group = CamGroup(self.cam_list)
+        for c in self.cam_list:
+            c.sigShotsChanged.connect(self.cam_group.arm)
         self.t1 = None
+        if config.trace:
+            tracer.enabled = True
+        if config.metrics_port is not None and metrics.registry.server is None:
+            metrics.registry.serve(config.metrics_port)
 
     @Slot()
     def start_standard_read(self):
         # t0 = time.time()
-        self.t1 = threading.Thread(target=self.cam.read_cam)
+        read = self.cam_group.read if self.cam2 else self.cam.read_cam
+        self.t1 = threading.Thread(target=self._standard_read, args=(read,))
         self.t1.start()
-        if self.cam2:
-            self.t2 = threading.Thread(target=self.cam2.read_cam)
-            self.t2.start()
+
+    @staticmethod
+    def _standard_read(read: T.Callable):
+        try:
+            read()
+        except InvalidBlockError as e:
+            # Keeps the live view running, the plans handle the error themselves
+            logger.error(f"Standard read: {e}")
 
     def standard_read_running(self):
         return self.t1.is_alive()
 
     def standard_read(self):
         self.t1.join()
-        self.cam.sigReadCompleted.emit()
         # print((time.time()-t0)*1000)
-
-        if self.cam2:
-            self.t2.join()
-            self.cam2.sigReadCompleted.emit()
+        for c in self.cam_list:
+            c.sigReadCompleted.emit()
         self.t1 = None
 
     @Slot()
@@ -282,16 +451,16 @@ class Controller(QObject):
             debugpy.debug_this_thread()
         if self.plan is None or self.pause_plan:
             if self.t1 is None:
-                t0 = time.time()
-                self.start_standard_read()
-                self.standard_read()
-                # logger.info(f"Standard read took {(time.time()-t0)*1000} ms")
+                with span("standard_read", "loop"):
+                    self.start_standard_read()
+                    self.standard_read()
             time.sleep(0.02)
 
         elif hasattr(self.plan, "make_step"):
             try:
                 print("make_step")
-                self.plan.make_step()
+                with span("make_step", "loop", plan=self.plan.plan_shorthand):
+                    self.plan.make_step()
                 time.sleep(0.02)
             except StopIteration:
                 self.pause_plan = True
@@ -308,6 +477,8 @@ class Controller(QObject):
         logger.info(f"Starting plan: {plan.plan_shorthand}:{plan.name}")
         self.plan = plan
         self.pause_plan = False
+        # The trace written at the end covers only this plan
+        tracer.clear()
         self.plan.sigPlanFinished.connect(self.stop_plan)
         self.starting_plan.emit(True)
 
@@ -316,10 +487,22 @@ class Controller(QObject):
         logger.info("Stopping plan")
         if self.plan:
             self.plan.stop_plan()
+            if tracer.enabled:
+                self.export_trace(self.plan)
             self.plan = None
             self.stopping_plan.emit(True)
 
 
+    def export_trace(self, plan: "Plan"):
+        """Writes the recorded spans next to the data of the plan."""
+        try:
+            path = plan.get_file_name()[0].with_suffix(".trace.json")
+            tracer.export_chrome(path)
+            logger.info(f"Trace written to {path}")
+        except (IOError, ValueError) as e:
+            logger.warning(f"Could not write the trace: {e}")
+
+
 if __name__ == "__main__":
     c = Controller()
     print(c)
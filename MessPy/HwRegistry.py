@@ -2,9 +2,12 @@ import platform
 import sys
 from MessPy.Config import config
 from MessPy.Instruments.mocks import CamMock, DelayLineMock, StageMock, PowerMeterMock
+from MessPy.Instruments.signal_processing import warmup_in_background
 from loguru import logger
 
 logger.info("Init HwRegistry")
+# Compile the numba kernels while the hardware initializes, not on the first reading
+_jit_warmup = warmup_in_background()
 TESTING = config.testing
 _cam = None  # CamMock()
 _cam2 = None  # CamMock(name="Mock2")
@@ -14,6 +17,7 @@ _rot_stage = None
 _shutter = []
 _sh = None
 _shaper = None
+_power_meter = None
 
 pc_name = platform.node()
 
@@ -42,91 +46,93 @@ if pc_name == "DESKTOP-RMRQA8D":
     # _dl = DelayLine(name="VisDelay")
 
 elif pc_name == "DESKTOP-BBLLUO7":
+    from functools import partial
 
-    def init_pt():
-        logger.info("Importing and initializing PhaseTecCam")
-        try:
-            from MessPy.Instruments.cam_phasetec import PhaseTecCam
-
-            global _cam
-            _cam = PhaseTecCam()
-            tmp_shots = _cam.shots
-            _cam.set_shots(10)
-            _cam.read_cam()
-            _cam.set_shots(tmp_shots)
+    from MessPy.Instruments.device_registry import DeviceRegistry
+    from MessPy.Instruments.mocks import RotStageMock
 
-        except Exception as e:
-            logger.warning("PhaseTecCam import or testread failed")
-            raise e
-        # _cam = CamMock()
+    registry = DeviceRegistry(mock_failed=config.mock_failed_devices)
 
-    # from MessPy.Instruments.delay_line_apt import DelayLine
-    # _dl = DelayLine(name="VisDelay")
-    # from MessPy.Instruments.delay_dg535 import GeneratorDelayline
+    @registry.device("cam", timeout=60, retries=1, fallback=CamMock, required=True)
+    def init_pt():
+        logger.info("Importing and initializing PhaseTecCam")
+        from MessPy.Instruments.cam_phasetec import PhaseTecCam
 
-    # _dl = GeneratorDelayline(port='COM10')
+        cam = PhaseTecCam()
+        tmp_shots = cam.shots
+        cam.set_shots(10)
+        cam.read_cam()
+        cam.set_shots(tmp_shots)
+        return cam
 
+    # Controller.delay_line needs a delay line, hence it is required
+    @registry.device("delay", timeout=60, retries=1, fallback=DelayLineMock, required=True)
     def init_dl():
         logger.info("Importing and initializing NewportDelay")
         from MessPy.Instruments.delay_line_newport import NewportDelay
 
-        global _dl
-        _dl = NewportDelay(name="IR Delay", pos_sign=-1)
+        return NewportDelay(name="IR Delay", pos_sign=-1)
 
+    @registry.device("aom", timeout=30)
     def init_aom():
         logger.info("Importing and initializing AOM")
-        from MessPy.Instruments.dac_px import AOM, AOMShutter
-
-        try:
-            global _shaper
-            _shaper = AOM(name="AOM")
-            aom_shutter = AOMShutter(aom=_shaper)
-            _shutter.append(aom_shutter)
-            logger.info("Importing and initializing RotationStage")
-            from MessPy.Instruments.RotationStage import RotationStage
-
-            r1 = RotationStage(name="Grating1", comport="COM5")
-            r2 = RotationStage(name="Grating2", comport="COM6")
-            _shaper.rot1 = r1
-            _shaper.rot2 = r2
-            f1 = RotationStage(name="Folding2", comport="COM9", offset=0)
-            f2 = RotationStage(name="Folding1", comport="COM4", offset=0)
-            _shaper.fm1 = f1
-            _shaper.fm2 = f2
-        except Exception as e:
-            logger.warning("Either AOM or Rotation Stage initalization failed")
-            _shaper = None
-            raise e
-
+        from MessPy.Instruments.dac_px import AOM
+
+        return AOM(name="AOM")
+
+    @registry.device("aom_shutter", depends=("aom",))
+    def init_aom_shutter(aom):
+        from MessPy.Instruments.dac_px import AOMShutter
+
+        return AOMShutter(aom=aom)
+
+    def init_rot_stage(name, comport, **kwargs):
+        logger.info(f"Importing and initializing RotationStage {name}")
+        from MessPy.Instruments.RotationStage import RotationStage
+
+        return RotationStage(name=name, comport=comport, **kwargs)
+
+    # Each stage has its own port and homes on its own, homing may take 120 s
+    for key, name, port, kwargs in [
+        ("grating1", "Grating1", "COM5", {}),
+        ("grating2", "Grating2", "COM6", {}),
+        ("folding1", "Folding1", "COM4", dict(offset=0)),
+        ("folding2", "Folding2", "COM9", dict(offset=0)),
+    ]:
+        registry.add(
+            key,
+            partial(init_rot_stage, name, port, **kwargs),
+            timeout=150,
+            retries=1,
+            fallback=partial(RotStageMock, name=name),
+        )
+
+    @registry.device("shaper", depends=("aom", "grating1", "grating2"))
+    def init_shaper(aom, grating1, grating2):
+        aom.rot1 = grating1
+        aom.rot2 = grating2
+        return aom
+
+    @registry.device("folding_mirrors", depends=("shaper", "folding1", "folding2"))
+    def init_folding_mirrors(shaper, folding1, folding2):
+        shaper.fm1 = folding2
+        shaper.fm2 = folding1
+        return folding1, folding2
+
+    @registry.device("topas_shutter", timeout=20)
     def init_topas_shutter():
         logger.info("Importing and initializing TopasShutter")
-        try:
-            from MessPy.Instruments.shutter_topas import TopasShutter
-
-            topas_shutter = TopasShutter()
-            _shutter.append(topas_shutter)
-        except ImportError as e:
-            logger.warning("TopasShutter import failed")
-            raise e
-
-    # Use concurrent.futures to initialize hardware in parallel and
-    # propagate exceptions from worker functions.
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    init_aom()
-    init_funcs = [init_pt, init_dl,  init_topas_shutter]
-    with ThreadPoolExecutor(max_workers=len(init_funcs)) as ex:
-        futures = {ex.submit(f): f.__name__ for f in init_funcs}
-        for fut in as_completed(futures):
-            name = futures[fut]
-            try:
-                fut.result()
-                logger.info(f"Initialization function {name} finished successfully")
-            except Exception as e:
-                logger.exception(
-                    f"Initialization function {name} raised an exception: {e}"
-                )
-                # re-raise so import errors aren't silently swallowed
-                raise
+        from MessPy.Instruments.shutter_topas import TopasShutter
+
+        return TopasShutter()
+
+    devices = registry.init_all()
+    _cam = devices["cam"]
+    _dl = devices["delay"]
+    _shaper = devices["shaper"]
+    _shutter += [
+        s for s in (devices["aom_shutter"], devices["topas_shutter"]) if s is not None
+    ]
     # logger.info("Importing and initializing PhidgetShutter")
     # try:
     #    from MessPy.Instruments.shutter_phidget import PhidgetShutter
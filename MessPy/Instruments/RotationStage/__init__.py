@@ -17,13 +17,15 @@ from functools import cached_property
 from MessPy.Instruments.interfaces import IRotationStage
 from PySide6.QtCore import QObject, Signal, QTimer
 
-import serial
 import attr
 import time
 from threading import Lock
 
 from loguru import logger
 
+from MessPy.Instruments.motion import watch_device
+from MessPy.Instruments.serial_manager import SerialPort, get_port
+
 try:
     rs.s.close()
 except NameError:
@@ -49,6 +51,12 @@ controller_states = {
 }
 
 
+def parse_state(ans: bytes) -> str:
+    s = ans.decode()
+    state = s[s.find("MM") + 2 :].upper().replace(" ", "0")
+    return controller_states[state]
+
+
 class RotSignals(QObject):
     sigDegreesChanged = Signal(float)
     sigMovementStarted = Signal(float, float)
@@ -65,8 +73,14 @@ class RotationStage(IRotationStage):
     signals: RotSignals = attr.Factory(RotSignals)
 
     @cached_property
-    def rot(self):
-        return serial.Serial(self.comport, baudrate=115200 * 8, xonxoff=True, timeout=2)
+    def port(self) -> SerialPort:
+        return get_port(
+            self.comport,
+            baudrate=115200 * 8,
+            timeout=2,
+            echoes_command=True,
+            serial_kwargs=dict(xonxoff=True),
+        )
 
     def __attrs_post_init__(self):
         super(RotationStage, self).__attrs_post_init__()
@@ -80,15 +94,12 @@ class RotationStage(IRotationStage):
         elif state.startswith("NOT REFERENCED"):
             #self.w(b"1RS")
             self.w("1OR")
-            time.sleep(0.3)
             logger.info("Start Homing")
-            
-            while True:
-                state = self.controller_state()
-                print(state)                
-                time.sleep(0.3)
-                if state.startswith('READY'):
-                    break
+            watch_device(
+                self,
+                timeout=120,
+                is_moving=lambda: not self.controller_state().startswith("READY"),
+            ).result()
             logger.info("Homing finnished")
         logger.info(f"State after init: {self.controller_state()}, Postion: {self.get_degrees()}")
         #if self.last_pos != 0:
@@ -96,10 +107,7 @@ class RotationStage(IRotationStage):
 
     def w(self, x):
         assert x is not bytes
-
-        writer_str = f"{x}\r\n"
-        self.rot.write(writer_str.encode("utf-8"))
-        #self.rot.timeout = 1
+        self.port.write(x)
 
     def set_degrees(self, pos):
         """Set absolute position of the roatation stage"""
@@ -114,14 +122,25 @@ class RotationStage(IRotationStage):
 
         self.signals.sigMovementStarted.emit(pos, cur_pos)
         self._checker = QTimer.singleShot(100, self.check_moving)
-        
-    def check_moving(self):
-        if (moving :=  self.is_moving()):
-            self.signals.sigDegreesChanged.emit(self.get_degrees())
-            QTimer.singleShot(200, self.check_moving)
 
+    def check_moving(self, state_fut=None, pos_fut=None):
+        """Polls the stage without blocking the event loop, the queries run
+        on the I/O thread of the port and are picked up by the next timer tick."""
+        if state_fut is None:
+            state_fut = self.port.query("1MM?")
+            pos_fut = self.port.query("1TP")
+        if not (state_fut.done() and pos_fut.done()):
+            QTimer.singleShot(10, lambda: self.check_moving(state_fut, pos_fut))
+            return
+        try:
+            moving = parse_state(state_fut.result()).startswith("MOVING")
+            self.signals.sigDegreesChanged.emit(self._parse_degrees(pos_fut.result()))
+        except (IOError, TimeoutError, KeyError, ValueError) as e:
+            logger.warning(f"{self.name}: Polling failed {e!r}")
+            moving = True
+        if moving:
+            QTimer.singleShot(200, self.check_moving)
         else:
-            self.signals.sigDegreesChanged.emit(self.get_degrees())
             self.signals.sigMovementFinished.emit()
 
 
@@ -129,22 +148,19 @@ class RotationStage(IRotationStage):
         return dict(last_pos=self.last_pos)
 
     def controller_state(self) -> str:
-        with self.lock:
-            self.w("1MM?")        
-            ans = self.rot.read_until(b"\r\n").decode()
+        ans = self.port.ask("1MM?")
         logger.debug("Asked for stateL Got ans %s"%ans)
-        state = ans[ans.find("MM") + 2 : -2].upper()
-        state = state.replace(" ", "0")
-        return controller_states[state]
+        return parse_state(ans)
+
+    def _parse_degrees(self, ans: bytes) -> float:
+        s = ans.decode()
+        return float(s[s.find("TP") + 2 :]) - self.offset
 
     def get_degrees(self):
         """Returns the position"""
-        with self.lock:
-            self.w("1TP")        
-            ans = self.rot.read_until(b"\r\n")
+        ans = self.port.ask("1TP")
         logger.debug("Asked for pos. Got ans %s"%ans)
-        ans = ans.decode()
-        return float(ans[ans.find("TP") + 2 : -2]) - self.offset
+        return self._parse_degrees(ans)
 
     def is_moving(self):
         return self.controller_state().startswith("MOVING")
@@ -0,0 +1,30 @@
+"""Ahead-of-time compiles the signal processing kernels.
+
+Builds the `_signal_processing_aot` extension next to this file for the
+signatures in `KERNEL_SIGNATURES`. If the extension exists,
+`signal_processing` uses it for these signatures, hence there is no JIT
+compilation at all. The AOT kernels run on a single core, since `prange`
+is not parallelized ahead of time.
+
+    python -m MessPy.Instruments._build_signal_processing
+"""
+
+from pathlib import Path
+
+from numba.pycc import CC
+
+from MessPy.Instruments.signal_processing import KERNEL_SIGNATURES, aot_name
+
+cc = CC("_signal_processing_aot")
+cc.output_dir = str(Path(__file__).parent)
+
+
+def build():
+    for kernel, sigs in KERNEL_SIGNATURES.items():
+        for i, sig in enumerate(sigs):
+            cc.export(aot_name(kernel, i), sig)(kernel.py_func)
+    cc.compile()
+
+
+if __name__ == "__main__":
+    build()
@@ -1,4 +1,3 @@
-import time
 from threading import Lock
 import attr
 import numpy as np
@@ -69,30 +68,30 @@ class AvaCam(ICam):
     ) -> T.Tuple[T.Dict[str, Spectrum], T.Any]:
         # print('Starting', self.shots)
         s = self._spec
-        self.lock.acquire(timeout=1)
-        self._spec.start_reading(self.shots, self._spec.callback_factory())
-        while self._spec.is_reading:
-            time.sleep(0.010)
-
-        s.data = s.data[208:1981, :]
+        with self.lock:
+            if not s.is_continuous:
+                s.start_continuous(self.shots)
+            block, analog_in = s.next_block()
+        data = block.T[208:1981, :]
 
         if self.background is not None:
-            self._spec.data -= self.background[:, None]
-        self.lock.release()
-        ff = int(self._spec.analog_in[0] < 100)
+            data = data - self.background[:, None]
+        chopper = analog_in >= 100
+        ff = int(not chopper[0])
 
-        spec = Spectrum.create(
-            self._spec.data, name="Probe", frames=frames, first_frame=ff
-        )
+        spec = Spectrum.create(data, name="Probe", frames=frames, first_frame=ff)
         # if ff == 0:
         # spec.signal *= -1
-        return {"Probe": spec}, self._spec.chopper
+        return {"Probe": spec}, chopper
 
     def set_shots(self, shots):
-        self.lock.acquire()
-        self.shots = shots
-        self._spec.shots = shots
-        self.lock.release()
+        with self.lock:
+            self.shots = shots
+            self._spec.start_continuous(shots)
+
+    def discard_blocks(self):
+        if self._spec.ring is not None:
+            self._spec.ring.discard()
 
     def set_background(self, shots):
         tmp = self.shots
@@ -115,3 +114,7 @@ class AvaCam(ICam):
 
     def get_wavelength_array(self, center_wl):
         return self._spec.wl[208:1981]
+
+    def shutdown(self):
+        if self._spec.is_continuous:
+            self._spec.stop_continuous()
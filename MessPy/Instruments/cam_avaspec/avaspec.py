@@ -15,6 +15,8 @@ from nicelib import (
 
 from serial import Serial
 
+from MessPy.Instruments.shot_ring import ShotRing
+
 
 @RetHandler(num_retvals=0)
 def ret_errcode(retval, funcargs, niceobj):
@@ -114,6 +116,11 @@ class AvantesSpec:
     port: Optional[str] = "COM3"
     ardudino: Optional[Serial] = attr.attrib()
 
+    # Continuous mode, see `start_continuous`.
+    n_buffers: int = 4
+    is_continuous: bool = False
+    ring: Optional[ShotRing] = None
+
     @classmethod
     def take_nth(cls, i=0):
         Avaspec.Init(0)
@@ -207,6 +214,63 @@ class AvantesSpec:
         self._cb = callback
         return callback
 
+    def start_continuous(self, shots: int):
+        """Measures without stopping and collects the scans into blocks.
+
+        The driver callback writes each scan into `ring`, together with the
+        analog input read from the arduino, which also triggers the shots. The
+        arduino is armed for `shots` triggers at the start and again after each
+        completed block.
+        """
+        if self.is_reading:
+            self.stop_continuous()
+        ffi = Avaspec._ffi
+        self.shots = shots
+        self.measurement_settings.store_to_ram = 0
+        self.device.PrepareMeasure(self.measurement_settings.make_struct(ffi))
+        self.ring = ShotRing(
+            shots=shots,
+            pixel=2048,
+            n_buffers=self.n_buffers,
+            name="Avaspec",
+            on_block=self.arm_arduino,
+        )
+
+        @ffi.callback("void(long*, int*)")
+        def callback(handle, intp):
+            scope_data = self.device.GetScopeData()[1]
+            analog_in = 0
+            if self.ardudino is not None:
+                c, analog_in = self.ardudino.read(2)
+            self.ring.add_shot(scope_data, analog_in)
+
+        self._cb = callback
+        self.is_reading = True
+        self.is_continuous = True
+        if self.ardudino is not None:
+            self.ardudino.flushInput()
+        # A negative number of measurements measures until StopMeasure.
+        Avaspec.AVS_MeasureCallback(self.device._handles[0], callback, -1)
+        self.arm_arduino()
+
+    def arm_arduino(self):
+        if self.ardudino is not None:
+            self.ardudino.write(b"%d\n" % self.shots)
+
+    def stop_continuous(self):
+        self.device.StopMeasure()
+        self.is_reading = False
+        self.is_continuous = False
+
+    def next_block(self, timeout: float = 5) -> Tuple[np.ndarray, np.ndarray]:
+        """Waits for the next block of the continuous measurement.
+
+        Returns copies of the (shots, pixel) data and the (shots,) analog
+        input of the arduino. Raises `queue.Empty` after `timeout` seconds.
+        """
+        assert self.ring is not None
+        return self.ring.next_block(timeout=timeout)
+
 
 if __name__ == "__main__":
     from PySide6.QtCore import QTimer
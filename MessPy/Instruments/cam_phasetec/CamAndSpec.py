@@ -1,11 +1,10 @@
-import concurrent
-import concurrent.futures
 from math import log
 from pathlib import Path
 from typing import ClassVar, Dict, List, Optional, Tuple
 
 import attr
 import numpy as np
+from loguru import logger
 from PySide6.QtCore import Signal, Slot
 from scipy.stats import trim_mean
 
@@ -16,9 +15,13 @@ from MessPy.Instruments.signal_processing import (
     Reading,
     Reading2D,
     Spectrum,
+    check_pattern,
     fast_col_mean,
     first,
+    n_rejected,
+    outlier_mask,
 )
+from MessPy.tracing import span
 
 LOG10 = log(10)
 PROBE_CENTER = 85
@@ -69,6 +72,8 @@ class PhaseTecCam(ICam):
     can_validate_pixel: bool = True
     valid_pixel: Optional[dict[str, np.ndarray]] = None
     frame_channel: int = 0
+    sync_error: Optional[str] = None
+    "Why the last block is out of sync, None if it is fine"
     _cam: Cam = attr.ib(factory=Cam)
     darklevel: int = 0
     amplification: int = 7
@@ -118,12 +123,14 @@ class PhaseTecCam(ICam):
         self, frames=None, **kwargs
     ) -> Tuple[Dict[str, Spectrum], np.ndarray]:
 
-        arr, ch = self._cam.read_cam(back=self.background, lines=self.rows)
+        with span("acquire", "cam"):
+            arr, ch = self._cam.read_cam(back=self.background, lines=self.rows)
 
         if frames is not None:
             first_frame: int = first(np.array(ch[self.frame_channel]), 1)
         else:
             first_frame = 0
+        self.check_block(ch, frames, first_frame)
 
         spectra = {}
         means = {}
@@ -151,13 +158,31 @@ class PhaseTecCam(ICam):
             )
         return spectra, ch
 
+    def check_block(self, ch, frames: Optional[int], first_frame: int) -> Optional[str]:
+        """Sets `sync_error` if frames or triggers were lost in the last block."""
+        problems = [self._cam.sync_error] if self._cam.sync_error else []
+        if frames is not None and frames > 1:
+            if pattern := check_pattern(ch[self.frame_channel], frames, first_frame):
+                problems.append(pattern)
+        self.sync_error = "; ".join(problems) or None
+        if self.sync_error:
+            start = self._cam.first_shot
+            logger.warning(f"Block starting at frame {start}: {self.sync_error}")
+        return self.sync_error
+
     def make_reading(self, frame_data=None) -> Reading:
         d, ch = self.get_spectra(frames=2, get_max=True)
+        # From the frame counter of the grabber, hence lost frames show up as a gap
+        first_shot = self._cam.first_shot
         probe = d["Probe1"]
         ref = d["Ref"]
+        # Outliers are left out in pairs of shots, hence the chopper phase is kept
+        lines = [d[name].data for name in ("Probe1", "Probe2", "Ref")]
+        keep = outlier_mask(lines, self.outlier_mad)
+        probe_data, probe2_data, ref_data = (line[:, keep] for line in lines)
 
         with np.errstate(invalid="ignore", divide="ignore"):
-            normed = probe.data / ref.data
+            normed = probe_data / ref_data
             norm_std = 100 * np.nanstd(normed, 1) / np.nanmean(normed, 1)
 
             n = first(ch[0], 1)
@@ -170,19 +195,22 @@ class PhaseTecCam(ICam):
             not_pu = trim_mean(normed[:, 1::2], 0.2, 1)
 
             sig = f * np.log10(pu / not_pu)
-            sig_noref = d["Probe1"].signal
+            # From the kept shots too, with the same split and sign
+            sig_noref = f * np.log10(
+                trim_mean(probe_data[:, ::2], 0.2, 1) / trim_mean(probe_data[:, 1::2], 0.2, 1)
+            )
 
             # print(sig.shape, ref_mean.shape, norm_std.shape, probe_mean.shape)
 
             probe2 = d["Probe2"]
-            normed2 = probe2.data / ref.data
+            normed2 = probe2_data / ref_data
 
             if self.beta1 is not None:
                 # ref calibration available
                 assert self.beta2 is not None
-                dp = probe.data[:, ::2] - probe.data[:, 1::2]
-                dp2 = probe2.data[:, ::2] - probe2.data[:, 1::2]
-                dr = ref.data[::1, ::2] - ref.data[::1, 1::2]
+                dp = probe_data[:, ::2] - probe_data[:, 1::2]
+                dp2 = probe2_data[:, ::2] - probe2_data[:, 1::2]
+                dr = ref_data[::1, ::2] - ref_data[::1, 1::2]
                 dp = dp - self.beta1.T @ dr
                 dp2 = dp2 - self.beta2.T @ dr
 
@@ -194,18 +222,21 @@ class PhaseTecCam(ICam):
                 not_pu2 = trim_mean(normed2[:, 1::2], 0.2, 1)
                 sig_pr2 = -f * np.log10(pu2 / not_pu2)
 
-            pu2 = trim_mean(probe2.data[:, ::2], 0.2, 1)
-            not_pu2 = trim_mean(probe2.data[:, 1::2], 0.2, 1)
+            pu2 = trim_mean(probe2_data[:, ::2], 0.2, 1)
+            not_pu2 = trim_mean(probe2_data[:, 1::2], 0.2, 1)
 
-            sig_pr2_noref = probe2.signal  # f * np.log10(pu2 / not_pu2)
+            sig_pr2_noref = f * np.log10(pu2 / not_pu2)
 
             reading = Reading(
                 lines=np.stack((probe.mean, probe2.mean, ref.mean, probe.max)),
                 stds=np.stack((probe.std, probe2.std, ref.std, norm_std)),
                 signals=np.stack((sig_noref, sig, sig_pr2_noref, sig_pr2)),
-                full_data=np.stack((probe.data, probe2.data, ref.data)),
+                full_data=(probe.data, probe2.data, ref.data),
                 shots=self.shots,
-                valid=True,
+                valid=self.sync_error is None,
+                first_shot=first_shot,
+                reason=self.sync_error,
+                rejected_shots=n_rejected(keep),
             )  #
         return reading
 
@@ -218,16 +249,12 @@ class PhaseTecCam(ICam):
     ) -> tuple[Dict[str, Reading2D], Dict[str, Spectrum]]:
         spectra, ch = self.get_spectra(frames=self.shots // repetitions, get_max=False)
 
-        two_d_data = {}
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            for name in ("Probe1", "Probe2"):
-                future = executor.submit(
-                    Reading2D.from_spectrum, spectra[name], t2, rot_frame, save_frames
-                )
-                two_d_data[name] = future
-            for name in ("Probe1", "Probe2"):
-                two_d_data[name] = two_d_data[name].result()
-            two_d_data["Ref"] = spectra["Ref"]
+        names = ("Probe1", "Probe2")
+        two_d = Reading2D.from_spectra(
+            [spectra[name] for name in names], t2, rot_frame, save_frames
+        )
+        two_d_data = dict(zip(names, two_d))
+        two_d_data["Ref"] = spectra["Ref"]
         self.two_d_data_ = two_d_data
         return two_d_data, spectra
 
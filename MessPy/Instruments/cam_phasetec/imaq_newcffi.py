@@ -7,6 +7,8 @@ import nidaqmx
 import nidaqmx.constants as c
 import numpy as np
 
+from MessPy.Instruments.frame_sync import FrameSync
+
 try:
     from _imaqffi import ffi, lib
 except ModuleNotFoundError:
@@ -81,7 +83,9 @@ class Cam:
         self.reading_lock = Lock()
         self.i, self.s = self.init_imaq()
         self.task = self.init_nidaqmx()
-        self.frames: int = 0
+        self.sync = FrameSync(name="Phasetec")
+        # Problem of the last block found by `check_sync`, None if it is complete
+        self.sync_error: Optional[str] = None
 
         if (p := (pathlib.Path(__file__).parent / "back.npy")).exists():
             self.background = np.load(p)
@@ -207,7 +211,7 @@ class Cam:
         IMAQ.imgSequenceSetup(
             self.s, shots, ffi.cast("void **", self.buflist), self.skiplist, 0, 0
         )
-        self.frames = 0
+        self.sync.reset()
         self.shots = shots
         self.reading_lock.release()
 
@@ -255,7 +259,7 @@ class Cam:
         dp_arr = ffi.new("int[]", dead_pixel_list)
         lib.read_n_shots(
             self.shots,
-            self.frames,
+            self.sync.frames,
             self.s,
             outp,
             line_num,
@@ -266,7 +270,6 @@ class Cam:
             len(dead_pixel_list),
         )
 
-        self.frames += self.shots
         if lines:
             self.lines = self.lines.transpose()
         if back is not None:
@@ -274,9 +277,26 @@ class Cam:
         chop = self.task.read(c.READ_ALL_AVAILABLE)
         self.data = self.data
         self.task.stop()
+        self.sync_error = self.check_sync(chop, self.get_frame_count())
         self.reading_lock.release()
         return self.data, chop
 
+    @property
+    def first_shot(self) -> int:
+        return self.sync.first_shot
+
+    def check_sync(self, chop: list, last_frame: int) -> Optional[str]:
+        """Compares the frame counter of the grabber and the number of samples
+        of the NI card with the frames we expect after the block. After a lost
+        frame the count follows the grabber again, see `FrameSync`."""
+        problems = []
+        # IMG_LAST_FRAME is the buffer number of the newest acquired frame
+        if lag_problem := self.sync.end_block(self.shots, last_frame):
+            problems.append(lag_problem)
+        if (n := len(chop[0])) != self.shots:
+            problems.append(f"{n} chopper samples for {self.shots} shots")
+        return "; ".join(problems) or None
+
     def remove_background(self):
         self.background = None
 
@@ -8,6 +8,7 @@ from typing import TYPE_CHECKING, Tuple
 import attr
 import numpy as np
 
+from MessPy.tracing import traced
 from MessPy.Instruments.dac_px.shaper_calculations import (
     double_pulse_mask,
     delay_scan_mask,
@@ -252,6 +253,7 @@ class AOM(IDevice):
                                phase=np.zeros((PIXEL, 1)))
         self.generate_waveform()
 
+    @traced("AOM generate_waveform", "aom")
     def generate_waveform(self) -> int:
         """
         Actually generates the waveform from set phase and amp. If turned on,
@@ -318,6 +320,7 @@ class AOM(IDevice):
             self.amp_fac = f
             self.load_mask()
 
+    @traced("AOM load_mask", "aom")
     def load_mask(self, mask=None):
         if mask is not None:
             self.mask = mask
@@ -14,10 +14,13 @@ Created on Tue Jun 03 15:41:22 2014
 
 
 import time
+from concurrent.futures import Future
+
 import attr
-import serial
 from PySide6.QtCore import QObject, Signal, QTimer, QMutex, QMutexLocker
 from MessPy.Instruments.interfaces import IDelayLine
+from MessPy.Instruments.motion import watch_device
+from MessPy.Instruments.serial_manager import SerialPort, get_port
 
 
 controller_states = {
@@ -45,6 +48,13 @@ controller_states = {
 }
 
 
+def parse_state(ans: bytes) -> str:
+    """Translates the answer to `1MM?` into the controller state."""
+    s = ans.decode()
+    state = s[s.find("MM") + 2 :].upper().replace(" ", "0")
+    return controller_states[state]
+
+
 class DSignals(QObject):
     sigDegreesChanged = Signal(float)
     sigMovementStarted = Signal()
@@ -55,7 +65,7 @@ class DSignals(QObject):
 class NewportDelay(IDelayLine):
     name: str = "Newport AGP stage"
     comport: str = "COM7"
-    rot: serial.Serial = attr.ib()
+    port: SerialPort = attr.ib()
     last_pos: float = 0
     pos_sign = -1.0
     min_pos_mm: float = 0.0
@@ -68,11 +78,15 @@ class NewportDelay(IDelayLine):
     the controller sometimes answers wrongly after calling a move.
     """
 
-    @rot.default
-    def _default_rs(self):
-        rot = serial.Serial(self.comport, baudrate=115200 * 8, xonxoff=1)
-        rot.timeout = 3
-        return rot
+    @port.default
+    def _default_port(self):
+        return get_port(
+            self.comport,
+            baudrate=115200 * 8,
+            timeout=3,
+            echoes_command=True,
+            serial_kwargs=dict(xonxoff=1),
+        )
 
     def __attrs_post_init__(self):
         super(NewportDelay, self).__attrs_post_init__()
@@ -81,48 +95,44 @@ class NewportDelay(IDelayLine):
             if state.startswith("DISABLE"):
                 self.w("1MM1")
             elif state.startswith("NOT REFERENCED"):
-                self.w(b"1RS")
-                self.rot.write(b"1OR\r\n")
-                while self.controller_state().startswith("HOMING"):
-                    time.sleep(0.3)
+                self.w("1RS")
+                self.w("1OR")
+                watch_device(
+                    self,
+                    timeout=60,
+                    is_moving=lambda: self.controller_state().startswith("HOMING"),
+                ).result()
 
         if self.last_pos != 0:
             self.move_mm(self.last_pos)
 
     def w(self, x):
-        writer_str = f"{x}\r\n"
-        self.rot.write(writer_str.encode("utf-8"))
-        self.rot.timeout = 1
+        self.port.write(x)
 
     def move_mm(self, pos):
         """Set absolute position of the roatation stage"""
         if isinstance(pos, str):
             pos = float(pos)
-        setter_str = f"1PA{pos}\r\n"
         with QMutexLocker(self.lock):
-            self.rot.write(setter_str.encode("utf-8"))
-            self.rot.timeout = 3
+            self.w(f"1PA{pos}")
             self._busy_cnt = 2
 
     def get_state(self) -> dict:
         return dict(last_pos=self.last_pos, home_pos=self.home_pos)
 
     def controller_state(self) -> str:
-        self.w("1MM?")
-        ans = self.rot.read_until(b"\r\n").decode()
-        state = ans[ans.find("MM") + 2 : -2].upper()
-        state = state.replace(" ", "0")
-        return controller_states[state]
+        return parse_state(self.port.ask("1MM?"))
+
+    def query_controller_state(self) -> Future:
+        """Non-blocking `controller_state`, the future resolves to the raw answer."""
+        return self.port.query("1MM?")
 
     def get_pos_mm(self):
         """Returns the position"""
         with QMutexLocker(self.lock):
-            self.w("1TP")
-            self.rot.timeout = 1
+            ans = self.port.ask("1TP", timeout=1).decode()
             try:
-                ans = self.rot.read_until(b"\r\n")
-                ans = ans.decode()
-                self.last_pos = float(ans[ans.find("TP") + 2 : -2])
+                self.last_pos = float(ans[ans.find("TP") + 2 :])
                 return self.last_pos
             except ValueError:
                 print(ans)
@@ -144,9 +154,7 @@ if __name__ == "__main__":
     print(rs.get_pos_mm())
     print(rs.controller_state())
     rs.move_mm(25)
-    rs.w("1SR?")
-    print(rs.rot.readall())
-    rs.w("1SL?")
-    print(rs.rot.readall())
+    print(rs.port.ask("1SR?"))
+    print(rs.port.ask("1SL?"))
     print(rs.controller_state())
 # rs.set_pos(1)
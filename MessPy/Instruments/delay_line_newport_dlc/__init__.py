@@ -1,7 +1,7 @@
-import time
 from typing import Literal
 from MessPy.Instruments.interfaces import IDelayLine
-from serial import Serial
+from MessPy.Instruments.motion import watch_device
+from MessPy.Instruments.serial_manager import SerialPort, get_port
 import attr
 
 
@@ -49,23 +49,21 @@ SHORT_STATES = Literal['NOT_REFERENCED', 'READY', 'JOGGING',
 class NewportDLC(IDelayLine):
     name: str = 'Newport DLC'
     port: str = 'COM8'
-    serial: Serial = attr.ib()
+    serial: SerialPort = attr.ib()
 
     @serial.default
     def _default_serial(self):
-        return Serial(self.port, baudrate=115200 * 4)
+        return get_port(self.port, baudrate=115200 * 4)
 
     def __attrs_post_init__(self):
         super(NewportDLC, self).__attrs_post_init__()
         if self.controller_state() != 'READY':
             if self.controller_state() == 'NOT INITIALIZED':
                 self.write('IE')
-                while self.controller_state() == 'INITIALAZING':
-                    time.sleep(0.1)
+                self.wait_while_state('INITIALAZING')
             if self.controller_state() == 'NOT_REFERENCED':
                 self.write('OR')
-                while self.controller_state() == 'HOMING':
-                    time.sleep(0.1)
+                self.wait_while_state('HOMING')
             if self.controller_state() == "DISABLE":
                 self.write('MM1')
 
@@ -73,26 +71,33 @@ class NewportDLC(IDelayLine):
         """
         Writes a command to the controller.
         """
-        self.serial.write((cmd+'\r\n').encode())
+        self.serial.write(cmd)
 
-    def read(self) -> str:
-        return self.serial.read_until(b'\r\n').decode().strip()
+    def ask(self, cmd: str) -> str:
+        """
+        Sends a query and waits for the answer.
+        """
+        return self.serial.ask(cmd).decode().strip()
 
     def controller_state(self) -> SHORT_STATES:
         """
         Returns the current controller state.
         """
-        self.write('TS')
-        state = self.read()
-        print(state)
+        state = self.ask('TS')
         return MAIN_STATES[state[-2:]]
 
+    def wait_while_state(self, state: SHORT_STATES, timeout: float = 60):
+        """
+        Waits until the controller left the given state.
+        """
+        watch_device(self, timeout=timeout,
+                     is_moving=lambda: self.controller_state() == state).result()
+
     def is_moving(self) -> bool:
         return self.controller_state() == 'MOVING'
 
     def get_pos_mm(self) -> float:
-        self.write('TP?')
-        return float(self.read()[2:])
+        return float(self.ask('TP?')[2:])
 
     def move_mm(self, mm: float, *args, **kwargs):
         self.write(f'PA{mm:.3f}')
@@ -0,0 +1,206 @@
+"""Declarative initialization of the hardware.
+
+Each device is described by a `DeviceSpec`: a factory, the names of the
+devices it depends on, a timeout and the number of retries. `DeviceRegistry`
+initializes all devices whose dependencies are ready concurrently, hence the
+slow devices (homing stages, cams doing a test read) do not wait for each
+other. Failing devices are replaced by their `fallback`, if given and
+`mock_failed` is set, else they and their dependents are left out. The timing
+of the startup is written to the log as a waterfall including the critical
+path.
+"""
+
+import threading
+import time
+import typing as T
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import attr
+from loguru import logger
+
+
+@attr.s(auto_attribs=True)
+class DeviceSpec:
+    name: str
+    factory: T.Callable[..., T.Any]
+    """Called with the dependencies as keyword arguments."""
+    depends: T.Tuple[str, ...] = ()
+    timeout: T.Optional[float] = None
+    """Per attempt. A timed-out attempt can't be killed, hence it is abandoned
+    and not retried, a second attempt would compete for the same hardware."""
+    retries: int = 0
+    fallback: T.Optional[T.Callable[[], T.Any]] = None
+    required: bool = False
+    """A failure of a required device raises after all devices are done."""
+
+
+@attr.s(auto_attribs=True)
+class InitRecord:
+    name: str
+    start: float = 0.0
+    end: float = 0.0
+    status: T.Literal["ok", "mock", "failed", "skipped"] = "ok"
+    attempts: int = 0
+    error: T.Optional[BaseException] = None
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def _start_attempt(func: T.Callable[[], T.Any]) -> Future:
+    """Runs `func` in a daemon thread, which outlives a timeout."""
+    fut: Future = Future()
+
+    def run():
+        try:
+            fut.set_result(func())
+        except BaseException as e:
+            fut.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return fut
+
+
+@attr.s(auto_attribs=True)
+class DeviceRegistry:
+    specs: T.Dict[str, DeviceSpec] = attr.Factory(dict)
+    mock_failed: bool = False
+    max_workers: int = 8
+    devices: T.Dict[str, T.Any] = attr.Factory(dict)
+    records: T.Dict[str, InitRecord] = attr.Factory(dict)
+    t0: float = 0.0
+
+    def add(self, name: str, factory: T.Callable[..., T.Any], **kwargs) -> DeviceSpec:
+        spec = DeviceSpec(name, factory, **kwargs)
+        self.specs[name] = spec
+        return spec
+
+    def device(self, name: str, **kwargs):
+        """Decorator version of `add`."""
+
+        def deco(factory):
+            self.add(name, factory, **kwargs)
+            return factory
+
+        return deco
+
+    def _check(self):
+        for spec in self.specs.values():
+            for d in spec.depends:
+                if d not in self.specs:
+                    raise ValueError(f"{spec.name} depends on unknown device {d}")
+        # Detect cycles by repeatedly removing the devices without open deps
+        open_deps = {n: set(s.depends) for n, s in self.specs.items()}
+        while open_deps:
+            ready = [n for n, deps in open_deps.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependency cycle between {sorted(open_deps)}")
+            for n in ready:
+                del open_deps[n]
+            for deps in open_deps.values():
+                deps.difference_update(ready)
+
+    def _init_one(self, spec: DeviceSpec, rec: InitRecord):
+        rec.start = time.monotonic()
+        kwargs = {d: self.devices[d] for d in spec.depends}
+        try:
+            for rec.attempts in range(1, spec.retries + 2):
+                attempt = _start_attempt(lambda: spec.factory(**kwargs))
+                try:
+                    return attempt.result(spec.timeout)
+                except Exception as e:
+                    rec.error = e
+                    logger.warning(
+                        f"{spec.name}: attempt {rec.attempts} failed: {e!r}"
+                    )
+                    if not attempt.done():
+                        logger.warning(f"{spec.name}: timed out attempt still running, no retry")
+                        break
+            if self.mock_failed and spec.fallback is not None:
+                logger.warning(f"{spec.name}: using the fallback")
+                try:
+                    dev = spec.fallback()
+                    rec.status = "mock"
+                    return dev
+                except Exception as e:
+                    logger.exception(e)
+            rec.status = "failed"
+            return None
+        finally:
+            rec.end = time.monotonic()
+
+    def init_all(self) -> T.Dict[str, T.Any]:
+        """Initializes all devices, returns them by name.
+
+        Failed and skipped devices are `None`."""
+        self._check()
+        self.devices, self.records = {}, {}
+        self.t0 = time.monotonic()
+        pending = dict(self.specs)
+        finished: T.Set[str] = set()
+        running: T.Dict[Future, str] = {}
+        with ThreadPoolExecutor(self.max_workers, thread_name_prefix="init") as ex:
+            while pending or running:
+                for name, spec in list(pending.items()):
+                    if not finished.issuperset(spec.depends):
+                        continue
+                    del pending[name]
+                    rec = self.records[name] = InitRecord(name)
+                    deps = [self.records[d] for d in spec.depends]
+                    if any(r.status in ("failed", "skipped") for r in deps):
+                        rec.start = rec.end = time.monotonic()
+                        rec.status = "skipped"
+                        self.devices[name] = None
+                        finished.add(name)
+                        continue
+                    running[ex.submit(self._init_one, spec, rec)] = name
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    self.devices[name] = fut.result()
+                    finished.add(name)
+        logger.info(self.waterfall())
+        failed = [
+            n for n, r in self.records.items()
+            if r.status == "failed" and self.specs[n].required
+        ]
+        if failed:
+            raise RuntimeError(
+                f"Initialization of {', '.join(failed)} failed: "
+                + "; ".join(repr(self.records[n].error) for n in failed)
+            )
+        return self.devices
+
+    def critical_path(self) -> T.List[str]:
+        """Chain of dependencies ending last, it determines the startup time."""
+        if not self.records:
+            return []
+        name = max(self.records, key=lambda n: self.records[n].end)
+        path = [name]
+        while deps := self.specs[name].depends:
+            name = max(deps, key=lambda n: self.records[n].end)
+            path.append(name)
+        return path[::-1]
+
+    def waterfall(self, width: int = 40) -> str:
+        """Text chart of the start and duration of each device in ms."""
+        if not self.records:
+            return "No devices"
+        recs = sorted(self.records.values(), key=lambda r: r.start)
+        total = max(r.end for r in recs) - self.t0
+        scale = width / max(total, 1e-9)
+        crit = set(self.critical_path())
+        lines = [f"Hardware startup took {1000 * total:.0f} ms"]
+        for r in recs:
+            offset = int((r.start - self.t0) * scale)
+            bar = " " * offset + "#" * max(int(r.duration * scale), 1)
+            lines.append(
+                f"{'*' if r.name in crit else ' '} {r.name:<16} "
+                f"{1000 * (r.start - self.t0):7.0f} {1000 * r.duration:7.0f} ms "
+                f"{r.status:<7} |{bar:<{width}}|"
+            )
+        lines.append("Critical path (*): " + " -> ".join(self.critical_path()))
+        return "\n".join(lines)
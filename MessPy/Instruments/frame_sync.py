@@ -0,0 +1,38 @@
+"""Checks the frames read from a frame grabber against its frame counter."""
+
+import typing as T
+
+import attr
+
+from MessPy import metrics
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class FrameSync:
+    """Counts the frames read from a grabber, whose buffers are numbered from 0.
+
+    After each block the counter of the grabber (e.g. IMG_LAST_FRAME, the
+    number of the newest frame) is compared with the count. A lost or extra
+    frame flags the block, then the count is set to the grabber's, hence only
+    that block is invalid and the next one starts at the newest frame.
+    """
+
+    name: str = "cam"
+    frames: int = 0
+    "Buffer number of the first frame of the next block"
+    first_shot: int = 0
+    "Grabber frame number of the first shot of the last block"
+
+    def reset(self):
+        self.frames = 0
+
+    def end_block(self, shots: int, last_frame: int) -> T.Optional[str]:
+        """Called after a block of `shots` frames was read, returns the problem if any."""
+        self.frames += shots
+        self.first_shot = last_frame + 1 - shots
+        lag = last_frame + 1 - self.frames
+        metrics.frame_lag.set(lag, cam=self.name)
+        if lag == 0:
+            return None
+        self.frames = last_frame + 1
+        return f"frame grabber is {lag} frames ahead"
@@ -8,6 +8,7 @@ import time
 import typing
 import warnings
 import xmlrpc.server as rpc
+from concurrent.futures import Future
 from pathlib import Path
 
 import attr
@@ -17,6 +18,11 @@ from PySide6.QtCore import QThread, Signal, QObject  # type: ignore
 from scipy.constants import c
 
 from .signal_processing import Reading, Reading2D, Spectrum
+from .state_cache import StateCache, cached_query, invalidating
+from .motion import watch_device
+from .trajectory import Trajectory, TrajectoryRunner
+from MessPy.tracing import traced, tracer
+from MessPy import metrics
 
 QObjectType = type(QObject)
 
@@ -34,6 +40,14 @@ class QABCMeta(QObjectType, abc.ABCMeta):
     pass
 
 
+def setup_changed():
+    """Called after commands which change the setup, e.g. moves and wavelength
+    changes. The cams drop the blocks they acquired before."""
+    for dev in list(IDevice.registered_devices):
+        if dev.interface_type == "Camera":
+            dev.discard_blocks()
+
+
 @attr.s(auto_attribs=True)
 class IDevice(QObject, metaclass=QABCMeta):
     name: str
@@ -41,15 +55,47 @@ class IDevice(QObject, metaclass=QABCMeta):
     registered_devices: T.ClassVar[T.List["IDevice"]] = []
     interface_type: T.ClassVar[str] = "Generic"
 
+    # TTL in seconds of the cached query methods, see `StateCache`
+    cache_ttl: T.ClassVar[T.Dict[str, float]] = {}
+    # Methods which invalidate the cache
+    cache_invalidators: T.ClassVar[T.Tuple[str, ...]] = ()
+    # Signals whose value is the new result of a query method
+    cache_signals: T.ClassVar[T.Dict[str, str]] = {}
+    # Methods recorded as spans, name -> category, see `MessPy.tracing`
+    traced_methods: T.ClassVar[T.Dict[str, str]] = {}
+
     def __attrs_post_init__(self):
         logger.info(
             f"Initializing {self.name} [{self.interface_type}] CLS {self.__class__}"
         )
         QObject.__init__(self)
+        self.setup_state_cache()
+        self.setup_tracing()
         self.registered_devices.append(self)
         self.load_state()
         atexit.register(self.save_state)
 
+    def setup_state_cache(self):
+        """Replaces the query and command methods by their caching wrappers."""
+        self.state_cache = StateCache(ttl=dict(self.cache_ttl))
+        for name in self.cache_ttl:
+            method = getattr(self, name)
+            setattr(self, name, cached_query(self.state_cache, name, method))
+        for name in self.cache_invalidators:
+            method = getattr(self, name)
+            setattr(self, name, invalidating(self.state_cache, method, setup_changed))
+        for sig, name in self.cache_signals.items():
+            getattr(self, sig).connect(
+                lambda *args, name=name: self.state_cache.put(
+                    name, args[0] if len(args) == 1 else args
+                )
+            )
+
+    def setup_tracing(self):
+        for name, cat in self.traced_methods.items():
+            method = getattr(self, name)
+            setattr(self, name, traced(f"{self.name}.{name}", cat)(method))
+
     def shutdown(self):
         pass
 
@@ -130,6 +176,21 @@ class ISpectrograph(IDevice):
     sigGratingChanged: T.ClassVar[Signal] = Signal(int)
 
     interface_type: T.ClassVar[str] = "Spectrograph"
+    cache_ttl: T.ClassVar[T.Dict[str, float]] = {
+        "get_wavelength": 1.0,
+        "get_grating": 1.0,
+        "get_slit": 1.0,
+    }
+    cache_invalidators: T.ClassVar[T.Tuple[str, ...]] = (
+        "set_wavelength",
+        "set_grating",
+        "set_slit",
+    )
+    cache_signals: T.ClassVar[T.Dict[str, str]] = {
+        "sigWavelengthChanged": "get_wavelength",
+        "sigGratingChanged": "get_grating",
+        "sigSlitChanged": "get_slit",
+    }
 
     @property
     def gratings(self):
@@ -182,8 +243,16 @@ class ICam(IDevice):
     spectrograph: T.Optional[ISpectrograph] = None
 
     can_validate_pixel: bool = False
+    # Shots further than this many MADs from the median are left out of the
+    # signals, see `reject_outliers`. 0 keeps all shots.
+    outlier_mad: float = 5.0
     reader_thread: T.Optional[TargetThread] = None
     interface_type: T.ClassVar[str] = "Camera"
+    traced_methods: T.ClassVar[T.Dict[str, str]] = {
+        "make_reading": "cam",
+        "get_spectra": "cam",
+        "make_2D_reading": "cam",
+    }
 
     @property
     def sig_lines(self) -> int:
@@ -201,6 +270,11 @@ class ICam(IDevice):
     def read_cam(self):
         pass
 
+    def discard_blocks(self):
+        """Drops the blocks acquired up to now, cams which acquire ahead of
+        the reads must override it. See `setup_changed`."""
+        pass
+
     @abc.abstractmethod
     def make_reading(self) -> Reading:
         pass
@@ -267,8 +341,13 @@ class IDelayLine(IDevice):
     beam_passes: int = 2
     max_pos_mm: float = np.inf
     min_pos_mm: float = -np.inf
+    # Used to predict the arrival time of a move
+    speed_mm_s: T.Optional[float] = None
 
     interface_type: T.ClassVar[str] = "DelayLine"
+    sigMovementCompleted: T.ClassVar[Signal] = Signal()
+    cache_ttl: T.ClassVar[T.Dict[str, float]] = {"get_pos_mm": 0.05, "is_moving": 0.05}
+    cache_invalidators: T.ClassVar[T.Tuple[str, ...]] = ("move_mm",)
 
     def get_state(self) -> dict:
         return dict(home_pos=self.home_pos)
@@ -286,7 +365,8 @@ class IDelayLine(IDevice):
             (self.get_pos_mm() - self.home_pos) * self.beam_passes
         )
 
-    def move_fs(self, fs, do_wait=False, *args, **kwargs):
+    def move_fs(self, fs, do_wait=False, *args, **kwargs) -> Future:
+        """Starts the move, the returned future resolves when it is completed."""
         mm = self.pos_sign * fs_to_mm(fs)
         new_pos = mm / self.beam_passes + self.home_pos
         if not self.min_pos_mm <= new_pos <= self.max_pos_mm:
@@ -294,10 +374,17 @@ class IDelayLine(IDevice):
                 f"New position {new_pos} is outside of the allowed range "
                 f"[{self.min_pos_mm}, {self.max_pos_mm}]"
             )
+        duration = None
+        if self.speed_mm_s:
+            duration = abs(new_pos - self.get_pos_mm()) / self.speed_mm_s
         self.move_mm(new_pos, *args, **kwargs)
+        fut = tracer.track(watch_device(self, duration), f"{self.name}.move", "motion", fs=fs)
+        metrics.time_future(fut, "move")
+        # Blocks acquired while moving are stale, too
+        fut.add_done_callback(lambda f: setup_changed())
         if do_wait:
-            while self.is_moving():
-                time.sleep(0.1)
+            fut.result()
+        return fut
 
     @abc.abstractmethod
     def is_moving(self) -> bool:
@@ -346,17 +433,30 @@ class IShutter(IDevice):
 class IRotationStage(IDevice):
     sigDegreesChanged: typing.ClassVar[Signal] = Signal(float)
     sigMovementCompleted: typing.ClassVar[Signal] = Signal()
+    # Used to predict the arrival time of a move
+    speed_deg_s: T.Optional[float] = None
 
     interface_type: T.ClassVar[str] = "RotationStage"
+    cache_ttl: T.ClassVar[T.Dict[str, float]] = {"get_degrees": 0.05, "is_moving": 0.05}
+    cache_invalidators: T.ClassVar[T.Tuple[str, ...]] = ("set_degrees",)
+    cache_signals: T.ClassVar[T.Dict[str, str]] = {"sigDegreesChanged": "get_degrees"}
 
     @abc.abstractmethod
     def set_degrees(self, deg: float):
         pass
 
-    def set_degrees_and_wait(self, deg: float):
+    def set_degrees_and_watch(self, deg: float) -> Future:
+        """Starts the move, the returned future resolves when it is completed."""
+        duration = None
+        if self.speed_deg_s:
+            duration = abs(deg - self.get_degrees()) / self.speed_deg_s
         self.set_degrees(deg)
-        while self.is_moving():
-            time.sleep(0.1)
+        fut = tracer.track(watch_device(self, duration), f"{self.name}.move", "motion", deg=deg)
+        fut.add_done_callback(lambda f: setup_changed())
+        return metrics.time_future(fut, "move")
+
+    def set_degrees_and_wait(self, deg: float):
+        self.set_degrees_and_watch(deg).result()
 
     @abc.abstractmethod
     def get_degrees(self) -> float:
@@ -377,6 +477,19 @@ class ILissajousScanner(IDevice):
 
     interface_type: T.ClassVar[str] = "LissajousScanner"
     sigPositionChanged: T.ClassVar[Signal] = Signal(float, float)
+    sigMovementCompleted: T.ClassVar[Signal] = Signal()
+    cache_ttl: T.ClassVar[T.Dict[str, float]] = {
+        "get_pos_mm": 0.1,
+        "get_zpos_mm": 0.1,
+        "is_moving": 0.05,
+        "is_zmoving": 0.05,
+    }
+    cache_invalidators: T.ClassVar[T.Tuple[str, ...]] = (
+        "set_pos_mm",
+        "set_zpos_mm",
+        "set_home",
+    )
+    cache_signals: T.ClassVar[T.Dict[str, str]] = {"sigPositionChanged": "get_pos_mm"}
 
     def init_motor(self):
         pass
@@ -401,6 +514,25 @@ class ILissajousScanner(IDevice):
     def is_moving(self) -> typing.Tuple[bool, bool]:
         pass
 
+    def watch_motion(self, timeout: T.Optional[float] = None) -> Future:
+        """Returns a future, which resolves when both axes stopped."""
+        return watch_device(self, timeout=timeout)
+
+    def run_trajectory(self, trajectory: Trajectory, rate: float = 50.0,
+                       **kwargs) -> TrajectoryRunner:
+        """Streams the trajectory to the stage from a background thread.
+
+        Stages with a hardware trajectory generator may override this."""
+        self.stop_trajectory()
+        self.trajectory_runner = TrajectoryRunner(self, trajectory, rate, **kwargs)
+        self.trajectory_runner.start()
+        return self.trajectory_runner
+
+    def stop_trajectory(self):
+        runner = getattr(self, "trajectory_runner", None)
+        if runner is not None:
+            runner.stop()
+
     @abc.abstractmethod
     def set_home(self):
         pass
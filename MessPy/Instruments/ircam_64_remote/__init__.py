@@ -1,22 +1,34 @@
 """Using the IR-ADC over network. Uses direct zmq messages."""
 import attr
-from typing import List
+from typing import Dict, List
 import numpy as np
 import wrapt
 from MessPy.Instruments.interfaces import ICam, Reading
+from MessPy.Instruments.shm_transport import PipelinedBlockClient
 from MessPy.Config import config
-import zmq
 import xmlrpc.client
 config.ir_server_addr = 'tcp://130.133.30.146:5555'
 if config.ir_server_addr is None:
     config.ir_server_addr = 'tcp://130.133.30.146:5555'
 
 #config.ir_server_addr = 'tcp://localhost:8001'
-context = zmq.Context()
-socket = context.socket(zmq.REQ)
-socket.connect(config.ir_server_addr)
+# Uses shared memory instead of TCP if the server runs on this machine. The
+# next read is requested while the current block is processed.
+client = PipelinedBlockClient(config.ir_server_addr)
+
+
+class TimeoutTransport(xmlrpc.client.Transport):
+    """xmlrpc transport which gives up instead of blocking forever."""
+    timeout = 5
+
+    def make_connection(self, host):
+        conn = super().make_connection(host)
+        conn.timeout = self.timeout
+        return conn
+
+
 triax = xmlrpc.client.ServerProxy(
-    'http://130.133.30.146:8001', allow_none=True)
+    'http://130.133.30.146:8001', allow_none=True, transport=TimeoutTransport())
 
 
 @attr.s(auto_attribs=True)
@@ -30,15 +42,11 @@ class Cam(ICam):
     ext_channels: int = 3
     changeable_wavelength: bool = True
     changeable_slit: bool = True
+    _wl_cache: Dict[float, np.ndarray] = attr.Factory(dict)
 
     @wrapt.synchronized
     def read_cam(self):
-        socket.send_json(('read', ''))
-        #data = socket.recv()
-        #data = np.frombuffer(b, dtype=args['dtype'], shape=args['shape'])
-        shape, dtype = socket.recv_json()
-        arr = socket.recv()
-        arr = np.frombuffer(arr, dtype=dtype).reshape(shape)/3276.7
+        arr = client.read()/3276.7
         ans = arr[:, :32], arr[:, 32:64], arr[:, -1] > 2, arr[:, [77]]
         return ans
 
@@ -65,10 +73,7 @@ class Cam(ICam):
 
     @wrapt.synchronized
     def new_make_reading(self):
-        socket.send_json(('reading', ''))
-        shape, dtype = socket.recv_json()
-        arr = socket.recv()
-        arr = np.frombuffer(arr, dtype=dtype).reshape(shape)
+        arr = client.request_array('reading')
         print('reading')
         return Reading(
             lines=arr[:2, :],
@@ -77,21 +82,25 @@ class Cam(ICam):
             valid=True,
         )
 
+    def discard_blocks(self):
+        client.invalidate()
+
     @wrapt.synchronized
     def set_shots(self, shots: int):
         shots = int(shots)
-        socket.send_json(('set_shots', shots))
         self.shots = shots
-        b = socket.recv_json()
+        b = client.command('set_shots', shots)
 
     def get_wavelength_array(self, center_wl):
-        li = triax.get_arr(center_wl)
-        return np.array(li)
+        if center_wl not in self._wl_cache:
+            self._wl_cache[center_wl] = np.array(triax.get_arr(center_wl))
+        return self._wl_cache[center_wl]
 
     def set_wavelength(self, wl: float):
         try:
             wl = float(wl)
             triax.set_wl(wl)
+            self.discard_blocks()
         except ValueError:
             pass
 
@@ -105,18 +114,17 @@ class Cam(ICam):
         try:
             slit = float(slit)
             triax.set_slit(slit)
+            self.discard_blocks()
         except ValueError:
             pass
 
     @wrapt.synchronized
     def set_background(self, back):
-        socket.send_json(('set_back', ''))
-        ans = socket.recv_json()
+        ans = client.command('set_back')
 
     @wrapt.synchronized
     def get_background(self):
-        socket.send_json(('get_back', ''))
-        return socket.recv_json()
+        return client.command('get_back')
 
 
 cam = Cam()
@@ -1,20 +1,28 @@
-import zmq
+"""Stand-in for the IR-ADC server, serves random shot blocks."""
+import sys
+
 import numpy as np
 
-ctx = zmq.Context()
-socket = ctx.socket(zmq.REP)
-socket.bind('tcp://*:8001')
+from MessPy.Instruments.shm_transport import BlockServer
+
 shots = 100
 
-while True:
-    cmd, val = socket.recv_pyobj()
-    print(cmd, val)
-    if cmd == 'set_shots':
-        shots = int(val)
-        socket.send_pyobj(val)
-    elif cmd == 'read_cam':
-        arr = np.random.randint(0, 2 << 16, (shots, 80))
 
-        socket.send_pyobj(arr)
+def read_block():
+    return np.random.randint(0, 2 << 14, (shots, 80), dtype=np.uint16)
+
+
+def set_shots(val):
+    global shots
+    shots = int(val)
+    return shots
 
 
+if __name__ == '__main__':
+    addr = sys.argv[1] if len(sys.argv) > 1 else 'tcp://127.0.0.1:5555'
+    server = BlockServer(read_block, addr=addr, commands={
+        'set_shots': set_shots,
+        'set_back': lambda val: 'ok',
+        'get_back': lambda val: None,
+    })
+    server.serve_forever()
@@ -14,6 +14,7 @@ from MessPy.Instruments.interfaces import (
     ILissajousScanner,
     IPowerMeter,
 )
+from MessPy.Instruments.signal_processing import as_data, n_rejected, outlier_mask
 import time
 
 
@@ -90,6 +91,11 @@ class CamMock(ICam):
 
     noise_scale: float = 0.1
     peak_width: float = 20
+    # Counts every trigger, including the shots which the cam missed.
+    shot_counter: int = 0
+    # Number of triggers which the next block misses, to simulate lost shots.
+    skip_shots: int = 0
+    first_shot: int = 0
 
     def get_state(self) -> dict:
         return {"shots": self.shots}
@@ -99,6 +105,9 @@ class CamMock(ICam):
 
     def read_cam(self):
         t0 = time.time()
+        self.shot_counter += self.skip_shots
+        self.skip_shots = 0
+        self.first_shot = self.shot_counter
         x = self.get_wavelength_array()
         y = 300 * np.exp(-((x - 250) ** 2) / self.peak_width**2 / 2)
 
@@ -128,6 +137,7 @@ class CamMock(ICam):
         a[::2, :] *= 1 + signal * y_sig / 300
         dt = time.time() - t0
         time.sleep(max(self.shots / 1000.0 - dt, 0))
+        self.shot_counter += self.shots
         return a, b, chop, ext
 
     def make_reading(self) -> Reading:
@@ -135,24 +145,28 @@ class CamMock(ICam):
         if self.background is not None:
             a -= self.background[0, ...]
             b -= self.background[1, ...]
-        tmp = np.stack((a, b, a / b))
-        tm = tmp.mean(1)
-        ts = 100 * tmp.std(1) / tm
+        full_data = tuple(as_data(x) for x in (a, b, a / b))
+        tm = np.stack([x.mean(0) for x in full_data])
+        ts = 100 * np.stack([x.std(0) for x in full_data]) / tm
+        keep = outlier_mask((a.T, b.T), self.outlier_mad)
+        pu, not_pu = chopper & keep, ~chopper & keep
 
         with np.errstate(all="ignore"):
             signal = -1000 * np.log10(
-                np.nanmean(a[chopper, :], 0) / np.nanmean(a[~chopper, :], 0)
+                np.nanmean(a[pu, :], 0) / np.nanmean(a[not_pu, :], 0)
             )
             signal2 = -1000 * np.log10(
-                np.nanmean((a / b)[chopper, :], 0) / np.nanmean((a / b)[~chopper, :], 0)
+                np.nanmean((a / b)[pu, :], 0) / np.nanmean((a / b)[not_pu, :], 0)
             )
         return Reading(
             lines=tm[:2, :],
             stds=ts,
             signals=np.stack((signal2, signal)),
             valid=True,
-            full_data=tmp,
+            full_data=full_data,
             shots=self.shots,
+            first_shot=self.first_shot,
+            rejected_shots=n_rejected(keep),
         )
 
     def get_spectra(self, frames):
@@ -197,8 +211,9 @@ class DelayLineMock(IDelayLine):
         return False
 
     def move_fs(self, fs, do_wait=False):
-        super().move_fs(fs, do_wait=do_wait)
+        fut = super().move_fs(fs, do_wait=do_wait)
         state.t = fs
+        return fut
 
 
 @attr.s(auto_attribs=True)
@@ -255,7 +270,6 @@ class StageMock(ILissajousScanner):
         return tuple(state.stage_pos[:2])
 
     def set_pos_mm(self, x=None, y=None):
-        print(f"{x=} {y=}")
         if x is not None:
             state.stage_pos[0] = x
         if y is not None:
@@ -0,0 +1,162 @@
+"""Detection of the end of a movement.
+
+Instead of every caller spinning on ``is_moving()`` with a fixed sleep, the
+moves are handed to the `MotionService`. It polls all watched axes from one
+background thread, each at its own adaptive rate: if the expected arrival
+time is known, from the distance and the velocity, it polls rarely at the
+beginning and fast close to the arrival. Otherwise, it starts fast and slowly
+backs off. When an axis stopped, its future resolves and the
+`sigMovementCompleted` signal of the device is emitted.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+import typing as T
+from concurrent.futures import Future
+
+import attr
+from loguru import logger
+
+from MessPy.Instruments.state_cache import uncached
+
+if T.TYPE_CHECKING:
+    from MessPy.Instruments.interfaces import IDevice
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class _Watch:
+    is_moving: T.Callable[[], T.Any]
+    future: Future
+    t_start: float
+    t_expected: T.Optional[float]
+    t_timeout: T.Optional[float]
+    polls: int = 0
+    overdue_polls: int = 0
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class MotionService:
+    """Polls the watched axes until they report that they stopped."""
+
+    fast_interval: float = 0.005
+    slow_interval: float = 0.1
+    # Limit of the backoff when the arrival time is unknown or has passed.
+    backoff_limit: float = 0.05
+    _heap: list = attr.ib(init=False, factory=list)
+    _counter: T.Iterator[int] = attr.ib(init=False, factory=itertools.count)
+    _cond: threading.Condition = attr.ib(init=False, factory=threading.Condition)
+    _thread: T.Optional[threading.Thread] = attr.ib(init=False, default=None)
+
+    def watch(
+        self,
+        is_moving: T.Callable[[], T.Any],
+        expected_duration: T.Optional[float] = None,
+        timeout: T.Optional[float] = None,
+    ) -> Future:
+        """Returns a future, which resolves to the duration of the move.
+
+        `is_moving` may return a bool or a tuple of bools, one per axis.
+        """
+        now = time.monotonic()
+        w = _Watch(
+            is_moving=is_moving,
+            future=Future(),
+            t_start=now,
+            t_expected=None if expected_duration is None else now + expected_duration,
+            t_timeout=None if timeout is None else now + timeout,
+        )
+        w.future.set_running_or_notify_cancel()
+        self._schedule(w, now + self.next_interval(w, now))
+        return w.future
+
+    def next_interval(self, w: _Watch, now: float) -> float:
+        if w.t_expected is not None and now < w.t_expected:
+            remaining = w.t_expected - now
+            return min(max(remaining / 2, self.fast_interval), self.slow_interval)
+        # Arrival time unknown or overdue, back off from the fast rate.
+        n = w.polls if w.t_expected is None else w.overdue_polls
+        return min(self.fast_interval * 1.5**n, self.backoff_limit)
+
+    def _schedule(self, w: _Watch, t: float):
+        with self._cond:
+            heapq.heappush(self._heap, (t, next(self._counter), w))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="motion service", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    if self._heap:
+                        self._cond.wait(self._heap[0][0] - time.monotonic())
+                    elif not self._cond.wait(10):
+                        # Nothing to watch, the thread is restarted on demand.
+                        self._thread = None
+                        return
+                _, _, w = heapq.heappop(self._heap)
+            self._poll(w)
+
+    def _poll(self, w: _Watch):
+        now = time.monotonic()
+        try:
+            moving = w.is_moving()
+            if isinstance(moving, tuple):
+                moving = any(moving)
+        except Exception as e:
+            w.future.set_exception(e)
+            return
+        w.polls += 1
+        if w.t_expected is not None and now >= w.t_expected:
+            w.overdue_polls += 1
+        if not moving:
+            w.future.set_result(now - w.t_start)
+        elif w.t_timeout is not None and now > w.t_timeout:
+            w.future.set_exception(TimeoutError("Movement did not finish in time"))
+        else:
+            self._schedule(w, now + self.next_interval(w, now))
+
+
+motion_service = MotionService()
+
+
+def watch_device(
+    dev: "IDevice",
+    expected_duration: T.Optional[float] = None,
+    timeout: T.Optional[float] = None,
+    is_moving: T.Optional[T.Callable[[], T.Any]] = None,
+) -> Future:
+    """Watch the `is_moving` method of a device, bypassing its state cache.
+
+    The polled state is put into the cache and on completion, the
+    `sigMovementCompleted` signal of the device is emitted. A custom
+    `is_moving` is used for waiting on other conditions, e.g. homing, or on
+    single axes.
+    """
+    own_query = is_moving is None
+    if is_moving is None:
+        query = uncached(dev.is_moving)  # type: ignore
+
+        def is_moving():
+            moving = query()
+            dev.state_cache.put("is_moving", moving)
+            return moving
+
+    def done(fut: Future):
+        dev.state_cache.invalidate()
+        if fut.exception() is None:
+            logger.debug(f"{dev.name}: Movement completed after {fut.result():.3f} s")
+            if own_query:
+                dev.state_cache.put("is_moving", False)
+                sig = getattr(dev, "sigMovementCompleted", None)
+                if sig is not None:
+                    sig.emit()
+
+    fut = motion_service.watch(is_moving, expected_duration, timeout)
+    fut.add_done_callback(done)
+    return fut
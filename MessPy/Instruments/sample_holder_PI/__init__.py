@@ -1,5 +1,6 @@
 from pathlib import Path
 from MessPy.Instruments.interfaces import ILissajousScanner
+from MessPy.Instruments.motion import watch_device
 import threading
 import pipython
 from pipython import pitools, fastaligntools
@@ -94,17 +95,11 @@ class SampleHolder(ILissajousScanner):
     def do_contimove(self, x_settings, y_settings):
         home = self.pos_home[1]
         y = y_settings/2.
-        self.c843.move_mm(y + 1 + home)
-        while True:
-            pos = self.c843.get_pos_mm() - home
-            if pos > y:
-                self.c843.move_mm(home-y-1)
-            elif pos < -y:
-                self.c843.move_mm(home+y+1)
-            time.sleep(0.02)
-
-            if not self.do_move:
-                break
+        target = home + y + 1
+        while self.do_move:
+            self.c843.move_mm(target)
+            watch_device(self, is_moving=self.c843.is_moving).result()
+            target = 2*home - target
 
     def stop_contimove(self):
         self.do_move = False
@@ -0,0 +1,247 @@
+"""Shared, asynchronous access to serial ports.
+
+Every port is owned by a single `SerialPort`, which runs one I/O thread. The
+instruments only put commands into its queue and get a
+`concurrent.futures.Future` back, hence a slow controller never blocks the
+calling thread unless it waits for the result. Queries are pipelined: up to
+``max_in_flight`` queries are written before the first answer arrived, the
+answers are matched to the queries in FIFO order, which is how the line based
+controllers used here (Newport SMC/AGP/DLC, SP2150i, ...) reply.
+
+An answer arriving after its query timed out would be taken as the answer of
+the next query. Ports of controllers which start each answer with the command,
+like the Newport ones, are opened with ``echoes_command=True``: answers not
+starting with the command are dropped. For the other ports the pending queries
+fail together with the timed out one and everything received until the line
+was quiet for ``drain_time`` is dropped before the next command is written.
+
+Use `get_port` to obtain a port, instruments configured with the same port
+name share the same thread.
+"""
+
+import queue
+import re
+import threading
+import time
+import typing as T
+from collections import deque
+from concurrent.futures import Future
+
+import attr
+import serial
+from loguru import logger
+
+_ARGS_RE = re.compile(rb"[-+0-9.]+$")
+
+
+def command_key(cmd: bytes) -> str:
+    """Name under which the latency of a command is recorded, its arguments are removed."""
+    return _ARGS_RE.sub(b"", cmd.strip()).decode("ascii", "replace")
+
+
+def reply_tag(cmd: bytes) -> bytes:
+    """Start of the answer of a controller which echoes the command, e.g. b"1MM" for b"1MM?"."""
+    return _ARGS_RE.sub(b"", cmd.strip()).rstrip(b"?")
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class CommandStats:
+    """Latency of the queries with the same command key, in seconds."""
+
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    last: float = 0.0
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def add(self, dt: float):
+        self.count += 1
+        self.total += dt
+        self.last = dt
+        self.max = max(self.max, dt)
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class _Command:
+    data: bytes
+    future: Future
+    expects_answer: bool
+    key: str
+    timeout: float
+    tag: T.Optional[bytes] = None
+    t_sent: float = 0.0
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class SerialPort:
+    """Owns a serial port and serves its command queue from a background thread."""
+
+    port: str
+    baudrate: int = 9600
+    term: bytes = b"\r\n"
+    timeout: float = 2.0
+    max_in_flight: int = 8
+    echoes_command: bool = False
+    drain_time: float = 0.2
+    serial_kwargs: dict = attr.Factory(dict)
+    stats: T.Dict[str, CommandStats] = attr.Factory(dict)
+    _serial: serial.Serial = attr.ib(init=False)
+    _queue: "queue.Queue[T.Optional[_Command]]" = attr.ib(init=False, factory=queue.Queue)
+    _pending: T.Deque[_Command] = attr.ib(init=False, factory=deque)
+    _buf: bytes = attr.ib(init=False, default=b"")
+    _drain_until: float = attr.ib(init=False, default=0.0)
+    _thread: threading.Thread = attr.ib(init=False)
+
+    def __attrs_post_init__(self):
+        self._serial = serial.Serial(
+            self.port, baudrate=self.baudrate, timeout=0.01, **self.serial_kwargs
+        )
+        self._thread = threading.Thread(
+            target=self._run, name=f"serial {self.port}", daemon=True
+        )
+        self._thread.start()
+
+    def _submit(self, cmd: T.Union[str, bytes], expects_answer: bool,
+                timeout: T.Optional[float], append_term: bool) -> Future:
+        if isinstance(cmd, str):
+            cmd = cmd.encode("ascii")
+        fut: Future = Future()
+        if not self._thread.is_alive():
+            fut.set_exception(IOError(f"Serial port {self.port} is closed"))
+            return fut
+        data = cmd + self.term if append_term else cmd
+        self._queue.put(
+            _Command(
+                data=data,
+                future=fut,
+                expects_answer=expects_answer,
+                key=command_key(cmd),
+                timeout=self.timeout if timeout is None else timeout,
+                tag=reply_tag(cmd) if self.echoes_command else None,
+            )
+        )
+        return fut
+
+    def write(self, cmd: T.Union[str, bytes], append_term: bool = True) -> Future:
+        """Queue a command without answer, the future resolves after it was written."""
+        return self._submit(cmd, False, None, append_term)
+
+    def query(self, cmd: T.Union[str, bytes], timeout: T.Optional[float] = None,
+              append_term: bool = True) -> Future:
+        """Queue a command, the future resolves to its answer without the terminator."""
+        return self._submit(cmd, True, timeout, append_term)
+
+    def ask(self, cmd: T.Union[str, bytes], timeout: T.Optional[float] = None) -> bytes:
+        """Blocking query."""
+        t = self.timeout if timeout is None else timeout
+        # The command may wait behind others in the queue, hence the margin.
+        return self.query(cmd, timeout).result(t + 1)
+
+    def flush(self, timeout: float = 5):
+        """Wait until all queued commands are written and answered."""
+        self.write(b"", append_term=False).result(timeout)
+        while self._pending:
+            time.sleep(0.001)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._serial.close()
+        with _ports_lock:
+            if _ports.get(self.port) is self:
+                del _ports[self.port]
+
+    def _run(self):
+        stop = False
+        while not (stop and not self._pending):
+            # Write queued commands, as long the device has not too many to answer.
+            draining = time.perf_counter() < self._drain_until
+            while not stop and not draining and len(self._pending) < self.max_in_flight:
+                try:
+                    if self._pending:
+                        cmd = self._queue.get_nowait()
+                    else:
+                        cmd = self._queue.get(timeout=0.05)
+                except queue.Empty:
+                    break
+                if cmd is None:
+                    stop = True
+                    break
+                self._send(cmd)
+            if self._pending or draining or self._serial.in_waiting:
+                self._receive()
+        for cmd in self._pending:
+            cmd.future.set_exception(IOError(f"Serial port {self.port} closed"))
+
+    def _send(self, cmd: _Command):
+        if not cmd.future.set_running_or_notify_cancel():
+            return
+        try:
+            if cmd.data:
+                self._serial.write(cmd.data)
+        except serial.SerialException as e:
+            cmd.future.set_exception(e)
+            return
+        cmd.t_sent = time.perf_counter()
+        if cmd.expects_answer:
+            self._pending.append(cmd)
+        else:
+            cmd.future.set_result(None)
+
+    def _receive(self):
+        try:
+            self._buf += self._serial.read(self._serial.in_waiting or 1)
+        except serial.SerialException as e:
+            while self._pending:
+                self._pending.popleft().future.set_exception(e)
+            return
+        now = time.perf_counter()
+        while (i := self._buf.find(self.term)) != -1:
+            line, self._buf = self._buf[:i], self._buf[i + len(self.term):]
+            if now < self._drain_until:
+                logger.warning(f"{self.port}: Dropped late answer {line!r}")
+                self._drain_until = now + self.drain_time
+                continue
+            if not self._pending:
+                logger.warning(f"{self.port}: Unexpected answer {line!r}")
+                continue
+            if (tag := self._pending[0].tag) is not None and not line.startswith(tag):
+                logger.warning(f"{self.port}: Dropped late answer {line!r}")
+                continue
+            cmd = self._pending.popleft()
+            dt = time.perf_counter() - cmd.t_sent
+            self.stats.setdefault(cmd.key, CommandStats()).add(dt)
+            cmd.future.set_result(line)
+        while self._pending and now - self._pending[0].t_sent > self._pending[0].timeout:
+            cmd = self._pending.popleft()
+            logger.warning(f"{self.port}: No answer to {cmd.data!r}")
+            cmd.future.set_exception(
+                TimeoutError(f"{self.port}: No answer to {cmd.data!r}")
+            )
+            if cmd.tag is None:
+                # A late answer can't be told apart from the answers of the
+                # following queries, hence these fail too and the line is
+                # drained before the next command.
+                while self._pending:
+                    self._pending.popleft().future.set_exception(
+                        TimeoutError(f"{self.port}: Answer lost after {cmd.data!r}")
+                    )
+                self._serial.reset_input_buffer()
+                self._buf = b""
+                self._drain_until = now + self.drain_time
+
+
+_ports: T.Dict[str, SerialPort] = {}
+_ports_lock = threading.Lock()
+
+
+def get_port(port: str, **kwargs) -> SerialPort:
+    """Return the `SerialPort` of `port`, opening it with `kwargs` on first use."""
+    with _ports_lock:
+        if port not in _ports:
+            logger.info(f"Opening serial port {port}")
+            _ports[port] = SerialPort(port, **kwargs)
+        return _ports[port]
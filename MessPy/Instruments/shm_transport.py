@@ -0,0 +1,320 @@
+"""Transport of shot blocks between a driver process and MessPy.
+
+The driver side runs a `BlockServer`, which answers the json commands already
+used by the remote cameras over a zmq REQ/REP socket. A plain ``read`` sends
+the block over the socket (TCP fallback). If client and server run on the same
+host, ``read_shm`` only returns the slot index of a `ShmRing`, a ring buffer
+in shared memory, and the client wraps that slot into a numpy array without
+deserializing or copying it. `PipelinedBlockClient` additionally keeps the
+next read request in flight.
+"""
+
+import json
+import sys
+import typing as T
+from multiprocessing import shared_memory
+
+import attr
+import numpy as np
+import zmq
+from loguru import logger
+
+
+# Segments created by this process, these are already tracked.
+_created: T.Set[str] = set()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to an existing segment without handing it to the resource tracker.
+
+    Otherwise the consumer would unlink the segment of the producer at exit.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if sys.platform != "win32" and name not in _created:
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore
+    return shm
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class ShmRing:
+    """Fixed number of equally sized slots in a shared memory segment.
+
+    The producer writes block n into slot ``n % n_slots``, hence a consumer
+    view stays valid until ``n_slots - 1`` further blocks have been written.
+    """
+
+    name: T.Optional[str] = None
+    n_slots: int = 4
+    slot_bytes: int = 0
+    create: bool = False
+    seq: int = 0
+    _shm: shared_memory.SharedMemory = attr.ib(init=False)
+
+    def __attrs_post_init__(self):
+        if self.create:
+            self._shm = shared_memory.SharedMemory(
+                name=self.name, create=True, size=self.n_slots * self.slot_bytes
+            )
+            self.name = self._shm.name
+            _created.add(self.name)
+        else:
+            assert self.name is not None
+            self._shm = _attach(self.name)
+
+    def fits(self, nbytes: int) -> bool:
+        return nbytes <= self.slot_bytes
+
+    def view(self, slot: int, shape, dtype) -> np.ndarray:
+        """Returns the content of a slot as an array, no data is copied."""
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        return np.frombuffer(
+            self._shm.buf, dtype=dtype, count=count, offset=slot * self.slot_bytes
+        ).reshape(shape)
+
+    def write(self, arr: np.ndarray) -> T.Tuple[int, int]:
+        """Copies a block into the next slot, returns (slot, seq)."""
+        if not self.fits(arr.nbytes):
+            raise ValueError(f"Block of {arr.nbytes} bytes exceeds slot size")
+        slot = self.seq % self.n_slots
+        np.copyto(self.view(slot, arr.shape, arr.dtype), arr)
+        self.seq += 1
+        return slot, self.seq - 1
+
+    def close(self):
+        try:
+            self._shm.close()
+        except BufferError:
+            # Views into the ring are still alive, the mapping goes with them.
+            pass
+        if self.create:
+            self._shm.unlink()
+            _created.discard(self.name)
+
+
+def send_array(socket: zmq.Socket, arr: np.ndarray):
+    socket.send_json((arr.shape, str(arr.dtype)), zmq.SNDMORE)
+    socket.send(np.ascontiguousarray(arr), copy=False)
+
+
+def array_from_frames(frames: T.List[zmq.Frame]) -> np.ndarray:
+    shape, dtype = json.loads(frames[0].bytes)
+    return np.frombuffer(frames[1].buffer, dtype=dtype).reshape(shape)
+
+
+def recv_array(socket: zmq.Socket) -> np.ndarray:
+    return array_from_frames(socket.recv_multipart(copy=False))
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class BlockServer:
+    """Serves the blocks returned by `read_block` to a `BlockClient`.
+
+    Commands are ``(cmd, val)`` json pairs: ``read``, ``read_shm``,
+    ``shm_info``, ``quit`` and every name in `commands`, which is called with
+    ``val`` and must return something json serializable.
+    """
+
+    read_block: T.Callable[[], np.ndarray]
+    addr: str = "tcp://127.0.0.1:5555"
+    commands: T.Dict[str, T.Callable] = attr.Factory(dict)
+    n_slots: int = 4
+    ring: T.Optional[ShmRing] = None
+    context: zmq.Context = attr.Factory(zmq.Context.instance)
+
+    def _write_shm(self, arr: np.ndarray) -> ShmRing:
+        if self.ring is None or not self.ring.fits(arr.nbytes):
+            if self.ring is not None:
+                self.ring.close()
+            # Some headroom, so small changes of the shots don't reallocate.
+            self.ring = ShmRing(
+                n_slots=self.n_slots, slot_bytes=int(arr.nbytes * 1.5), create=True
+            )
+            logger.info(f"Created shared memory ring {self.ring.name}")
+        return self.ring
+
+    def handle(self, socket: zmq.Socket) -> bool:
+        cmd, val = socket.recv_json()
+        if cmd == "read":
+            send_array(socket, self.read_block())
+        elif cmd == "read_shm":
+            arr = self.read_block()
+            ring = self._write_shm(arr)
+            slot, seq = ring.write(arr)
+            socket.send_json(
+                (arr.shape, str(arr.dtype), ring.name, ring.slot_bytes, slot, seq)
+            )
+        elif cmd == "shm_info":
+            socket.send_json(self.n_slots)
+        elif cmd == "quit":
+            socket.send_json("quitting")
+            return False
+        elif cmd in self.commands:
+            socket.send_json(self.commands[cmd](val))
+        else:
+            socket.send_json(("error", f"Unknown command {cmd}"))
+        return True
+
+    def serve_forever(self):
+        socket = self.context.socket(zmq.REP)
+        socket.bind(self.addr)
+        try:
+            while self.handle(socket):
+                pass
+        finally:
+            socket.close(linger=0)
+            if self.ring is not None:
+                self.ring.close()
+                self.ring = None
+
+
+def is_local(addr: str) -> bool:
+    host = addr.split("://")[-1].rsplit(":", 1)[0]
+    return addr.startswith("ipc://") or host in ("127.0.0.1", "localhost")
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class BlockClient:
+    """Client side of `BlockServer`.
+
+    Uses shared memory if the server is on the same host and supports it,
+    otherwise falls back to sending the blocks over the socket. Arrays
+    returned by `read` with shared memory are views into the ring and are
+    overwritten after ``n_slots - 1`` further reads.
+    """
+
+    addr: str = "tcp://127.0.0.1:5555"
+    use_shm: T.Optional[bool] = None
+    context: zmq.Context = attr.Factory(zmq.Context.instance)
+    socket: zmq.Socket = attr.ib(init=False)
+    ring: T.Optional[ShmRing] = None
+
+    def __attrs_post_init__(self):
+        self._connect()
+        if self.use_shm is None:
+            self.use_shm = is_local(self.addr) and self._server_has_shm()
+        logger.info(f"BlockClient {self.addr}, shared memory: {self.use_shm}")
+
+    def _connect(self):
+        self.socket = self.context.socket(zmq.REQ)
+        self.socket.connect(self.addr)
+
+    def _server_has_shm(self) -> bool:
+        ans = self.command("shm_info")
+        return isinstance(ans, int)
+
+    def _request(self, cmd: str, val: T.Any = "") -> T.List[zmq.Frame]:
+        self.socket.send_json((cmd, val))
+        return self.socket.recv_multipart(copy=False)
+
+    @property
+    def _read_cmd(self) -> str:
+        return "read_shm" if self.use_shm else "read"
+
+    def _block(self, frames: T.List[zmq.Frame]) -> np.ndarray:
+        if not self.use_shm:
+            return array_from_frames(frames)
+        shape, dtype, name, slot_bytes, slot, seq = json.loads(frames[0].bytes)
+        if self.ring is None or self.ring.name != name:
+            if self.ring is not None:
+                self.ring.close()
+            self.ring = ShmRing(name=name, slot_bytes=slot_bytes)
+        return self.ring.view(slot, shape, dtype)
+
+    def command(self, cmd: str, val: T.Any = "") -> T.Any:
+        return json.loads(self._request(cmd, val)[0].bytes)
+
+    def request_array(self, cmd: str, val: T.Any = "") -> np.ndarray:
+        """Sends a command which is answered with an array over the socket."""
+        return array_from_frames(self._request(cmd, val))
+
+    def read(self) -> np.ndarray:
+        return self._block(self._request(self._read_cmd))
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        self.socket.close(linger=0)
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class PipelinedBlockClient(BlockClient):
+    """Keeps the next read request in flight while the last block is processed.
+
+    Talks to the same REP socket as `BlockClient`, but via a DEALER socket.
+    The server queues the prefetch request and starts acquiring the next block
+    right after sending the current one. If the server does not answer within
+    `timeout_ms`, the socket is recreated and a `TimeoutError` is raised, so a
+    lost server never blocks the caller for good.
+
+    A block already in flight is dropped when one of `invalidating_cmds` is
+    sent, since it was acquired with the old settings. Changes of the setup
+    outside of the server, e.g. a move of the delay line, must call
+    `invalidate`.
+    """
+
+    timeout_ms: int = 5000
+    invalidating_cmds: T.Tuple[str, ...] = ("set_shots", "set_back")
+    _in_flight: bool = False
+    _prefetched: T.Optional[T.List[zmq.Frame]] = None
+    _stale: bool = False
+
+    def _connect(self):
+        self.socket = self.context.socket(zmq.DEALER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.connect(self.addr)
+        self._in_flight = False
+        self._prefetched = None
+        self._stale = False
+
+    def invalidate(self):
+        """Drops the prefetched block and the one in flight, the next read
+        requests a new block."""
+        self._prefetched = None
+        self._stale = self._in_flight
+
+    def _send(self, cmd: str, val: T.Any = ""):
+        # The empty frame is the envelope delimiter the REP socket expects.
+        self.socket.send_multipart([b"", json.dumps((cmd, val)).encode()])
+
+    def _recv(self) -> T.List[zmq.Frame]:
+        if not self.socket.poll(self.timeout_ms):
+            logger.warning(f"No answer from {self.addr}, reconnecting")
+            self.socket.close()
+            self._connect()
+            raise TimeoutError(f"{self.addr} did not answer in {self.timeout_ms} ms")
+        return self.socket.recv_multipart(copy=False)[1:]
+
+    def _request(self, cmd: str, val: T.Any = "") -> T.List[zmq.Frame]:
+        if self._in_flight:
+            frames = self._recv()
+            self._in_flight = False
+            if cmd not in self.invalidating_cmds and not self._stale:
+                self._prefetched = frames
+            self._stale = False
+        if cmd in self.invalidating_cmds:
+            self._prefetched = None
+        self._send(cmd, val)
+        return self._recv()
+
+    def read(self) -> np.ndarray:
+        if self._prefetched is not None:
+            frames, self._prefetched = self._prefetched, None
+        else:
+            if self._in_flight and self._stale:
+                # Acquired before `invalidate`
+                self._recv()
+                self._in_flight = False
+            if not self._in_flight:
+                self._send(self._read_cmd)
+            self._in_flight = False
+            frames = self._recv()
+        self._stale = False
+        self._send(self._read_cmd)
+        self._in_flight = True
+        return self._block(frames)
@@ -0,0 +1,83 @@
+"""Ring of preallocated blocks, which is filled shot by shot.
+
+Drivers which deliver each shot in a callback write it with `add_shot`, the
+reader waits for complete blocks with `next_block`. A block which does not
+fit into the queue is dropped and its buffer is reused, hence the buffers in
+the queue are never overwritten.
+"""
+
+import queue
+import time
+import typing as T
+
+import attr
+import numpy as np
+
+from MessPy import metrics
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class ShotRing:
+    shots: int
+    pixel: int
+    n_buffers: int = 4
+    name: str = "ring"
+    # Called after each completed block, e.g. to arm the trigger of the next one
+    on_block: T.Optional[T.Callable[[], None]] = None
+    dropped_blocks: int = 0
+    data: np.ndarray = attr.ib(init=False)
+    "(n_buffers, shots, pixel) scans"
+    aux: np.ndarray = attr.ib(init=False)
+    "(n_buffers, shots) value stored with each shot, e.g. the chopper input"
+    blocks: queue.Queue = attr.ib(init=False)
+    _idx: int = 0
+    _count: int = 0
+    _generation: int = 0
+    _block_generation: int = 0
+
+    def __attrs_post_init__(self):
+        self.data = np.zeros((self.n_buffers, self.shots, self.pixel))
+        self.aux = np.zeros((self.n_buffers, self.shots))
+        # Two buffers are in use by the writer and the reader.
+        self.blocks = queue.Queue(maxsize=self.n_buffers - 2)
+
+    def add_shot(self, scan: np.ndarray, aux: float = 0):
+        if self._count == 0:
+            self._block_generation = self._generation
+        i = self._idx
+        self.data[i, self._count, : scan.size] = scan
+        self.aux[i, self._count] = aux
+        self._count += 1
+        if self._count < self.shots:
+            return
+        self._count = 0
+        try:
+            self.blocks.put_nowait((self._block_generation, i))
+            self._idx = (i + 1) % self.n_buffers
+        except queue.Full:
+            self.dropped_blocks += 1
+            metrics.dropped_shots.inc(self.shots, cam=self.name)
+        metrics.queue_depth.set(self.blocks.qsize(), queue=self.name)
+        if self.on_block is not None:
+            self.on_block()
+
+    def discard(self):
+        """Drops the queued blocks and the one being filled, e.g. after a move."""
+        self._generation += 1
+        while True:
+            try:
+                self.blocks.get_nowait()
+            except queue.Empty:
+                break
+
+    def next_block(self, timeout: float = 5) -> T.Tuple[np.ndarray, np.ndarray]:
+        """Waits for the next block started after the last `discard`.
+
+        Returns copies of the (shots, pixel) scans and the (shots,) aux values.
+        Raises `queue.Empty` after `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            gen, i = self.blocks.get(timeout=max(deadline - time.monotonic(), 0))
+            if gen == self._generation:
+                return self.data[i].copy(), self.aux[i].copy()
@@ -1,11 +1,20 @@
+import functools
 import math
-from typing import Optional, Callable, Union, overload, Self
+import threading
+import time
+from typing import Optional, Callable, Sequence, Union, overload, Self
 
 import attr
 import numpy as np
+from loguru import logger
 from numpy.typing import NDArray
+import scipy.fft
 from scipy.constants import c
-from numba import njit, prange
+
+from MessPy.Config import config
+from MessPy.tracing import traced
+import numba
+from numba import njit, prange, typeof, types
 
 LOG10 = math.log(10)
 
@@ -42,8 +51,45 @@ def first(arr, val: float) -> int:
     return 0
 
 
+def check_pattern(
+    ch: np.ndarray, period: int, first_frame: int, val: float = 1
+) -> Optional[str]:
+    """Checks that the trigger channel `ch` is above `val` exactly on the
+    shots `first_frame + k * period`, e.g. every second shot for the chopper.
+
+    A lost trigger shifts the pattern, returns a description of the problem
+    or None if the block is in sync.
+    """
+    ch = np.asarray(ch)
+    expected = (np.arange(ch.shape[-1]) - first_frame) % period == 0
+    wrong = np.flatnonzero((ch > val) != expected)
+    if wrong.size:
+        return (
+            f"Trigger pattern of period {period} broken at {wrong.size} shots, "
+            f"first at shot {wrong[0]}"
+        )
+    return None
+
+
+def data_dtype() -> np.dtype:
+    """dtype of the arrays derived from raw data, set by `config.precision`."""
+    return np.dtype(config.precision)
+
+
+def as_data(arr) -> np.ndarray:
+    """`arr` as a C-contiguous float array, copied only if needed.
+
+    Floats are only narrowed to the data dtype, e.g. float32 lines stay
+    float32 with the float64 default. Counts are converted to the data dtype."""
+    arr = np.asarray(arr)
+    dtype = data_dtype()
+    if arr.dtype in (np.float32, np.float64) and arr.dtype.itemsize < dtype.itemsize:
+        dtype = arr.dtype
+    return np.ascontiguousarray(arr, dtype)
+
+
 def stats(probe, probe_max=None):
-    mean, std, mi, ma = fast_stats2d(probe.astype('float64')).T
+    mean, std, mi, ma = fast_stats2d(as_data(probe)).T
     probe_mean = mean
     probe_std = 100 * std / probe_mean
     if probe_max is not None:
@@ -74,14 +120,15 @@ def fast_stats(arr: NDArray[np.float64]) -> tuple[float, float, float, float]:
     s = 0
     sq_sum = 0
     n = 0
-    min_val = max_val = arr[0]
+    min_val = max_val = np.float64(arr[0])
     for x in arr:
         if not math.isnan(x):
             n += 1
         else:
             continue
         s += x
-        sq_sum += x * x
+        # The square in float64, also for float32 data
+        sq_sum += np.float64(x) * x
         if x > max_val:
             max_val = x
         elif x < min_val:
@@ -139,6 +186,183 @@ def fast_col_mean(arr, idx) -> NDArray[np.float64]:
     return s
 
 
+@njit(parallel=True, cache=True)
+def downsample_lines(raw, out, offset: int, n_downsample: int, baseline_start: int):
+    """
+    Given a (shots, lines, pixel) array of raw counts, skip `offset` pixels at both
+    ends, average `n_downsample` neighboring pixels and subtract the baseline of
+    each line, which is the mean over all shots of the bins from `baseline_start`
+    on. Writes the first bins into the preallocated (lines, shots, channels) `out`
+    array in a single pass over the raw data.
+    """
+    shots, lines, pixel = raw.shape
+    channels = out.shape[2]
+    n_bins = (pixel - 2 * offset) // n_downsample
+    base = np.zeros((shots, lines))
+    for s in prange(shots):
+        for l in range(lines):
+            for b in range(n_bins):
+                acc = 0.0
+                p0 = offset + b * n_downsample
+                for k in range(n_downsample):
+                    acc += raw[s, l, p0 + k]
+                acc /= n_downsample
+                if b < channels:
+                    out[l, s, b] = acc
+                if b >= baseline_start:
+                    base[s, l] += acc
+    n_base = shots * (n_bins - baseline_start)
+    for l in range(lines):
+        bl = base[:, l].sum() / n_base
+        for s in prange(shots):
+            for b in range(channels):
+                out[l, s, b] -= bl
+    return out
+
+
+@njit(parallel=True, cache=True)
+def reject_outliers(arr, n_mad: float) -> NDArray[np.bool_]:
+    """
+    Given a (pixel, shots) array, return a mask of the shots to keep. A shot is
+    rejected if its spectrally integrated intensity is more than `n_mad` scaled
+    median absolute deviations away from the median of the shots of the same
+    chopper phase. Shots are rejected in pairs (2k, 2k + 1), hence the chopper
+    stays balanced.
+    """
+    pixel, shots = arr.shape
+    total = np.zeros(shots)
+    for s in prange(shots):
+        acc = 0.0
+        for p in range(pixel):
+            acc += arr[p, s]
+        total[s] = acc
+    bad = np.zeros(shots, np.bool_)
+    for phase in range(2):
+        x = total[phase::2]
+        med = np.median(x)
+        # 1.4826 scales the MAD to the std of normal noise
+        limit = n_mad * 1.4826 * np.median(np.abs(x - med))
+        for k in prange(x.shape[0]):
+            if abs(x[k] - med) > limit or math.isnan(x[k]):
+                bad[2 * k + phase] = True
+    keep = np.ones(shots, np.bool_)
+    for k in prange(shots // 2):
+        if bad[2 * k] or bad[2 * k + 1]:
+            keep[2 * k] = False
+            keep[2 * k + 1] = False
+    if shots % 2 == 1:
+        keep[shots - 1] = False
+    return keep
+
+
+def outlier_mask(
+    data: Union[np.ndarray, Sequence[np.ndarray]], n_mad: float
+) -> NDArray[np.bool_]:
+    """Mask of the shots kept by `reject_outliers` for a (pixel, shots) array
+    or a sequence of them, e.g. all lines used by the signal. A shot is kept
+    if it is kept in every line. All shots are kept if `n_mad` is 0."""
+    if isinstance(data, np.ndarray):
+        data = (data,)
+    keep = np.ones(data[0].shape[1], np.bool_)
+    if n_mad <= 0:
+        return keep
+    for line in data:
+        keep &= reject_outliers(as_data(line), float(n_mad))
+    return keep
+
+
+def n_rejected(keep: NDArray[np.bool_]) -> int:
+    """Number of shots rejected as outliers. The unpaired last shot of an odd
+    block is always left out and does not count."""
+    paired = keep.shape[0] - keep.shape[0] % 2
+    return paired - int(keep[:paired].sum())
+
+
+# Argument types of the kernels as called by the cams, compiled by `warmup`.
+# Other types still work, but are compiled on their first call.
+_u16, _f32, _f64, _i64 = types.uint16, types.float32, types.float64, types.int64
+KERNEL_SIGNATURES = {
+    first: [(_f64[::1], _i64)],
+    fast_stats: [(t[::1],) for t in (_f32, _f64)],
+    fast_stats2d: [(t[:, ::1],) for t in (_f32, _f64)],
+    fast_signal: [(_f64[::1],)],
+    fast_signal2d: [(_f64[:, ::1],)],
+    fast_col_mean: [(t[:, :, :], types.boolean[:, ::1]) for t in (_u16, _f32, _f64)],
+    reject_outliers: [(t[:, ::1], _f64) for t in (_f32, _f64)],
+    downsample_lines: [
+        (_u16[:, :, ::1], t[:, :, ::1], _i64, _i64, _i64) for t in (_f32, _f64)
+    ],
+}
+
+
+def warmup() -> float:
+    """Compiles the kernels for `KERNEL_SIGNATURES`, loading them from the
+    numba cache if possible. Returns the time it took."""
+    if _aot is not None:
+        return 0.0
+    t0 = time.perf_counter()
+    for kernel, sigs in KERNEL_SIGNATURES.items():
+        for sig in sigs:
+            kernel.compile(sig)
+    dt = time.perf_counter() - t0
+    logger.info(f"Compiled the signal processing kernels in {dt:.2f} s")
+    return dt
+
+
+def warmup_in_background() -> threading.Thread:
+    """Runs `warmup` in a thread, e.g. while the hardware initializes.
+
+    A kernel called during the warmup waits for its compilation."""
+    # Compiling the parallel kernels starts the threading layer. Started
+    # from another thread, tbb hangs at interpreter exit.
+    numba.get_num_threads()
+    thread = threading.Thread(target=warmup, name="jit-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def aot_name(kernel, i: int) -> str:
+    """Name of `kernel` for its i-th signature in the AOT extension."""
+    return f"{kernel.__name__}_{i}"
+
+
+def _with_aot(kernel):
+    """Calls the AOT compiled `kernel` for the known signatures."""
+    table = {
+        sig: getattr(_aot, aot_name(kernel, i))
+        for i, sig in enumerate(KERNEL_SIGNATURES[kernel])
+    }
+
+    @functools.wraps(kernel.py_func)
+    def call(*args):
+        fn = table.get(tuple(typeof(a) for a in args), kernel)
+        return fn(*args)
+
+    return call
+
+
+try:
+    from MessPy.Instruments import _signal_processing_aot as _aot
+except ImportError:
+    _aot = None
+
+if _aot is not None:
+    # Only the kernels not called by other kernels are replaced
+    try:
+        (
+            first, fast_stats2d, fast_signal2d, fast_col_mean, downsample_lines,
+            reject_outliers,
+        ) = map(
+            _with_aot,
+            (first, fast_stats2d, fast_signal2d, fast_col_mean, downsample_lines,
+             reject_outliers),
+        )
+        logger.info("Using the AOT compiled signal processing kernels")
+    except AttributeError:
+        logger.warning("AOT extension does not match the kernel signatures, rebuild it")
+        _aot = None
+
+
 @attr.s(auto_attribs=True)
 class Spectrum:
     data: np.ndarray
@@ -155,6 +379,7 @@ class Spectrum:
     def create(
         cls, data, data_max=None, name=None, frames=None, first_frame=None
     ) -> Self:
+        data = as_data(data)
         mean, std, max = stats(data, data_max)
         signal = None
         if frames is not None:
@@ -162,13 +387,14 @@ class Spectrum:
             frame_data = np.empty((mean.shape[0], frames))
 
             for i in range(frames):
-                frame_data[:, i] = np.nanmean(data[:, i::frames], 1)
+                frame_data[:, i] = np.nanmean(data[:, i::frames], 1, dtype=np.float64)
             frame_data = np.roll(frame_data, -first_frame, 1)
             if frames == 2:
                 with np.errstate(invalid="ignore"):
                     signal = (
                         1000 / LOG10 * np.log1p(frame_data[:, 0] / frame_data[:, 1] - 1)
                     )
+            frame_data = frame_data.astype(data.dtype, copy=False)
         else:
             frame_data = None
 
@@ -187,19 +413,77 @@ class Spectrum:
 
 @attr.s(auto_attribs=True, cmp=False)
 class Reading:
-    """Each array has the shape (n_type, pixel), except for full_data which has the shape (n_type, pixel, shots)"""
+    """Each array has the shape (n_type, pixel), except for full_data which has the shape (n_type, pixel, shots)
+
+    `first_shot` is the hardware counter of the first shot in the block, if the cam has one.
+    A reading is not `valid` if the cam detected lost frames or triggers, `reason` says which.
+
+    Cams may pass `full_data` as a sequence of the (pixel, shots) arrays of the lines,
+    these are kept as they are and only stacked when `full_data` is accessed.
+    """
 
     lines: np.ndarray
     stds: np.ndarray
     signals: np.ndarray
-    full_data: np.ndarray
+    _full_data: Union[np.ndarray, Sequence[np.ndarray]]
     shots: int
     valid: bool
+    first_shot: Optional[int] = None
+    reason: Optional[str] = None
+    rejected_shots: int = 0
+    "Number of outlier shots left out of the signals"
+
+    @property
+    def full_data(self) -> np.ndarray:
+        if not isinstance(self._full_data, np.ndarray):
+            self._full_data = np.stack(self._full_data)
+        return self._full_data
+
+    @property
+    def line_data(self) -> Sequence[np.ndarray]:
+        """The full data of each line, without stacking them."""
+        return self._full_data
+
+
+@functools.lru_cache(maxsize=32)
+def cached_window(window: Callable, n: int, dtype: np.dtype) -> np.ndarray:
+    """`window(n)`, computed once per length and dtype. Read-only."""
+    win = window(n).astype(dtype)
+    win.flags.writeable = False
+    return win
+
+
+@traced("Reading2D fft", "processing")
+def transform_2d(
+    interferogram: np.ndarray, window: Optional[Callable], n_fft: int
+) -> np.ndarray:
+    """
+    Real part of the FFT along the last axis of the (lines, t2) interferograms,
+    zero padded to `n_fft` points. The first point is halved and the data is
+    weighted by the falling half of `window`.
+
+    Uses `config.fft_workers` threads. scipy.fft caches the plans, hence
+    repeated transforms of the same size do not plan again.
+    """
+    a = interferogram.copy()
+    a[:, 0] *= 0.5
+    if window is not None:
+        win = cached_window(window, a.shape[1] * 2, a.dtype)
+        a *= win[None, a.shape[1] :]
+    return scipy.fft.rfft(a, n_fft, axis=1, workers=config.fft_workers).real
+
+
+class InvalidBlockError(IOError):
+    """A block stayed invalid after `config.max_reacquire` reads."""
 
 
 @attr.s(auto_attribs=True, cmp=False)
 class Reading2D:
-    """Has the shape (pixel, t2)"""
+    """Has the shape (pixel, t2)
+
+    With `fast_len`, the interferogram is zero padded to the next size that
+    is fast to transform, instead of exactly `upsample` times its length.
+    """
 
     spectra: Spectrum
     interferogram: np.ndarray
@@ -207,6 +491,7 @@ class Reading2D:
     window: Optional[Callable] = np.hanning
     upsample: int = 2
     rot_frame: float = 0
+    fast_len: bool = False
     freqs: np.ndarray = attr.ib()
     signal_2D: np.ndarray = attr.ib()
     frames: Optional[np.ndarray] = None
@@ -222,6 +507,41 @@ class Reading2D:
         ref_frames: Optional[np.ndarray] = None,
         **kwargs,
     ) -> "Reading2D":
+        sig = cls.calc_interferogram(s, t2_ps)
+        if save_frame_enabled:
+            kwargs["frames"] = s.frame_data
+            if ref_frames is not None:
+                kwargs["ref_frames"] = ref_frames
+        return cls(
+            spectra=s, interferogram=sig, t2_ps=t2_ps, rot_frame=rot_frame, **kwargs
+        )
+
+    @classmethod
+    def from_spectra(
+        cls,
+        spectra: Sequence[Spectrum],
+        t2_ps: np.ndarray,
+        rot_frame: float,
+        save_frame_enabled: bool,
+        **kwargs,
+    ) -> list["Reading2D"]:
+        """`from_spectrum` for several lines, transformed together in one call."""
+        readings = [
+            cls.from_spectrum(
+                s, t2_ps, rot_frame, save_frame_enabled, signal_2D=None, **kwargs
+            )
+            for s in spectra
+        ]
+        r = readings[0]
+        ifr = np.concatenate([r.interferogram for r in readings])
+        sig_2d = transform_2d(ifr, r.window, r.n_fft)
+        splits = np.cumsum([len(r.interferogram) for r in readings])[:-1]
+        for r, part in zip(readings, np.split(sig_2d, splits)):
+            r.signal_2D = part
+        return readings
+
+    @staticmethod
+    def calc_interferogram(s: Spectrum, t2_ps: np.ndarray) -> np.ndarray:
         assert s.frame_data is not None
         f = s.frame_data
         n = s.frame_data.shape[1] / len(t2_ps)
@@ -238,26 +558,18 @@ class Reading2D:
         else:
             raise ValueError(f"Invalid number of frames {n}")
         assert sig.shape[1] == len(t2_ps)
-        if save_frame_enabled:
-            kwargs["frames"] = f
-            if ref_frames is not None:
-                kwargs["ref_frames"] = ref_frames
-        return cls(
-            spectra=s, interferogram=sig, t2_ps=t2_ps, rot_frame=rot_frame, **kwargs
-        )
+        return sig
+
+    @property
+    def n_fft(self) -> int:
+        n = len(self.t2_ps) * self.upsample
+        return scipy.fft.next_fast_len(n, real=True) if self.fast_len else n
 
     @freqs.default
     def calc_freqs(self):
-        freqs = np.fft.rfftfreq(
-            len(self.t2_ps) * self.upsample, self.t2_ps[1] - self.t2_ps[0]
-        )
+        freqs = np.fft.rfftfreq(self.n_fft, self.t2_ps[1] - self.t2_ps[0])
         return THz2cm(freqs) + self.rot_frame
 
     @signal_2D.default
     def calc_2d(self):
-        a = self.interferogram.copy()
-        a[:, 0] *= 0.5
-        if self.window is not None:
-            win = self.window(a.shape[1] * 2)
-            a = a * win[None, a.shape[1] :]
-        return np.fft.rfft(a, a.shape[1] * self.upsample, 1).real
+        return transform_2d(self.interferogram, self.window, self.n_fft)
@@ -9,6 +9,7 @@ import numpy as np
 from smaract import ctl
 
 from MessPy.Instruments.interfaces import ILissajousScanner
+from MessPy.Instruments.trajectory import LissajousTrajectory
 
 
 @attr.define
@@ -105,34 +106,12 @@ class SmarActXYZ(ILissajousScanner):
         )
 
     def start_contimove(self, x_mm, y_mm):
-        self.t0 = time.time()
-        self.contimove = True
-        self.set_pos_mm(0, y_mm)
-        while any(self.is_moving()):
-            pass
-        self.conti_thread = threading.Thread(target=self._do_contimove, args=(x_mm, y_mm))
-        self.conti_thread.start()
-        #self._do_contimove(1, 1)
+        # Ellipse with a period of 2 s around the home position
+        traj = LissajousTrajectory(amp=(y_mm, x_mm), freq=(0.5, 0.5))
+        self.run_trajectory(traj, rate=100, read_back=False)
 
     def stop_contimove(self):
-        self.contimove = False
-
-    def _do_contimove(self, x_mm, y_mm):
-        x = 0
-        while self.contimove:
-            print(self.get_pos_mm())
-            t = time.time() - self.t0
-            #if x == 0:
-            #    x = 1
-            #    y = 3
-            x = y_mm*np.sin(2*np.pi*t/2)
-            y = x_mm*np.cos(2 * np.pi * t / 2)
-            #else:
-            #    x = 0
-            #    y = 0
-            print('jo', x, y)
-            self.set_pos_mm(x, y)
-            time.sleep(0.01)
+        self.stop_trajectory()
 
 
 if __name__ == '__main__':
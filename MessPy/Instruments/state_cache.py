@@ -0,0 +1,112 @@
+"""Time-limited cache for the state queries of a device.
+
+GUI pollers, plans and the metadata collection all ask the devices for their
+position or state, each request going over a slow bus. `StateCache` keeps the
+last answer of each query for a per-query time-to-live (TTL), concurrent
+callers of an expired query wait for the one query in flight instead of
+sending their own. Motion commands invalidate the cache and the signals of the
+device update it with the values they carry.
+"""
+
+import functools
+import threading
+import time
+import typing as T
+
+import attr
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class StateCache:
+    """Maps a query name to its last value and the time it was obtained.
+
+    A TTL of 0 disables the caching, concurrent calls are still merged.
+    """
+
+    ttl: T.Dict[str, float] = attr.Factory(dict)
+    hits: int = 0
+    misses: int = 0
+    _values: T.Dict[str, T.Tuple[float, T.Any]] = attr.ib(init=False, factory=dict)
+    _locks: T.Dict[str, threading.Lock] = attr.ib(init=False, factory=dict)
+    _lock: threading.Lock = attr.ib(init=False, factory=threading.Lock)
+    _generation: int = attr.ib(init=False, default=0)
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _fresh(self, key: str, ttl: float) -> T.Tuple[bool, T.Any]:
+        entry = self._values.get(key)
+        if entry is not None and time.monotonic() - entry[0] < ttl:
+            return True, entry[1]
+        return False, None
+
+    def get(self, key: str, query: T.Callable[[], T.Any]) -> T.Any:
+        """Return the cached value of `key`, calls `query` if it has expired."""
+        ttl = self.ttl.get(key, 0)
+        ok, val = self._fresh(key, ttl)
+        if ok:
+            self.hits += 1
+            return val
+        t_request = time.monotonic()
+        with self._key_lock(key):
+            # Another thread may have finished the query while we waited.
+            entry = self._values.get(key)
+            if entry is not None and entry[0] >= t_request:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            gen = self._generation
+            val = query()
+            # Do not store answers which may predate a motion command.
+            if gen == self._generation:
+                self._values[key] = (time.monotonic(), val)
+            return val
+
+    def put(self, key: str, value: T.Any):
+        self._values[key] = (time.monotonic(), value)
+
+    def invalidate(self, *keys: str):
+        """Drop the given keys, all if none are given."""
+        self._generation += 1
+        if not keys:
+            self._values.clear()
+        for k in keys:
+            self._values.pop(k, None)
+
+
+def cached_query(cache: StateCache, key: str, method: T.Callable) -> T.Callable:
+    """Wrap a bound query method, only calls without arguments are cached."""
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if args or kwargs:
+            return method(*args, **kwargs)
+        return cache.get(key, method)
+
+    return wrapper
+
+
+def uncached(method: T.Callable) -> T.Callable:
+    """The original method of a wrapper from `cached_query` or `invalidating`."""
+    return getattr(method, "__wrapped__", method)
+
+
+def invalidating(
+    cache: StateCache, method: T.Callable, on_change: T.Optional[T.Callable] = None
+) -> T.Callable:
+    """Wrap a bound command method, which changes the state of the device.
+
+    `on_change` is called after the command, too."""
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        cache.invalidate()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            cache.invalidate()
+            if on_change is not None:
+                on_change()
+
+    return wrapper
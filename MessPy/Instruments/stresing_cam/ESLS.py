@@ -7,14 +7,21 @@ Created on Thu Feb 28 12:08:01 2019
 
 from nicelib import load_lib, NiceLib, Sig, NiceObject, RetHandler, ret_ignore
 import attr
-from typing import Tuple, List
+from typing import Generator, Optional, Tuple, List
 import numpy as np
+import queue
 import time
 import threading
 import scipy.stats as st
+from loguru import logger
 from MessPy.Instruments.interfaces import ICam, Reading
+from MessPy.Instruments.signal_processing import data_dtype, downsample_lines
+from MessPy.tracing import span
+from MessPy import metrics
 from wrapt import synchronized
 
+PIXEL = 2400
+
 
 class ESLS(NiceLib):
     _info_ = load_lib("esls", __package__)
@@ -104,6 +111,19 @@ class Cam(ICam):
     last_read: np.ndarray = np.empty((0))
     lock: threading.Lock = attr.Factory(threading.Lock)
 
+    rep_rate: float = 1000.0
+    n_downsample: int = 5
+    # Number of preallocated block buffers, a block handed out by the stream
+    # is valid until this many further blocks were read.
+    stream_depth: int = 4
+    _raw: np.ndarray = attr.ib(init=False)
+    _out: np.ndarray = attr.ib(init=False)
+    _blocks: Optional[queue.Queue] = None
+    _stream_thread: Optional[threading.Thread] = None
+    _stop: threading.Event = attr.Factory(threading.Event)
+    # Incremented by `discard_blocks`, blocks started before are dropped
+    _generation: int = 0
+
     def __attrs_post_init__(self):
         # drv.InitBoard(sym=0, burst = 1, pixel=2400, waits=2, flag816=1, pportadr=0,
         #              pclk=0, xckdelay=3)
@@ -116,6 +136,7 @@ class Cam(ICam):
         drv.HighSlope()
         drv.SetExtTrig()
         self.start_ring_thread()
+        self.start_streaming()
 
     def start_ring_thread(self):
         drv.StartRingReadThread(4000, 31, 0)
@@ -123,30 +144,104 @@ class Cam(ICam):
     def stop_ring_thread(self):
         ESLS.StopRingReadThread()
 
-    def read_ring(self) -> Tuple[np.ndarray]:
-        arr = np.zeros((self.shots, 2, 2400), dtype=np.uint32)
-        while drv.ReadRingCounter() < self.shots:
-            time.sleep(0.01)
-        ESLS.ReadRingBlock(arr.view(np.uint32), 0, self.shots)
-        x = arr
-        x = x.view(np.uint16)
-        x = x.ravel()[: x.size // 2]
-        x = x.reshape(self.shots, 2, 2400)
+    def _alloc_buffers(self):
+        # The driver writes uint16 pixels, but expects twice the space.
+        self._raw = np.zeros((self.stream_depth, self.shots, 2, PIXEL), dtype=np.uint32)
+        self._out = np.zeros(
+            (self.stream_depth, 2, self.shots, self.channels), dtype=data_dtype()
+        )
 
-        a = x[:, 0, 100:-100]
-        b = x[:, 1, 100:-100]
+    def _raw_view(self, i: int) -> np.ndarray:
+        n = self.shots * 2 * PIXEL
+        return self._raw[i].view(np.uint16).reshape(-1)[:n].reshape(self.shots, 2, PIXEL)
 
-        return a, b
+    def _wait_for_ring(self, stop: Optional[threading.Event] = None) -> bool:
+        while (missing := self.shots - drv.ReadRingCounter()) > 0:
+            if stop is not None and stop.is_set():
+                return False
+            # Sleep until the shots should have arrived instead of polling.
+            time.sleep(max(missing / self.rep_rate, 0.001))
+        return True
 
-    def read_cam(self, n_downsample=5):
+    def read_ring(
+        self, i: int = 0, stop: Optional[threading.Event] = None
+    ) -> Optional[np.ndarray]:
+        """Reads the next block of the driver ring into raw buffer `i`.
+
+        Returns None if `stop` was set while waiting for the shots.
+        """
+        with span("acquire", "cam"):
+            if not self._wait_for_ring(stop):
+                return None
+            ESLS.ReadRingBlock(self._raw[i], 0, self.shots)
+        return self._raw_view(i)
+
+    def _stream_loop(self):
+        """Puts downsampled (generation, probe, pump) blocks into the queue.
+
+        The blocks are views into the preallocated buffers, which are reused
+        round-robin. A block which does not fit into the queue is dropped and
+        its buffer is reused, the buffers in the queue stay untouched.
+        """
+        i = 0
+        while True:
+            gen = self._generation
+            if (raw := self.read_ring(i, self._stop)) is None:
+                return
+            out = downsample_lines(raw, self._out[i], 100, self.n_downsample, 400)
+            try:
+                self._blocks.put_nowait((gen, out[0], out[1]))
+                i = (i + 1) % self.stream_depth
+            except queue.Full:
+                logger.warning("Stresing stream: consumer too slow, dropping block")
+                metrics.dropped_shots.inc(self.shots, cam=self.name)
+            metrics.queue_depth.set(self._blocks.qsize(), queue=self.name)
+
+    def discard_blocks(self):
+        """Drops the queued blocks and the one being acquired, e.g. after a move."""
+        self._generation += 1
+        if self._blocks is None:
+            return
+        while True:
+            try:
+                self._blocks.get_nowait()
+            except queue.Empty:
+                break
+
+    def start_streaming(self):
+        """Reads the ring in a thread, so no shots are lost between readings."""
+        self._alloc_buffers()
+        # Two buffers are in use by the reader and the consumer.
+        self._blocks = queue.Queue(maxsize=self.stream_depth - 2)
+        self._stop.clear()
+        self._stream_thread = threading.Thread(target=self._stream_loop, daemon=True)
+        self._stream_thread.start()
+
+    def stop_streaming(self):
+        self._stop.set()
+        if self._stream_thread is not None:
+            self._stream_thread.join()
+            self._stream_thread = None
+
+    def iter_blocks(self) -> Generator[Tuple[np.ndarray, np.ndarray], None, None]:
+        """Generator of the blocks acquired by the stream thread since the
+        last `discard_blocks`, ends when the stream is stopped."""
+        while not self._stop.is_set():
+            try:
+                gen, a, b = self._blocks.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if gen == self._generation:
+                yield a, b
+
+    def read_cam(self):
         with self.lock:
-            a, b = self.read_ring()
-
-            a = a.reshape(a.shape[0], -1, n_downsample).mean(-1)
-            b = b.reshape(b.shape[0], -1, n_downsample).mean(-1)
-            a = a - 1 * a[:, 400:].mean(keepdims=True)
-            b = b - 1 * b[:, 400:].mean(keepdims=True)
-            a, b = a[:, :390], b[:, :390]
+            if self._stream_thread is None:
+                self.start_streaming()
+            block = next(self.iter_blocks(), None)
+            if block is None:
+                raise RuntimeError("Stresing stream was stopped")
+            a, b = block
             ext = np.empty((self.shots, 0))
             first = b[0, :390].sum() > b[1, :390].sum()
 
@@ -160,8 +255,9 @@ class Cam(ICam):
     def make_reading(self) -> Reading:
         a, b, chopper, ext = self.read_cam()
         if self.background is not None:
-            a -= self.background[0, ...]
-            b -= self.background[1, ...]
+            # Not in place, a and b are views into the stream buffers
+            a = a - self.background[0, ...]
+            b = b - self.background[1, ...]
         tmp = np.stack((a, b))
         tm = tmp.mean(1)
         fac = -1000 if chopper[0] else 1000
@@ -179,7 +275,9 @@ class Cam(ICam):
 
     def set_shots(self, shots):
         with self.lock:
+            self.stop_streaming()
             self.shots = shots
+            self.start_streaming()
         return True
 
     def get_shots(self):
@@ -191,6 +289,7 @@ class Cam(ICam):
         return slope * np.arange(390) + intercept
 
     def shutdown(self):
+        self.stop_streaming()
         ESLS.StopRingReadThread()
         drv.CCDDrvExit()
 
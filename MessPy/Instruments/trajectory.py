@@ -0,0 +1,244 @@
+"""Continuous xy-trajectories for `ILissajousScanner` stages.
+
+A `Trajectory` maps the time since its start onto a setpoint. The
+`TrajectoryRunner` streams these setpoints from a background thread at a
+fixed rate to the stage and logs the timestamped actual positions, hence a
+plan can acquire during the motion and assign the shots to positions
+afterwards with `TrajectoryRunner.positions_at`.
+
+All times are `time.monotonic` seconds.
+"""
+
+import abc
+import threading
+import time
+import typing as T
+from concurrent.futures import Future
+
+import attr
+import numpy as np
+from loguru import logger
+
+from MessPy.Instruments.state_cache import uncached
+
+if T.TYPE_CHECKING:
+    from MessPy.Instruments.interfaces import ILissajousScanner
+
+
+class Trajectory(abc.ABC):
+    """Base class, `duration` may be infinite."""
+
+    duration: float
+
+    @abc.abstractmethod
+    def positions(self, t: np.ndarray) -> np.ndarray:
+        """Setpoints at the times `t` since the start, shape (len(t), 2)."""
+
+    def start_pos(self) -> T.Tuple[float, float]:
+        x, y = self.positions(np.zeros(1))[0]
+        return float(x), float(y)
+
+
+def _lines(t, x0, x1, y0, y1, n_lines, t_line, t_turn, serpentine):
+    """Shared code of the raster and the serpentine trajectory."""
+    t = np.clip(t, 0, n_lines * (t_line + t_turn) - t_turn)
+    line = np.minimum(t // (t_line + t_turn), n_lines - 1)
+    tl = t - line * (t_line + t_turn)
+    dy = (y1 - y0) / max(n_lines - 1, 1)
+    frac = np.clip(tl / t_line, 0, 1)
+    turning = tl > t_line
+    # during the turn, move to the next line
+    turn_frac = np.where(turning, (tl - t_line) / max(t_turn, 1e-12), 0)
+    y = y0 + dy * (line + turn_frac)
+    if serpentine:
+        backwards = line % 2 == 1
+        frac = np.where(backwards, 1 - frac, frac)
+        x = x0 + (x1 - x0) * frac
+    else:
+        # flyback to the start of the line during the turn
+        x = np.where(turning, x1 + (x0 - x1) * turn_frac, x0 + (x1 - x0) * frac)
+    return np.stack((x, y), -1)
+
+
+@attr.s(auto_attribs=True)
+class RasterTrajectory(Trajectory):
+    """Lines along x, all in the same direction with a flyback in between."""
+
+    x0: float
+    x1: float
+    y0: float
+    y1: float
+    n_lines: int
+    speed: float
+    flyback_speed: T.Optional[float] = None
+
+    @property
+    def t_line(self) -> float:
+        return abs(self.x1 - self.x0) / self.speed
+
+    @property
+    def t_turn(self) -> float:
+        return abs(self.x1 - self.x0) / (self.flyback_speed or 4 * self.speed)
+
+    @property
+    def duration(self) -> float:
+        return self.n_lines * (self.t_line + self.t_turn) - self.t_turn
+
+    def positions(self, t: np.ndarray) -> np.ndarray:
+        return _lines(np.asarray(t, dtype=float), self.x0, self.x1, self.y0,
+                      self.y1, self.n_lines, self.t_line, self.t_turn, False)
+
+
+@attr.s(auto_attribs=True)
+class SerpentineTrajectory(Trajectory):
+    """Lines along x with alternating direction."""
+
+    x0: float
+    x1: float
+    y0: float
+    y1: float
+    n_lines: int
+    speed: float
+    t_turn: float = 0.05
+
+    @property
+    def t_line(self) -> float:
+        return abs(self.x1 - self.x0) / self.speed
+
+    @property
+    def duration(self) -> float:
+        return self.n_lines * (self.t_line + self.t_turn) - self.t_turn
+
+    def line_of(self, t: np.ndarray) -> np.ndarray:
+        """Index of the line at time `t`, -1 during the turns."""
+        t = np.asarray(t, dtype=float)
+        line = (t // (self.t_line + self.t_turn)).astype(int)
+        tl = t - line * (self.t_line + self.t_turn)
+        return np.where((tl > self.t_line) | (line >= self.n_lines) | (t < 0), -1, line)
+
+    def positions(self, t: np.ndarray) -> np.ndarray:
+        return _lines(np.asarray(t, dtype=float), self.x0, self.x1, self.y0,
+                      self.y1, self.n_lines, self.t_line, self.t_turn, True)
+
+
+@attr.s(auto_attribs=True)
+class LissajousTrajectory(Trajectory):
+    amp: T.Tuple[float, float]
+    freq: T.Tuple[float, float]
+    phase: T.Tuple[float, float] = (0, np.pi / 2)
+    center: T.Tuple[float, float] = (0, 0)
+    duration: float = np.inf
+
+    def positions(self, t: np.ndarray) -> np.ndarray:
+        t = np.asarray(t, dtype=float)[:, None]
+        arg = 2 * np.pi * np.array(self.freq) * t + np.array(self.phase)
+        return np.array(self.center) + np.array(self.amp) * np.sin(arg)
+
+
+@attr.s(auto_attribs=True)
+class SpiralTrajectory(Trajectory):
+    """Archimedean spiral from the center outwards with constant path speed."""
+
+    r_max: float
+    pitch: float
+    speed: float
+    center: T.Tuple[float, float] = (0, 0)
+
+    @property
+    def duration(self) -> float:
+        # r = b * phi, for large angles the arc length is b * phi**2 / 2
+        b = self.pitch / (2 * np.pi)
+        return self.r_max**2 / (2 * b) / self.speed
+
+    def positions(self, t: np.ndarray) -> np.ndarray:
+        t = np.clip(np.asarray(t, dtype=float), 0, self.duration)
+        b = self.pitch / (2 * np.pi)
+        phi = np.sqrt(2 * self.speed * t / b)
+        r = b * phi
+        return np.stack(
+            (self.center[0] + r * np.cos(phi), self.center[1] + r * np.sin(phi)), -1
+        )
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class TrajectoryRunner:
+    """Streams the setpoints of a trajectory to the stage at `rate` Hz."""
+
+    stage: "ILissajousScanner"
+    trajectory: Trajectory
+    rate: float = 50.0
+    read_back: bool = True
+    move_to_start: bool = True
+    t0: T.Optional[float] = None
+    times: T.List[float] = attr.Factory(list)
+    setpoints: T.List[T.Tuple[float, float]] = attr.Factory(list)
+    actual: T.List[T.Tuple[float, float]] = attr.Factory(list)
+    future: Future = attr.Factory(Future)
+    _stop: threading.Event = attr.ib(init=False, factory=threading.Event)
+    _thread: T.Optional[threading.Thread] = attr.ib(init=False, default=None)
+
+    def start(self) -> Future:
+        """Starts the thread, the future resolves when the trajectory ended."""
+        self.future.set_running_or_notify_cancel()
+        self._thread = threading.Thread(
+            target=self._run, name=f"trajectory {self.stage.name}", daemon=True
+        )
+        self._thread.start()
+        return self.future
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def running(self) -> bool:
+        return not self.future.done()
+
+    def _run(self):
+        set_pos = uncached(self.stage.set_pos_mm)
+        get_pos = uncached(self.stage.get_pos_mm)
+        try:
+            if self.move_to_start:
+                self.stage.set_pos_mm(*self.trajectory.start_pos())
+                self.stage.watch_motion(timeout=30).result()
+            self.t0 = time.monotonic()
+            k = 0
+            while not self._stop.is_set():
+                now = time.monotonic()
+                t = min(now - self.t0, self.trajectory.duration)
+                x, y = self.trajectory.positions(np.array([t]))[0]
+                set_pos(float(x), float(y))
+                self.setpoints.append((x, y))
+                if self.read_back:
+                    self.actual.append(tuple(get_pos()))
+                else:
+                    self.actual.append((x, y))
+                self.times.append(now)
+                if t == self.trajectory.duration:
+                    break
+                # Fixed rate, ticks which are already over are skipped.
+                k = max(k + 1, int((time.monotonic() - self.t0) * self.rate))
+                self._stop.wait(max(self.t0 + k / self.rate - time.monotonic(), 0))
+        except Exception as e:
+            logger.exception(e)
+            self.future.set_exception(e)
+            return
+        self.stage.state_cache.invalidate()
+        self.future.set_result(len(self.times))
+
+    def log(self) -> T.Dict[str, np.ndarray]:
+        n = len(self.times)
+        return dict(
+            times=np.array(self.times[:n]),
+            setpoints=np.array(self.setpoints[:n]).reshape(n, 2),
+            actual=np.array(self.actual[:n]).reshape(n, 2),
+        )
+
+    def positions_at(self, times: np.ndarray) -> np.ndarray:
+        """Actual positions at the given times, interpolated from the log."""
+        log = self.log()
+        times = np.asarray(times, dtype=float)
+        return np.stack(
+            [np.interp(times, log["times"], log["actual"][:, i]) for i in range(2)], -1
+        )
@@ -23,12 +23,13 @@ from loguru import logger
 from MessPy.Config import config
 from MessPy.ControlClasses import Controller
 from MessPy.Instruments.interfaces import ICam
-from MessPy.Plans import *
+from MessPy.Plans.registry import available_plans
 
 from MessPy.QtHelpers import (
     ControlFactory,
     make_groupbox,
     ValueLabels,
+    MetricsView,
     ObserverPlotWithControls,
     hlay,
     vlay,
@@ -112,6 +113,9 @@ class MainWindow(QMainWindow):
             self.splitDockWidget(dock_wigdets[0], dock_wigdets[3], Qt.Horizontal)
             self.splitDockWidget(dock_wigdets[1], dock_wigdets[4], Qt.Horizontal)
             self.splitDockWidget(dock_wigdets[2], dock_wigdets[5], Qt.Horizontal)
+        dw = QDockWidget("Metrics")
+        dw.setWidget(MetricsView())
+        self.addDockWidget(Qt.RightDockWidgetArea, dw)
         self.setCentralWidget(self.cm)
 
         # self.controller.cam.sigRefCalibrationFinished.connect(self.plot_calib)
@@ -121,8 +125,9 @@ class MainWindow(QMainWindow):
         self.toolbar = self.addToolBar("Begin Plan")
         tb = self.toolbar
 
-        def plan_starter(PlanClass):
+        def plan_starter(entry):
             def f():
+                PlanClass = entry.load()
                 plan, ok = PlanClass.start_plan(self.controller)
                 self.controller.stop_plan()
                 if ok:
@@ -136,34 +141,17 @@ class MainWindow(QMainWindow):
 
             return f
 
-        plans = [
-            ("Pump Probe", "ei.graph", PumpProbeStarter),
-            ("Scan Spectrum", "ei.barcode", ScanSpectrumStarter),
-            ("Adaptive TZ", "ei.car", AdaptiveTZStarter),
-        ]
-
-        if self.controller.sample_holder is not None:
-            plans.append(("Focus Scan", "fa5s.ruler-combined", FocusScanStarter))
-            plans.append(("Signal Image", "fa5s.image", SignalImageStarter))
-
-        if self.controller.shaper is not None:
-            plans += [("Fast GVD Scan", "ei.car", FastGVDScanStarter)]
-            plans += [("GVD Scan", "fa5s.stopwatch", GVDScanStarter)]
-            plans += [("2D Measurement", "ei.graph", AOMTwoDStarter)]
-
-            if self.controller.shaper.fm1 is not None:
-                plans += [("Folding Mirror Scan", "fa5s.stopwatch", ScanFoldingMirrorsStarter)]
-       
-
-        for text, icon, starter in plans:
-            asl_icon = qta.icon(icon, color="white")
-            pp = QPushButton(text, icon=asl_icon)
-            pp.clicked.connect(plan_starter(starter))
+        for entry in available_plans(self.controller):
+            asl_icon = qta.icon(entry.icon, color="white")
+            pp = QPushButton(entry.name, icon=asl_icon)
+            pp.clicked.connect(plan_starter(entry))
             tb.addWidget(pp)
 
         if self.controller.shaper is not None:
 
             def start_calib():
+                from MessPy.Plans.ShaperCalibView import CalibScanView
+
                 c = self.controller
                 self.cal_viewer = CalibScanView(c.cam_list[0], c.shaper)
                 self.cal_viewer.sigPlanCreated.connect(c.start_plan)
@@ -206,6 +194,8 @@ class MainWindow(QMainWindow):
 
     @Slot()
     def show_alignment_helper(self):
+        from MessPy.Plans.AlignmentHelper import AlignmentHelper
+
         self._ah = AlignmentHelper(self.controller)
         self._ah.show()
         # dw = QDockWidget(self._ah)
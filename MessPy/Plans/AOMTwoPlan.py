@@ -20,13 +20,15 @@ import attr
 import h5py
 import numpy as np
 from attr import attrib, attrs
+from loguru import logger
 from PySide6.QtCore import Signal
 
+from MessPy import metrics
 from MessPy.ControlClasses import Controller, config
 from MessPy.Instruments.dac_px import AOM
-from MessPy.Instruments.signal_processing import THz2cm, cm2THz
+from MessPy.Instruments.signal_processing import InvalidBlockError, THz2cm, cm2THz, data_dtype
 
-from .PlanBase import Plan, ScanPlan
+from .PlanBase import Plan, ScanPlan, TracedFile
 
 
 h5py_ops = dict(
@@ -147,7 +149,7 @@ class AOMTwoDPlan(ScanPlan):
         yield
 
     def calculate_scan_means(self):
-        with h5py.File(self.data_file_name, mode="a", track_order=True) as f:
+        with TracedFile(self.data_file_name, mode="a", track_order=True) as f:
             f: h5py.File
             for line in f["ifr_data"]:  # type: ignore
                 for t3_idx in f[f"ifr_data/{line}"]:  # type: ignore
@@ -179,17 +181,28 @@ class AOMTwoDPlan(ScanPlan):
         self.controller.cam.set_shots(self.initial_state["shots"])
 
     def measure_point(self):
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            self.time_tracker.point_starting()
-            future = executor.submit(
-                self.controller.cam.cam.make_2D_reading,
-                self.t1,
-                self.rot_frame_freq,
-                self.repetitions,
-                self.save_frames_enabled,
+        cam = self.controller.cam.cam
+        self.time_tracker.point_starting()
+        # Blocks with lost frames or triggers are measured again
+        for attempt in range(config.max_reacquire + 1):
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                future = executor.submit(
+                    cam.make_2D_reading,
+                    self.t1,
+                    self.rot_frame_freq,
+                    self.repetitions,
+                    self.save_frames_enabled,
+                )
+
+            ret = future.result()
+            if (reason := getattr(cam, "sync_error", None)) is None:
+                break
+            metrics.invalid_blocks.inc(cam=cam.name)
+            logger.warning(f"Invalid block of {cam.name} ({attempt + 1}): {reason}")
+        else:
+            raise InvalidBlockError(
+                f"{cam.name}: {config.max_reacquire + 1} invalid blocks, last: {reason}"
             )
-
-        ret = future.result()
         self.last_spectra = ret[1]
         self.sigNewSpectra.emit(ret[1])
         self.time_tracker.point_ending()
@@ -206,9 +219,9 @@ class AOMTwoDPlan(ScanPlan):
 
     def save_data(self, ret, t2_idx, cur_scan):
         cur_date = datetime.now().isoformat()
-        with h5py.File(self.data_file_name, mode="a", track_order=True) as f:
+        with TracedFile(self.data_file_name, mode="a", track_order=True) as f:
             data_ops = dict(
-                dtype="float64", scaleoffset=2, compression="gzip", compression_opts=3
+                dtype=data_dtype(), scaleoffset=2, compression="gzip", compression_opts=3
             )
             for line, data in ret.items():
                 if line == "Ref":
@@ -1,5 +1,6 @@
 import asyncio
-from typing import ClassVar, Literal
+import bisect
+from typing import ClassVar, Literal, Optional
 
 import attr
 import lmfit
@@ -26,13 +27,15 @@ def gaussian_step(x, x0, amp, back, sigma):
 def fit_step_function(t, data) -> ModelResult:
     a = data[np.argmax(t)]
     b = data[np.argmin(t)]
-    t0 = t[np.argmin(np.abs(data - (a - b) / 2))]
+    t0 = t[np.argmin(np.abs(data - (a + b) / 2))]
     sigma = 0.1
     step_amp = a - b
-    back = b
+    # The model goes from 0.5 - amp/2 - back to 0.5 + amp/2 - back
+    back = 0.5 - (a + b) / 2
 
     model = lmfit.Model(gaussian_step)
-    fit_result = model.fit(data, x=t, amp=step_amp, back=back, sigma=sigma)
+    model.set_param_hint("sigma", min=1e-3)
+    fit_result = model.fit(data, x=t, x0=t0, amp=step_amp, back=back, sigma=sigma)
     return fit_result
 
 
@@ -49,7 +52,14 @@ class AdaptiveTimeZeroPlan(Plan):
     current_step: float = 0.2
     shots: int = 100
     min_step: float = 0.05
+    search: Literal["grid", "bisect"] = "grid"
+    n_coarse: int = 7
+    t0_tol: float = 0.02
+    max_points: int = 40
+    t0: Optional[float] = None
+    t0_err: Optional[float] = None
     plan_shorthand: ClassVar[str] = "AutoZero"
+    # Kept sorted by position
     positions: list[float] = attr.Factory(list)
     values: list[float] = attr.Factory(list)
 
@@ -69,21 +79,67 @@ class AdaptiveTimeZeroPlan(Plan):
         self.cam.set_shots(self.shots)
 
         self.sigPlanStarted.emit()
-        for i in np.arange(self.start, self.stop, self.current_step):
-            self.move_dl(i)
-            new_signal = self.read_point()
-            self.values.append(new_signal)
-            self.positions.append(i)
-            self.sigStepDone.emit(self.get_data())
-            cam.sigReadCompleted.emit()
-            yield
-
-        while (new_x := self.check_for_holes()) and self.is_running:
-            self.check_pos(new_x)
-            yield
+        if self.search == "bisect":
+            yield from self.bisect_search()
+        else:
+            for i in np.arange(self.start, self.stop, self.current_step):
+                self.check_pos(i)
+                cam.sigReadCompleted.emit()
+                yield
+
+            while (new_x := self.check_for_holes()) and self.is_running:
+                self.check_pos(new_x)
+                yield
         self.is_running = False
         self.sigPlanFinished.emit()
 
+    def bisect_search(self):
+        """Brackets the step with a coarse scan, then refines the bracket.
+
+        The next point is the t0 of the `gaussian_step` fit if it lies well
+        inside the bracket (secant-like), else the middle of the bracket.
+        Stops when the fit uncertainty of t0 or the bracket is smaller than
+        `t0_tol`.
+        """
+        for i in np.linspace(self.start, self.stop, self.n_coarse):
+            self.check_pos(i)
+            yield
+        x, y = self.get_data()
+        i = np.argmax(np.abs(np.diff(y)))
+        lo, hi = x[i], x[i + 1]
+        y_lo, y_hi = y[i], y[i + 1]
+        while self.is_running and len(self.positions) < self.max_points:
+            self.fit_t0()
+            if hi - lo < self.t0_tol or (self.t0_err is not None and self.t0_err < self.t0_tol):
+                break
+            margin = 0.1 * (hi - lo)
+            if self.t0 is not None and lo + margin < self.t0 < hi - margin:
+                new_x = self.t0
+            else:
+                new_x = (lo + hi) / 2
+            new_y = self.check_pos(new_x)
+            # Keep the half that still contains the mid level of the step
+            if abs(new_y - y_lo) < abs(new_y - y_hi):
+                lo, y_lo = new_x, new_y
+            else:
+                hi, y_hi = new_x, new_y
+            yield
+        if self.t0 is None or not lo <= self.t0 <= hi:
+            self.t0, self.t0_err = (lo + hi) / 2, (hi - lo) / 2
+
+    def fit_t0(self):
+        x, y = self.get_data()
+        try:
+            res = fit_step_function(x, y)
+        except ValueError:
+            self.t0, self.t0_err = None, None
+            return
+        if res.success:
+            self.t0 = res.params["x0"].value
+            self.t0_err = res.params["x0"].stderr
+        else:
+            self.t0, self.t0_err = None, None
+
     def check_for_holes(self):
         x, y = self.get_data()
         xd = np.diff(x)
@@ -100,23 +156,20 @@ class AdaptiveTimeZeroPlan(Plan):
         f = getattr(np, self.mode)
         return f(reading.signals[2])
 
-    def check_pos(self, pos):
+    def check_pos(self, pos) -> float:
         self.move_dl(pos)
         new_signal = self.read_point()
-        self.values.append(new_signal)
-        self.positions.append(pos)
+        i = bisect.bisect(self.positions, pos)
+        self.positions.insert(i, pos)
+        self.values.insert(i, new_signal)
         self.sigStepDone.emit(self.get_data())
+        return new_signal
 
     def move_dl(self, pos):
         self.delay_line.set_pos(1000 * pos, True)
 
     def get_data(self):
-        x, y = self.positions, self.values
-        xa, ya = np.array(x), np.array(y)
-        i = np.argsort(xa)
-        xa = xa[i]
-        ya = ya[i]
-        return xa, ya
+        return np.array(self.positions), np.array(self.values)
 
     def set_zero_pos(self, pos):
         self.delay_line.set_pos(pos * 1000)
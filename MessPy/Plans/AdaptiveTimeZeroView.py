@@ -153,6 +153,8 @@ class AdaptiveTZStarter(PlanStartDialog):
             dict(name="Min. Step", type="float", value=0.02),
             dict(name="Mode", type="list", limits=["mean", "max"]),
             dict(name="Shots", type="int", value=100),
+            dict(name="Search", type="list", limits=["grid", "bisect"]),
+            dict(name="t0 Tolerance", type="float", value=0.02),
         ]
 
         two_d = {"name": "Exp. Settings", "type": "group", "children": params}
@@ -176,6 +178,8 @@ class AdaptiveTZStarter(PlanStartDialog):
             min_step=p["Min. Step"],
             mode=p["Mode"],
             shots=p["Shots"],
+            search=p["Search"],
+            t0_tol=p["t0 Tolerance"],
         )
         plan.sigStepDone.connect(lambda x: controller.loop_finished.emit())
         return plan
@@ -5,10 +5,13 @@ import attr
 import numpy as np
 import scipy.optimize as opt
 import scipy.special as spec
+from loguru import logger
 from PySide6.QtCore import Signal
 
 from MessPy.ControlClasses import Cam
 from MessPy.Instruments.interfaces import ILissajousScanner, IPowerMeter
+from MessPy.Instruments.motion import watch_device
+from MessPy.Instruments.state_cache import uncached
 from MessPy.Plans.PlanBase import Plan
 
 
@@ -36,21 +39,23 @@ class FitResult:
         return text
 
     @classmethod
-    def fit_curve(cls, pos, val, name):
+    def fit_curve(cls, pos, val, name, p0=None):
+        """Fits `gauss_int`, `p0` are start parameters, e.g. from the last fit."""
         pos = np.array(pos)
         idx = np.argsort(pos)
         val = np.array(val)[idx]
         pos = pos[idx]
-        a = val[np.argmax(pos)]
-        b = val[np.argmin(pos)]
-        x0 = [pos[np.argmin(np.abs(val - (a + b) / 2))], a - b, b, 0.1]
+        if p0 is None:
+            a = val[np.argmax(pos)]
+            b = val[np.argmin(pos)]
+            p0 = [pos[np.argmin(np.abs(val - (a + b) / 2))], a - b, b, 0.1]
 
         def helper(p):
             return np.array(val) - gauss_int(pos, *p)
 
-        res = opt.least_squares(helper, x0)
+        res = opt.least_squares(helper, p0)
         fit = gauss_int(pos, *res.x)
-        print(res.x)
+        logger.debug(f"{name}: {res.x}")
         return cls(
             success=res.status > 0,
             params=res.x,
@@ -74,9 +79,16 @@ class Scan:
     full: list[np.ndarray] = attr.Factory(list)
     min_step: float = 0.005
     max_diff: float = 0.1
+    n_coarse: int = 7
+    min_points: int = 12
+    max_points: int = 40
+    w_tol: float = 0.02
+    fit_params: T.Optional[np.ndarray] = None
 
     def analyze(self):
-        fit_probe = FitResult.fit_curve(self.pos, self.probe, f"{self.axis} probe")
+        fit_probe = FitResult.fit_curve(
+            self.pos, self.probe, f"{self.axis} probe", p0=self.fit_params
+        )
         fit_ref = FitResult.fit_curve(self.pos, self.ref, f"{self.axis} ref")
         if len(self.extra) > 0:
             fit_extra = FitResult.fit_curve(self.pos, self.extra, f"{self.axis} PW")
@@ -91,6 +103,59 @@ class Scan:
         while x0 := self.check_for_holes():
             yield from self.check_point(x0, reader, mover)
 
+    def scan_adaptive(self, mover, reader, p0=None, cur_pos=None):
+        """Places the points around the fitted edge.
+
+        Starts with the points ``x0 + (-2..2) * w`` from the start parameters
+        `p0` of the last fit, else with a coarse grid. The points are visited
+        beginning with the end next to `cur_pos`. Afterwards, each new point
+        fills the largest hole in the edge region of the current fit. Stops
+        when the width changes by less than `w_tol` (relative) in three
+        consecutive fits and at least `min_points` are measured.
+        """
+        lo, hi = sorted((self.start, self.end))
+        if p0 is not None and lo < p0[0] < hi:
+            pts = p0[0] + abs(p0[3]) * np.linspace(-2, 2, 5)
+            pts = np.unique(np.clip(pts, lo, hi))
+        else:
+            pts = np.linspace(lo, hi, self.n_coarse)
+        if cur_pos is not None and abs(pts[-1] - cur_pos) < abs(pts[0] - cur_pos):
+            pts = pts[::-1]
+        for x in pts:
+            yield from self.check_point(x, reader, mover)
+
+        params = p0
+        widths = []
+        while len(self.pos) < self.max_points:
+            fit = FitResult.fit_curve(self.pos, self.probe, self.axis, p0=params)
+            if fit.success and lo <= fit.params[0] <= hi:
+                params = fit.params
+                widths.append(abs(params[3]))
+            converged = len(widths) >= 3 and np.ptp(widths[-3:]) < self.w_tol * widths[-1]
+            if converged and len(self.pos) >= self.min_points:
+                break
+            x = self.next_point(params)
+            if x is None:
+                break
+            yield from self.check_point(x, reader, mover)
+        self.fit_params = params
+
+    def next_point(self, params) -> T.Optional[float]:
+        """Candidate in the edge region furthest away from the measured points,
+        `None` if all holes are smaller than `min_step`."""
+        lo, hi = sorted((self.start, self.end))
+        if params is None:
+            cand = np.linspace(lo, hi, 2 * self.n_coarse + 1)
+        else:
+            x0, w = params[0], abs(params[3])
+            cand = np.clip(x0 + w * np.linspace(-1.5, 1.5, 13), lo, hi)
+        pos = np.array(self.pos)
+        dist = np.abs(cand[:, None] - pos[None, :]).min(1)
+        i = np.argmax(dist)
+        if dist[i] < self.min_step:
+            return None
+        return float(cand[i])
+
     def check_point(self, x, reader, mover):
         yield from mover(x)
         for data, lines, pw in reader():
@@ -118,8 +183,8 @@ class Scan:
     def check_for_holes(self):
         x, y, y3 = self.get_data()[:3]
         xd = np.diff(x)
-        yd = np.diff(y) / y.ptp()
-        yd3 = np.diff(y3) / y3.ptp()
+        yd = np.diff(y) / np.ptp(y)
+        yd3 = np.diff(y3) / np.ptp(y3)
         i = (np.abs(yd) > self.max_diff) & (xd > self.min_step)
         i2 = (np.abs(yd3) > self.max_diff) & (xd > self.min_step)
         i = np.logical_or(i, i2)
@@ -146,6 +211,8 @@ class FocusScan(Plan):
     adaptive: bool = True
     max_rel_change: float = 0.1
     min_step: float = 0.005
+    w_tol: float = 0.02
+    max_points: int = 40
     shots: int = 100
     sigStepDone: T.ClassVar[Signal] = Signal()
     sigFitDone: T.ClassVar[Signal] = Signal(int)
@@ -170,6 +237,8 @@ class FocusScan(Plan):
             else:
                 self.scans["y_%d" % i] = None
         self.start_pos = (0, 0)  # self.fh.pos_home
+        # Current position relative to start_pos, None if unknown
+        self.axis_pos: T.Dict[str, T.Optional[float]] = {"x": None, "y": None}
         gen = self.make_scan_gen()
         self.make_step = lambda: next(gen)
         self.cam.set_shots(self.shots)
@@ -182,30 +251,63 @@ class FocusScan(Plan):
             step=parameters[2],
             max_diff=self.max_rel_change if self.adaptive else 100,
             min_step=self.min_step,
+            max_points=self.max_points,
+            w_tol=self.w_tol,
         )
 
+    def schedule(self) -> T.List[T.Tuple[int, str]]:
+        """Order of the passes as (z index, axis).
+
+        The axis order alternates between the z-planes, hence the last axis
+        of a plane is scanned first in the next one and only one reset move
+        per plane is needed.
+        """
+        order = []
+        axes = ["x", "y"]
+        for i in range(len(self.z_points)):
+            for axis in axes:
+                if self.scans[f"{axis}_{i}"]:
+                    order.append((i, axis))
+            axes = axes[::-1]
+        return order
+
     def make_scan_gen(self):
-        for i, z_pos in enumerate(self.z_points):
-            self.fh.set_pos_mm(*self.start_pos)
-            self.fh.set_zpos_mm(z_pos)
-            while any(self.fh.is_moving()):
-                yield
-            if self.scans[f"x_{i}"]:
-                for _ in self.scans[f"x_{i}"].scan(
-                    lambda x: self.mover("x", x), self.reader
-                ):
-                    self.sigStepDone.emit()
-                    yield
-            self.fh.set_pos_mm(*self.start_pos)
-            if self.scans[f"y_{i}"]:
-                for _ in self.scans[f"y_{i}"].scan(
-                    lambda x: self.mover("y", x), self.reader
-                ):
-                    self.sigStepDone.emit()
+        last_fit: T.Dict[str, np.ndarray] = {}
+        cur_z = None
+        order = self.schedule()
+        for n, (i, axis) in enumerate(order):
+            scan = self.scans[f"{axis}_{i}"]
+            other = "y" if axis == "x" else "x"
+            if self.axis_pos[other] != 0:
+                yield from self.mover(other, 0)
+            if cur_z != i:
+                self.fh.set_zpos_mm(self.z_points[i])
+                fut = watch_device(self.fh, is_moving=uncached(self.fh.is_zmoving))
+                while not fut.done():
                     yield
+                cur_z = i
 
-            self.fh.set_pos_mm(*self.start_pos)
-            self.sigFitDone.emit(i)
+            def mover(x, axis=axis):
+                return self.mover(axis, x)
+
+            if self.adaptive:
+                steps = scan.scan_adaptive(
+                    mover, self.reader, p0=last_fit.get(axis), cur_pos=self.axis_pos[axis]
+                )
+            else:
+                steps = scan.scan(mover, self.reader)
+            n_points = len(scan.pos)
+            for _ in steps:
+                # Only redraw if a new point was read
+                if len(scan.pos) != n_points:
+                    n_points = len(scan.pos)
+                    self.sigStepDone.emit()
+                yield
+            if scan.fit_params is not None:
+                last_fit[axis] = scan.fit_params
+            if n == len(order) - 1 or order[n + 1][0] != i:
+                self.sigFitDone.emit(i)
+        self.fh.set_pos_mm(*self.start_pos)
         self.sigPlanFinished.emit()
         yield
 
@@ -214,7 +316,9 @@ class FocusScan(Plan):
             self.fh.set_pos_mm(self.start_pos[0] + pos, None)
         if axis == "y":
             self.fh.set_pos_mm(None, self.start_pos[1] + pos)
-        while any(self.fh.is_moving()):
+        self.axis_pos[axis] = pos
+        fut = self.fh.watch_motion()
+        while not fut.done():
             yield
         yield
 
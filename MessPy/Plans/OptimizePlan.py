@@ -1,9 +1,20 @@
+import abc
+import concurrent.futures
+import typing as T
+from concurrent.futures import Future
+from functools import cached_property
+from typing import Callable, ClassVar, Dict, List, Optional
+
 import attr
 import numpy as np
-from . import Plan
+from loguru import logger
+from PySide6.QtCore import Signal
 
-from typing import List, Dict, Optional
-from MessPy.Instruments.interfaces import ICam
+from MessPy.Instruments.interfaces import ICam, IDelayLine, ILissajousScanner, IRotationStage
+from MessPy.Instruments.motion import watch_device
+from MessPy.Instruments.state_cache import uncached
+from MessPy.Plans.PlanBase import Plan
+from MessPy.Plans.optimizers import Optimizer, optimizers
 
 
 @attr.s(auto_attribs=True)
@@ -12,28 +23,253 @@ class Parameter:
     upper_lim: float = np.inf
     lower_lim: float = -np.inf
     start_val: Optional[float] = None
+    step: float = 1.0
+    """Initial step size of the optimizer."""
+
+
+def _done_future() -> Future:
+    fut: Future = Future()
+    fut.set_result(0)
+    return fut
+
+
+@attr.s(auto_attribs=True)
+class Manipulator(abc.ABC):
+    """Sets the parameters of the optimization. `apply` returns a future,
+    which resolves when the new values are in effect."""
+
+    params: List[Parameter]
+
+    @abc.abstractmethod
+    def current(self) -> List[float]:
+        """Current values, used if a parameter has no `start_val`."""
+
+    @abc.abstractmethod
+    def apply(self, values: T.Sequence[float]) -> Future:
+        pass
+
+
+@attr.s(auto_attribs=True)
+class FunctionManipulator(Manipulator):
+    """Calls `setter` with all values, mostly for tests and scripts."""
+
+    setter: Callable[..., None] = attr.ib(kw_only=True)
+
+    def current(self) -> List[float]:
+        return [p.start_val or 0.0 for p in self.params]
+
+    def apply(self, values) -> Future:
+        self.setter(*values)
+        return _done_future()
 
 
-class Manipulator:
-    params = List[Parameter]
+@attr.s(auto_attribs=True)
+class RotationStageManipulator(Manipulator):
+    """One parameter per stage, e.g. the two folding mirrors."""
+
+    stages: List[IRotationStage] = attr.ib(kw_only=True)
+
+    @classmethod
+    def from_stages(cls, stages: List[IRotationStage], step: float = 0.5,
+                    **kwargs) -> "RotationStageManipulator":
+        params = [Parameter(s.name, step=step, **kwargs) for s in stages]
+        return cls(params, stages=stages)
+
+    def current(self) -> List[float]:
+        return [s.get_degrees() for s in self.stages]
+
+    def apply(self, values) -> Future:
+        futures = [s.set_degrees_and_watch(v) for s, v in zip(self.stages, values)]
+        return _all_of(futures)
+
+
+@attr.s(auto_attribs=True)
+class DelayManipulator(Manipulator):
+    delay_line: IDelayLine = attr.ib(kw_only=True)
+
+    @classmethod
+    def from_delay_line(cls, delay_line: IDelayLine, step: float = 50.0,
+                        **kwargs) -> "DelayManipulator":
+        return cls([Parameter("Delay (fs)", step=step, **kwargs)], delay_line=delay_line)
+
+    def current(self) -> List[float]:
+        return [self.delay_line.get_pos_fs()]
+
+    def apply(self, values) -> Future:
+        return self.delay_line.move_fs(values[0])
+
+
+@attr.s(auto_attribs=True)
+class SampleZManipulator(Manipulator):
+    stage: ILissajousScanner = attr.ib(kw_only=True)
+
+    @classmethod
+    def from_stage(cls, stage: ILissajousScanner, step: float = 0.1,
+                   **kwargs) -> "SampleZManipulator":
+        return cls([Parameter("Sample z (mm)", step=step, **kwargs)], stage=stage)
 
-    def apply(self):
-        raise NotImplementedError
+    def current(self) -> List[float]:
+        return [self.stage.get_zpos_mm()]
 
+    def apply(self, values) -> Future:
+        self.stage.set_zpos_mm(values[0])
+        return watch_device(self.stage, is_moving=uncached(self.stage.is_zmoving))
 
+
+@attr.s(auto_attribs=True)
+class DispersionManipulator(Manipulator):
+    """Dispersion coefficients of the AOM shaper, given in fs^n/1000 like in
+    the GVD scans."""
+
+    aom: T.Any = attr.ib(kw_only=True)
+    coefs: T.Tuple[str, ...] = attr.ib(kw_only=True, default=("gvd", "tod"))
+
+    @classmethod
+    def from_aom(cls, aom, coefs=("gvd", "tod"), step: float = 1.0,
+                 **kwargs) -> "DispersionManipulator":
+        params = [Parameter(c.upper(), step=step, **kwargs) for c in coefs]
+        return cls(params, aom=aom, coefs=tuple(coefs))
+
+    def current(self) -> List[float]:
+        return [getattr(self.aom, c) / 1000 for c in self.coefs]
+
+    def apply(self, values) -> Future:
+        for c, v in zip(self.coefs, values):
+            setattr(self.aom, c, v * 1000)
+        self.aom.update_dispersion_compensation()
+        return _done_future()
+
+
+def _all_of(futures: List[Future]) -> Future:
+    """Future resolving when all `futures` are done."""
+    result: Future = Future()
+    remaining = [len(futures)]
+
+    def one_done(fut):
+        if fut.exception() is not None and not result.done():
+            result.set_exception(fut.exception())
+            return
+        remaining[0] -= 1
+        if remaining[0] == 0 and not result.done():
+            result.set_result(0)
+
+    if not futures:
+        result.set_result(0)
+    for f in futures:
+        f.add_done_callback(one_done)
+    return result
+
+
+@attr.s(auto_attribs=True)
 class ObjectivDetector:
-    """
-    pass
-    """
+    """Turns a cam reading into a single value, larger is better."""
+
+    cam: ICam
+    kind: str = "probe"
+    line: int = 0
+    channel_slice: slice = slice(None)
+
+    kinds: ClassVar[Dict[str, Callable]] = {
+        "probe": lambda r, i, sl: r.lines[i, sl].mean(),
+        "max": lambda r, i, sl: r.lines[i, sl].max(),
+        "signal": lambda r, i, sl: np.abs(r.signals[i, sl]).sum(),
+        "snr": lambda r, i, sl: -r.stds[i, sl].mean() / r.lines[i, sl].mean(),
+    }
 
     @staticmethod
-    def from_cam(cam: ICam, kind: str) -> 'ObjectivDetector':
-        pass
+    def from_cam(cam: ICam, kind: str, **kwargs) -> "ObjectivDetector":
+        if kind not in ObjectivDetector.kinds:
+            raise ValueError(f"Unknown objective {kind}, use one of {list(ObjectivDetector.kinds)}")
+        return ObjectivDetector(cam, kind, **kwargs)
 
-    def eval(self):
-        pass
+    def eval(self) -> float:
+        reading = self.cam.make_reading()
+        return float(self.kinds[self.kind](reading, self.line, self.channel_slice))
 
 
-@attr.s
-class OptimizePlan:
+@attr.s(auto_attribs=True, cmp=False, kw_only=True)
+class OptimizePlan(Plan):
+    """Maximizes the objective by moving the manipulator.
+
+    Every evaluation is appended to the history, which is saved after each
+    step. At the end, the manipulator is moved to the best point.
+
+    The grid scans (`ScanFoldingMirrors`, `GVDScan`) are kept, since they
+    record the whole map; this plan only searches the optimum.
+    """
+
     mani: Manipulator
+    objective: ObjectivDetector
+    method: str = "Nelder-Mead"
+    max_evals: int = 40
+    method_kwargs: dict = attr.Factory(dict)
+    optimizer: Optimizer = attr.ib(init=False)
+    history_x: List[np.ndarray] = attr.Factory(list)
+    history_y: List[float] = attr.Factory(list)
+
+    plan_shorthand: ClassVar[str] = "Optimize"
+    sigPointRead: ClassVar[Signal] = Signal()
+
+    def __attrs_post_init__(self):
+        super(OptimizePlan, self).__attrs_post_init__()
+        # Fix the name, else it changes once the meta file exists
+        self.file_name = self.get_file_name()
+        params = self.mani.params
+        if any(p.start_val is None for p in params):
+            cur = self.mani.current()
+            for p, c in zip(params, cur):
+                if p.start_val is None:
+                    p.start_val = c
+        self.optimizer = optimizers[self.method](
+            x0=np.array([p.start_val for p in params]),
+            step=np.array([p.step for p in params]),
+            lower=np.array([p.lower_lim for p in params]),
+            upper=np.array([p.upper_lim for p in params]),
+            max_evals=self.max_evals,
+            **self.method_kwargs,
+        )
+
+    @cached_property
+    def make_step(self) -> Callable:
+        return self.make_step_generator().__next__
+
+    def make_step_generator(self):
+        self.sigPlanStarted.emit()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            while not self.optimizer.done:
+                self.time_tracker.point_starting()
+                x = self.optimizer.ask()
+                yield from self._wait(self.mani.apply(x))
+                yield from self._wait(future := executor.submit(self.objective.eval))
+                y = future.result()
+                self.optimizer.tell(y)
+                self.history_x.append(x)
+                self.history_y.append(y)
+                logger.info(f"Optimize: {x} -> {y:.4g}")
+                self.save()
+                self.sigPointRead.emit()
+                self.time_tracker.point_ending()
+                yield
+        x, y = self.optimizer.best
+        logger.info(f"Optimize: best point {x} with {y:.4g} after {len(self.history_y)} evaluations")
+        yield from self._wait(self.mani.apply(x))
+        self.save_meta()
+        self.sigPlanFinished.emit()
+        yield
+
+    @staticmethod
+    def _wait(fut: Future):
+        while not fut.done():
+            yield
+        fut.result()
+
+    def save(self):
+        with self.data_file as f:
+            for name in ("x", "y"):
+                if name in f:
+                    del f[name]
+            f.create_dataset("x", data=np.array(self.history_x))
+            f.create_dataset("y", data=np.array(self.history_y))
+            f.attrs["params"] = [p.name for p in self.mani.params]
+            f.attrs["method"] = self.method
+            f.attrs["objective"] = self.objective.kind
@@ -0,0 +1,120 @@
+import numpy as np
+import pyqtgraph.parametertree as pt
+from pyqtgraph import PlotWidget, mkPen
+from PySide6.QtWidgets import QLabel, QWidget
+
+from MessPy.ControlClasses import Controller
+from MessPy.QtHelpers import PlanStartDialog, VEGA_COLORS, make_entry, vlay
+
+from .OptimizePlan import (
+    DelayManipulator,
+    DispersionManipulator,
+    ObjectivDetector,
+    OptimizePlan,
+    RotationStageManipulator,
+    SampleZManipulator,
+)
+from .optimizers import optimizers
+
+
+class OptimizeView(QWidget):
+    def __init__(self, plan: OptimizePlan, *args, **kwargs):
+        super(OptimizeView, self).__init__(*args, **kwargs)
+        self.plan = plan
+        self.info_label = QLabel()
+        self.y_plot = PlotWidget()
+        self.y_plot.plotItem.setLabel("bottom", "Evaluation")
+        self.y_plot.plotItem.setLabel("left", plan.objective.kind)
+        self.x_plot = PlotWidget()
+        self.x_plot.plotItem.setLabel("bottom", "Evaluation")
+        self.x_plot.addLegend()
+        self.y_line = self.y_plot.plot(pen=None, symbol="o", symbolSize=5)
+        self.best_line = self.y_plot.plot(pen=mkPen("y", width=2))
+        colors = list(VEGA_COLORS.values())
+        self.x_lines = [
+            self.x_plot.plot(pen=mkPen(colors[i % len(colors)], width=2), name=p.name)
+            for i, p in enumerate(plan.mani.params)
+        ]
+        self.setLayout(vlay([self.info_label, self.y_plot, self.x_plot]))
+        self.plan.sigPointRead.connect(self.plot_data)
+
+    def plot_data(self):
+        y = np.array(self.plan.history_y)
+        x = np.array(self.plan.history_x)
+        self.y_line.setData(y)
+        self.best_line.setData(np.maximum.accumulate(y))
+        for i, line in enumerate(self.x_lines):
+            line.setData(x[:, i])
+        best_x, best_y = self.plan.optimizer.best
+        self.info_label.setText(
+            f"{len(y)}/{self.plan.max_evals} evaluations, best {best_y:.4g} at "
+            + ", ".join(f"{p.name}={v:.4g}" for p, v in zip(self.plan.mani.params, best_x))
+        )
+
+
+class OptimizeStarter(PlanStartDialog):
+    experiment_type = "Optimize"
+    viewer = OptimizeView
+    title = "Optimize"
+
+    def manipulators(self) -> dict:
+        """Factories of the manipulators available with the controller."""
+        c = self.controller
+        manis = {"Delay": lambda step: DelayManipulator.from_delay_line(c.delay_line._dl, step)}
+        if c.shaper is not None:
+            manis["Dispersion"] = lambda step: DispersionManipulator.from_aom(c.shaper, step=step)
+            if getattr(c.shaper, "fm1", None) is not None:
+                manis["Folding Mirrors"] = lambda step: RotationStageManipulator.from_stages(
+                    [c.shaper.fm1, c.shaper.fm2], step
+                )
+        if c.rot_stage is not None:
+            manis["Rotation Stage"] = lambda step: RotationStageManipulator.from_stages(
+                [c.rot_stage], step
+            )
+        if c.sample_holder is not None:
+            manis["Sample z"] = lambda step: SampleZManipulator.from_stage(c.sample_holder, step)
+        return manis
+
+    def setup_paras(self):
+        tmp = [
+            {"name": "Filename", "type": "str", "value": "optimize"},
+            {"name": "Shots", "type": "int", "max": 2000, "value": 100},
+            {
+                "name": "Manipulator",
+                "type": "list",
+                "limits": list(self.manipulators()),
+                "value": "Delay",
+            },
+            {"name": "Step", "type": "float", "value": 1.0, "step": 0.1},
+            {
+                "name": "Objective",
+                "type": "list",
+                "limits": list(ObjectivDetector.kinds),
+                "value": "probe",
+            },
+            {"name": "Line", "type": "int", "value": 0, "min": 0},
+            {
+                "name": "Method",
+                "type": "list",
+                "limits": list(optimizers),
+                "value": "Nelder-Mead",
+            },
+            {"name": "Max. evaluations", "type": "int", "value": 40, "min": 1},
+        ]
+        self.p = pt.Parameter.create(name="Exp. Settings", type="group", children=tmp)
+        self.paras = pt.Parameter.create(name="Optimize", type="group", children=[self.p])
+
+    def create_plan(self, controller: Controller):
+        p = self.paras.child("Exp. Settings")
+        self.save_defaults()
+        controller.cam.set_shots(p["Shots"])
+        mani = self.manipulators()[p["Manipulator"]](p["Step"])
+        objective = ObjectivDetector.from_cam(controller.cam.cam, p["Objective"], line=p["Line"])
+        return OptimizePlan(
+            name=p["Filename"],
+            meta=make_entry(self.paras),
+            mani=mani,
+            objective=objective,
+            method=p["Method"],
+            max_evals=p["Max. evaluations"],
+        )
@@ -14,6 +14,8 @@ from numpy import ndarray
 
 from MessPy.Config import config
 from MessPy.Instruments.interfaces import IDevice
+from MessPy.tracing import span, tracer
+from MessPy import metrics
 
 sample_parameters = {
     "name": "Sample",
@@ -41,6 +43,9 @@ class TimeTracker(QObject):
     point_start_time: float = 0
     point_end_time: Optional[float] = None
     point_duration: Optional[float] = None
+    # perf_counter_ns of the starts, for the trace
+    scan_start_ns: int = 0
+    point_start_ns: int = 0
 
     sigTimesUpdated: ClassVar[Signal] = Signal(str)
 
@@ -56,6 +61,7 @@ class TimeTracker(QObject):
     def scan_starting(self):
         """Record start time of scan."""
         self.scan_start_time = time.time()
+        self.scan_start_ns = time.perf_counter_ns()
         self.scan_end_time = None
 
     @Slot()
@@ -63,17 +69,24 @@ class TimeTracker(QObject):
         """Record end time of scan."""
         self.scan_end_time = time.time()
         self.scan_duration = self.scan_end_time - self.scan_start_time
+        if tracer.enabled:
+            tracer.record("scan", "plan", self.scan_start_ns, time.perf_counter_ns())
 
     @Slot()
     def point_starting(self):
         """Record start time of point."""
         self.point_start_time = time.time()
+        self.point_start_ns = time.perf_counter_ns()
 
     @Slot()
     def point_ending(self):
         """Record end time of point."""
         self.point_end_time = time.time()
         self.point_duration = self.point_end_time - self.point_start_time
+        metrics.points.inc()
+        metrics.point_seconds.observe(self.point_duration)
+        if tracer.enabled:
+            tracer.record("point", "plan", self.point_start_ns, time.perf_counter_ns())
         self.as_string()
 
     def as_string(self) -> str:
@@ -90,6 +103,24 @@ class TimeTracker(QObject):
         return s
 
 
+class TracedFile(h5py.File):
+    """Records the `with` block as a span and as saving time, i.e. the time
+    the plan needs to write its data."""
+
+    def __enter__(self):
+        self._t0 = time.monotonic()
+        self._span = span("hdf5 write", "io", file=Path(self.filename).name)
+        self._span.__enter__()
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        try:
+            return super().__exit__(*exc)
+        finally:
+            self._span.__exit__(*exc)
+            metrics.busy_seconds.inc(time.monotonic() - self._t0, activity="save")
+
+
 @attr.s(auto_attribs=True, kw_only=True)
 class Plan(QObject):
     plan_shorthand: ClassVar[str]
@@ -128,7 +159,7 @@ class Plan(QObject):
 
     @property
     def data_file(self) -> h5py.File:
-        return h5py.File(self.get_file_name()[0], "a", track_order=True)
+        return TracedFile(self.get_file_name()[0], "a", track_order=True)
 
     @property
     def meta_file(self) -> Path:
@@ -9,7 +9,9 @@ import h5py
 
 from PySide6.QtCore import QObject, Signal
 
+from MessPy.Instruments.signal_processing import InvalidBlockError, data_dtype
 from .PlanBase import Plan
+from .scan_order import MotionCosts, ScanOrder, Sweep, plan_scan_order
 
 if TYPE_CHECKING:
     from MessPy.ControlClasses import Controller, Cam
@@ -38,6 +40,13 @@ class PumpProbePlan(Plan):
     do_ref_calib: bool = True
     probe_shutter: Optional["IShutter"] = None
     save_full_data: bool = False
+    # True: alternate the direction of the delay sweeps, None: fastest
+    alternate_delay: Optional[bool] = True
+    pre_offset_fs: float = 200
+    scan_order: ScanOrder = attrib(init=False)
+    # Predicted time of one cycle over all cwls and angles in seconds
+    predicted_cycle_time: float = attrib(init=False)
+    sweep: Sweep = attrib(init=False)
 
     sigStepDone: ClassVar[Signal] = Signal()
 
@@ -67,17 +76,36 @@ class PumpProbePlan(Plan):
                     save_full_data=self.save_full_data,
                 )
             )
+        costs = MotionCosts.from_controller(
+            self.controller, self.shots, pre_offset_fs=self.pre_offset_fs
+        )
+        angles = self.rot_stage_angles if self.use_rot_stage and self.rot_stage_angles else []
+        self.scan_order, self.predicted_cycle_time = plan_scan_order(
+            np.asarray(self.t_list) * 1000.0,
+            [cd.cwl for cd in self.cam_data],
+            angles,
+            costs,
+            self.alternate_delay,
+        )
+        logger.info(
+            f"Scan order {self.scan_order}, predicted {self.predicted_cycle_time:.0f} s per cycle"
+        )
+        self.sweeps = self.scan_order.iter_sweeps(
+            self.common_mulitple_cwls, max(len(angles), 1)
+        )
+        self.sweep = next(self.sweeps)
+        self.rot_idx = self.sweep.angle_idx
 
-        
 
     def move_rot_stage(self, angle):
         if self.use_rot_stage:
             rs = self.controller.rot_stage
             if rs:
-                rs.set_degrees(angle)
-                while rs.is_moving():
+                fut = rs.set_degrees_and_watch(angle)
+                while not fut.done():
                     rs.sigDegreesChanged.emit(rs.get_degrees())
                     yield
+                fut.result()
 
     def move_delay_line(self, t):
         self.controller.delay_line.set_pos(t, do_wait=False)
@@ -96,7 +124,15 @@ class PumpProbePlan(Plan):
                 pp.cam.cam.get_background()
             self.probe_shutter.open()
 
-        yield from self.move_delay_line(self.t_list[0] - 200)
+        # Approach the first point from outside of the delay range
+        if self.sweep.backwards:
+            yield from self.move_delay_line(self.t_list[-1] * 1000 + self.pre_offset_fs)
+        else:
+            yield from self.move_delay_line(self.t_list[0] * 1000 - self.pre_offset_fs)
+
+    def sweep_indices(self) -> Iterable[int]:
+        n = len(self.t_list)
+        return range(n - 1, -1, -1) if self.sweep.backwards else range(n)
 
     def scan(self) -> Generator:
         c = self.controller
@@ -106,16 +142,23 @@ class PumpProbePlan(Plan):
             print("Calibrating Ref")
             print(f"At t={self.controller.delay_line.get_pos()}")
             self.cam_data[0].cam.cam.calibrate_ref()
-        for self.t_idx, t in enumerate(self.t_list):
+        for self.t_idx in self.sweep_indices():
+            t = self.t_list[self.t_idx]
             yield from self.move_delay_line(t * 1000)
             if self.pump_shutter:
                 self.pump_shutter.open()
             threads = []
             self.time_tracker.point_starting()
-            for pp in self.cam_data:
-                t = threading.Thread(target=pp.read_point, args=(self.t_idx,))
+            if len(self.cam_data) > 1:
+                # Read all cams on the same shots
+                t = threading.Thread(target=self.read_point_group, args=(self.t_idx,))
                 t.start()
                 threads.append(t)
+            else:
+                for pp in self.cam_data:
+                    t = threading.Thread(target=pp.read_point, args=(self.t_idx,))
+                    t.start()
+                    threads.append(t)
             while any([t.is_alive() for t in threads]):
                 yield
             for pp in self.cam_data:
@@ -128,13 +171,22 @@ class PumpProbePlan(Plan):
             yield
         self.time_tracker.scan_ending()
 
+    def read_point_group(self, t_idx):
+        try:
+            self.controller.cam_group.read()
+        except InvalidBlockError as e:
+            for pp in self.cam_data:
+                pp.skip_point(t_idx, str(e))
+            return
+        for pp in self.cam_data:
+            pp.store_point(t_idx)
+
     def make_step_gen(self):
-        c = self.controller
-        rs = self.controller.rot_stage
         for cd in self.cam_data:
             cd.cam.set_shots(self.shots)
+            cd.wl_idx = self.sweep.cwl_idx % len(cd.cwl)
             if cd.cam.changeable_wavelength:
-                cd.cam.set_wavelength(cd.cwl[0])
+                cd.cam.set_wavelength(cd.cwl[cd.wl_idx])
 
         while True:
             yield from self.pre_scan()
@@ -143,17 +195,13 @@ class PumpProbePlan(Plan):
             assert delta_t is not None
             self.time_per_scan = "%d:%02d" % (delta_t // 60, delta_t % 60)
 
-            # --- post scans
+            # --- post scans, the next sweep starts from the current position
             self.num_scans += 1
-            self.controller.delay_line.set_pos(self.t_list[0], do_wait=False)
+            self.sweep = next(self.sweeps)
             for pp in self.cam_data:
-                pp.post_scan()
-
-            if self.use_rot_stage and (self.num_scans % self.common_mulitple_cwls == 0):
-                assert self.rot_stage_angles is not None
-                assert rs is not None
-                self.rot_idx = (self.rot_idx + 1) % len(self.rot_stage_angles)
-                rs.set_degrees(self.rot_stage_angles[self.rot_idx])
+                pp.post_scan(self.sweep.cwl_idx % len(pp.cwl))
+            # The rotation stage is moved in pre_scan
+            self.rot_idx = self.sweep.angle_idx
 
     def create_file(self):
         with self.data_file as f:
@@ -176,6 +224,7 @@ class PumpProbePlan(Plan):
                     del f["rot"]
                 f[name] = ppd.completed_scans
                 f.create_dataset("rot", data=self.rot_at_scan)
+            f.attrs["misaligned_blocks"] = self.controller.cam_group.misaligned_blocks
             f.attrs["meta"] = json.dumps(self.meta)
 
     def restore_state(self):
@@ -196,6 +245,7 @@ class PumpProbeData(QObject):
     scan: int = 0
     delay_scans: int = 0
     wl_idx: int = 0
+    prev_wl_idx: int = 0
     t_idx: int = 0
 
     last_signal: Optional[np.ndarray] = None
@@ -221,10 +271,15 @@ class PumpProbeData(QObject):
         self.current_scan = np.zeros((num_wl, num_t, num_sig, num_ch))
         self.mean_scans = None
        
-    def post_scan(self):
-        "Called when a scan through the delay-line has finished"
+    def post_scan(self, next_wl_idx: Optional[int] = None):
+        """Called when a scan through the delay-line has finished.
+
+        `next_wl_idx` is the index of the next center wavelength, by default
+        the wavelengths are cycled."""
         self.delay_scans += 1
-        self.wl_idx = self.delay_scans % len(self.cwl)
+        if next_wl_idx is None:
+            next_wl_idx = self.delay_scans % len(self.cwl)
+        self.prev_wl_idx, self.wl_idx = self.wl_idx, next_wl_idx
         if self.delay_scans % len(self.cwl) == 0:
             self.scan += 1
             if self.completed_scans is None:
@@ -234,28 +289,47 @@ class PumpProbeData(QObject):
                 self.completed_scans = np.concatenate(
                     (self.completed_scans, self.current_scan[None, ...])
                 )
-                self.mean_scans = self.completed_scans.mean(0)
+                self.mean_scans = np.nanmean(self.completed_scans, 0)
             self.plan.save()
         next_wl = self.cwl[self.wl_idx]
-        if len(self.cwl) > 1:
+        if len(self.cwl) > 1 and self.wl_idx != self.prev_wl_idx:
             self.cam.set_wavelength(next_wl)
         self.sigWavelengthChanged.emit()
 
     def read_point(self, t_idx):
+        try:
+            self.cam.read_cam()
+        except InvalidBlockError as e:
+            self.skip_point(t_idx, str(e))
+            return
+        self.store_point(t_idx)
+
+    def skip_point(self, t_idx, reason: str):
+        "Leaves the point out of the scan, it is NaN and ignored by the mean"
+        logger.error(f"Skipping t_idx {t_idx} of scan {self.scan}: {reason}")
+        self.t_idx = t_idx
+        self.current_scan[self.wl_idx, t_idx, :, :] = np.nan
+
+    def store_point(self, t_idx):
+        "Stores the last reading of the cam"
         self.t_idx = t_idx
-        self.cam.read_cam()
         lr = self.cam.last_read
         assert lr is not None
         if self.save_full_data:
+            lines = lr.line_data
             with self.plan.data_file as f:
                 ds = f.create_dataset(
                     f"full_data/{self.cam.name}/scan_{self.scan}/t_{t_idx: 05d}",
-                    data=lr.full_data.astype(np.float64),
+                    shape=(len(lines), *lines[0].shape),
+                    dtype=data_dtype(),
                     compression="lzf",
-                    chunks=(1, lr.full_data.shape[1], 20),
+                    chunks=(1, lines[0].shape[0], 20),
                     shuffle=True,
                     scaleoffset=2,
                 )
+                # Line by line, the reading is never stacked
+                for i, line in enumerate(lines):
+                    ds[i] = line
 
         self.current_scan[self.wl_idx, t_idx, :, :] = lr.signals[...]
         if self.mean_scans is not None:
@@ -197,7 +197,7 @@ class PumpProbeDataViewer(QWidget):
         self.info_label.setText(s)
 
     def handle_wl_change(self):
-        last_idx = self.pp_plan.wl_idx - 1
+        last_idx = self.pp_plan.prev_wl_idx
 
         for i in self.inf_lines[last_idx]:
             self.trans_plot.removeItem(i.trans_line)
@@ -326,6 +326,7 @@ class PumpProbeStarter(PlanStartDialog):
                 visible=has_rot,
             ),
             dict(name="Save Full Data", type="bool", value=False),
+            dict(name="Alternate Delay Direction", type="bool", value=True),
         ]
 
         for c in self.controller.cam_list:
@@ -350,6 +351,13 @@ class PumpProbeStarter(PlanStartDialog):
         self.paras = Parameter.create(name="Pump Probe", type="group", children=params)
         config.last_pump_probe = self.paras.saveState()
 
+    def describe_plan(self, plan: PumpProbePlan) -> str:
+        t = plan.predicted_cycle_time
+        return (
+            f"Predicted time per cycle: {int(t // 60)}:{int(t % 60):02d}"
+            f"<br>Order: {plan.scan_order}"
+        )
+
     def create_plan(self, controller: Controller):
         p = self.paras.child("Exp. Settings")
         s = self.paras.child("Sample")
@@ -397,6 +405,7 @@ class PumpProbeStarter(PlanStartDialog):
             use_rot_stage=p["Use Rotation Stage"],
             rot_stage_angles=angles,
             save_full_data=p["Save Full Data"],
+            alternate_delay=p["Alternate Delay Direction"],
         )
         return p
 
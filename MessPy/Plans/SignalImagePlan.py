@@ -1,19 +1,32 @@
 import concurrent
 import concurrent.futures
+import queue
+import threading
+import time
 
 from attr import define, attrib
 from PySide6.QtCore import Signal
 from loguru import logger
 from MessPy.ControlClasses import Cam, Reading
 from MessPy.Instruments.interfaces import ICam, ILissajousScanner
+from MessPy.Instruments.trajectory import SerpentineTrajectory, TrajectoryRunner
 from MessPy.Plans.PlanBase import ScanPlan
 
 import numpy as np
-from typing import ClassVar
+from typing import ClassVar, Optional
 
 
 @define(auto_attribs=True, slots=False)
 class SignalImagePlan(ScanPlan):
+    """Images the signal of the cam on the xy-grid `positions`, (ny, nx, 2).
+
+    In the fly-scan mode, the stage sweeps the lines of the grid in a
+    serpentine while the cam reads blocks of `shots` continuously. Each block
+    is assigned to the pixel at the interpolated stage position of its center.
+    Without a given `fly_speed`, the speed is chosen such that each pixel
+    gets `blocks_per_pixel` blocks.
+    """
+
     cam: ICam
     xy_stage: ILissajousScanner
     positions: np.ndarray
@@ -22,10 +35,18 @@ class SignalImagePlan(ScanPlan):
     cur_image: np.ndarray = attrib(init=False)
 
     cur_signal: Reading = attrib(init=False)
+    # Running mean over the completed scans, the scans are stored in the file
     mean_signal: np.ndarray = attrib(init=False)
-    all_signals: np.ndarray = attrib(init=False)
 
     shots: int = 150
+    fly_scan: bool = False
+    fly_speed: Optional[float] = None
+    fly_turn_time: float = 0.2
+    blocks_per_pixel: int = 2
+    # Number of blocks binned into each pixel of the current scan
+    block_counts: np.ndarray = attrib(init=False)
+    ix: int = 0
+    iy: int = 0
     plan_shorthand: ClassVar[str] = "SignalImage"
     sigPointRead: ClassVar[Signal] = Signal()
 
@@ -37,42 +58,143 @@ class SignalImagePlan(ScanPlan):
             self.cam.channels,
         )
         self.cur_image = np.zeros(image_shape)
+        self.block_counts = np.zeros(image_shape[:2], dtype=int)
         self.cam.set_shots(self.shots)
-        self.xy_stage.set_pos_mm(self.positions.flat[0])
+        self.xy_stage.set_pos_mm(*self.positions[0, 0])
+        if self.fly_scan and self.fly_speed is None:
+            if self.positions.shape[1] < 2:
+                raise ValueError("Fly scan over a single x position needs a fly_speed")
+            with concurrent.futures.ThreadPoolExecutor() as executor:
+                t0 = time.monotonic()
+                future = executor.submit(self.cam.make_reading)
+                while not future.done():
+                    yield
+                t_block = time.monotonic() - t0
+            dx = abs(self.positions[0, 1, 0] - self.positions[0, 0, 0])
+            self.fly_speed = dx / t_block / self.blocks_per_pixel
+            logger.info(f"Fly scan with {self.fly_speed:.3f} mm/s")
         yield
 
     def scan(self):
+        self.block_counts[:] = 0
+        if self.fly_scan:
+            yield from self.scan_flying()
+        else:
+            yield from self.scan_points()
+
+    def scan_points(self):
         x_pos = self.positions[..., 0]
         y_pos = self.positions[..., 1]
-        for self.ix, x in enumerate(x_pos[0, :]):
+        nx = x_pos.shape[1]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+            # Rows in serpentine order, hence there are no flyback moves.
             for self.iy, y in enumerate(y_pos[:, 0]):
-                self.time_tracker.point_starting()
-                self.xy_stage.set_pos_mm(x, y)
-                while not self.xy_stage.is_moving():
-                    yield
-                with concurrent.futures.ThreadPoolExecutor() as executor:
+                for i in range(nx):
+                    self.ix = i if self.iy % 2 == 0 else nx - 1 - i
+                    self.time_tracker.point_starting()
+                    self.xy_stage.set_pos_mm(x_pos[0, self.ix], y)
+                    moved = self.xy_stage.watch_motion()
+                    while not moved.done():
+                        yield
                     future = executor.submit(self.cam.make_reading)
-                while not future.done():
+                    while not future.done():
+                        yield
+                    self.cur_signal = future.result()
+                    self.cur_image[self.iy, self.ix, :, :] = self.cur_signal.signals
+                    self.block_counts[self.iy, self.ix] = 1
+                    self.sigPointRead.emit()
+                    self.time_tracker.point_ending()
                     yield
-                self.cur_signal = future.result()
-                self.cur_image[self.iy, self.ix, :, :] = self.cur_signal.signals
-                self.sigPointRead.emit()
-                self.time_tracker.point_ending()
+
+    def scan_flying(self):
+        x = self.positions[0, :, 0]
+        y = self.positions[:, 0, 1]
+        traj = SerpentineTrajectory(
+            x[0], x[-1], y[0], y[-1], n_lines=len(y),
+            speed=self.fly_speed, t_turn=self.fly_turn_time
+        )
+        sums = np.zeros_like(self.cur_image)
+        runner = self.xy_stage.run_trajectory(traj)
+        while runner.t0 is None and runner.running:
+            yield
+        blocks: queue.Queue = queue.Queue()
+        reader = threading.Thread(target=self.read_blocks, args=(runner, blocks))
+        reader.start()
+        while reader.is_alive() or not blocks.empty():
+            try:
+                item = blocks.get_nowait()
+            except queue.Empty:
                 yield
+                continue
+            if isinstance(item, Exception):
+                runner.stop()
+                reader.join()
+                raise item
+            t_start, t_end, reading = item
+            self.time_tracker.point_starting()
+            if self.bin_block(runner, traj, t_start, t_end, reading, sums):
+                self.sigPointRead.emit()
+            self.time_tracker.point_ending()
+        runner.future.result()
+
+    def read_blocks(self, runner: TrajectoryRunner, blocks: queue.Queue):
+        """Reads blocks back to back while the stage is moving.
+
+        An error of the cam ends the reading and is put on the queue, hence
+        `scan_flying` raises it instead of saving an incomplete image.
+        """
+        try:
+            while runner.running:
+                t_start = time.monotonic()
+                reading = self.cam.make_reading()
+                blocks.put((t_start, time.monotonic(), reading))
+        except Exception as e:
+            blocks.put(e)
+
+    def bin_block(self, runner: TrajectoryRunner, traj: SerpentineTrajectory,
+                  t_start: float, t_end: float, reading: Reading,
+                  sums: np.ndarray) -> bool:
+        """Adds the block to its pixel, blocks overlapping a turn are dropped."""
+        line = traj.line_of(np.array([t_start, t_end]) - runner.t0)
+        if line[0] == -1 or line[0] != line[1]:
+            return False
+        bx, by = runner.positions_at([(t_start + t_end) / 2])[0]
+        x = self.positions[0, :, 0]
+        self.iy = int(line[0])
+        self.ix = int(np.argmin(np.abs(x - bx)))
+        self.cur_signal = reading
+        sums[self.iy, self.ix] += reading.signals
+        self.block_counts[self.iy, self.ix] += 1
+        self.cur_image[self.iy, self.ix] = (
+            sums[self.iy, self.ix] / self.block_counts[self.iy, self.ix]
+        )
+        return True
 
     def post_scan(self):
         logger.info(f"Post scan, saving data, calculating mean image")
+        n = self.cur_scan + 1
         if self.cur_scan == 0:
-            self.all_signals = self.cur_image[None, ...]
-
+            self.mean_signal = self.cur_image.copy()
         else:
-            self.all_signals = np.append(
-                self.all_signals, self.cur_image[None, ...], axis=0
-            )
-        self.mean_signal = np.mean(self.all_signals, 0)
+            self.mean_signal += (self.cur_image - self.mean_signal) / n
+        self.append_scan()
         self.cur_image = np.zeros_like(self.cur_image)
         assert self.cur_image.shape == self.mean_signal.shape
-        fname = self.get_file_name()[0]
-        np.savez(fname, data=self.all_signals, positions=self.positions)
-
         yield
+
+    def append_scan(self):
+        """Appends the current image to the file, the earlier scans are not touched."""
+        shape = self.cur_image.shape
+        with self.data_file as f:
+            if "data" not in f:
+                f.create_dataset("positions", data=self.positions)
+                f.create_dataset("wavelengths", data=self.wavelengths)
+                f.create_dataset(
+                    "data", shape=(0, *shape), maxshape=(None, *shape),
+                    chunks=(1, *shape), dtype=self.cur_image.dtype,
+                )
+                f.create_dataset("mean", data=self.mean_signal)
+            ds = f["data"]
+            ds.resize(self.cur_scan + 1, axis=0)
+            ds[self.cur_scan] = self.cur_image
+            f["mean"][...] = self.mean_signal
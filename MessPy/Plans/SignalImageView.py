@@ -112,6 +112,7 @@ class SignalImageStarter(PlanStartDialog):
             {"name": "Shots", "type": "int", "max": 2000, "value": 100},
             {"name": "Resolution / mm", "type": "float", "value": 0.1, "step": 0.05},
             {"name": "Square width / mm", "type": "float", "value": 0.1, "step": 0.05},
+            {"name": "Fly scan", "type": "bool", "value": False},
         ]
         self.p = pt.Parameter.create(name="Exp. Settings", type="group", children=tmp)
         params = [self.p]
@@ -139,6 +140,7 @@ class SignalImageStarter(PlanStartDialog):
             xy_stage=controller.sample_holder,
             positions=positions,
             shots=shots,
+            fly_scan=p.child("Fly scan").value(),
             name=p.child("Filename").value(),
         )
 
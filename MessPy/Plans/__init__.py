@@ -1,25 +1,65 @@
-from .PumpProbe import PumpProbePlan
-from .PumpProbeViewer import PumpProbeViewer, PumpProbeStarter
-from .ScanSpectrum import ScanSpectrum
-from .ScanSpectrumView import ScanSpectrumView, ScanSpectrumStarter
-from .ScanFoldingMirrors import ScanFoldingMirrors
-from .ScanFoldingMirrorsView import ScanFoldingMirrorView, ScanFoldingMirrorsStarter
-from .AlignmentHelper import AlignmentHelper
-from .FocusScan import FocusScan
-from .FocusScanView import FocusScanView, FocusScanStarter
-from .GVDScan import GVDScan
-from .GVDScanView import GVDScanView, GVDScanStarter
-from .AdaptiveTimeZeroPlan import AdaptiveTimeZeroPlan
-from .AdaptiveTimeZeroView import AdaptiveTZViewer, AdaptiveTZStarter
-from .AOMTwoPlan import AOMTwoDPlan
-from .AOMTwoDView import AOMTwoDViewer, AOMTwoDStarter
-from .ShaperCalibPlan import CalibPlan
-from .ShaperCalibView import CalibScanView
-from .SignalImagePlan import SignalImagePlan
-from .SignalImageView import SignalImageView, SignalImageStarter
-from .FastGVDScan import FastGVDScan
-from .FastGVDPScanView import FastGVDScanStarter, FastGVDScanView
-from .PlanBase import Plan, ScanPlan
-# from .GermaniumPlan import GermaniumPlan
-# from .GermaniumView import GermaniumView, GermaniumStarter
-# __all__ = [PumpProbePlan, PumpProbeViewer, pump_probe_starter,  TwoDViewer, TwoDStarter]
+"""The plans and their views, imported on first access.
+
+Importing all plan modules takes seconds, see `registry`.
+"""
+
+import importlib
+import sys
+import types
+
+# Exported name -> module
+_exports = {
+    "PumpProbePlan": "PumpProbe",
+    "PumpProbeViewer": "PumpProbeViewer",
+    "PumpProbeStarter": "PumpProbeViewer",
+    "ScanSpectrum": "ScanSpectrum",
+    "ScanSpectrumView": "ScanSpectrumView",
+    "ScanSpectrumStarter": "ScanSpectrumView",
+    "ScanFoldingMirrors": "ScanFoldingMirrors",
+    "ScanFoldingMirrorView": "ScanFoldingMirrorsView",
+    "ScanFoldingMirrorsStarter": "ScanFoldingMirrorsView",
+    "AlignmentHelper": "AlignmentHelper",
+    "FocusScan": "FocusScan",
+    "FocusScanView": "FocusScanView",
+    "FocusScanStarter": "FocusScanView",
+    "GVDScan": "GVDScan",
+    "GVDScanView": "GVDScanView",
+    "GVDScanStarter": "GVDScanView",
+    "AdaptiveTimeZeroPlan": "AdaptiveTimeZeroPlan",
+    "AdaptiveTZViewer": "AdaptiveTimeZeroView",
+    "AdaptiveTZStarter": "AdaptiveTimeZeroView",
+    "AOMTwoDPlan": "AOMTwoPlan",
+    "AOMTwoDViewer": "AOMTwoDView",
+    "AOMTwoDStarter": "AOMTwoDView",
+    "CalibPlan": "ShaperCalibPlan",
+    "CalibScanView": "ShaperCalibView",
+    "SignalImagePlan": "SignalImagePlan",
+    "SignalImageView": "SignalImageView",
+    "SignalImageStarter": "SignalImageView",
+    "FastGVDScan": "FastGVDScan",
+    "FastGVDScanStarter": "FastGVDPScanView",
+    "FastGVDScanView": "FastGVDPScanView",
+    "Plan": "PlanBase",
+    "ScanPlan": "PlanBase",
+}
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    obj = getattr(importlib.import_module(f"{__name__}.{_exports[name]}"), name)
+    globals()[name] = obj
+    return obj
+
+
+class _PlansModule(types.ModuleType):
+    def __setattr__(self, name, value):
+        # Importing a submodule binds it to the package, but the classes
+        # named like their module (ScanSpectrum, FocusScan, ...) take precedence.
+        if isinstance(value, types.ModuleType) and _exports.get(name) == name:
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _PlansModule
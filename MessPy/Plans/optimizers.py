@@ -0,0 +1,229 @@
+"""Derivative-free optimizers with an ask/tell interface.
+
+The plans drive the hardware step by step, hence the optimizers never call
+the objective themselves. `ask` returns the next point to evaluate and
+`tell` takes the measured value. All optimizers *maximize* the objective and
+keep the full evaluation history.
+
+The algorithms are written as generators, which yield a point and receive its
+value, `Optimizer` turns them into the ask/tell form.
+"""
+
+import abc
+import typing as T
+
+import attr
+import numpy as np
+from numpy.typing import NDArray
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class Optimizer(abc.ABC):
+    x0: NDArray
+    step: NDArray
+    lower: NDArray = attr.ib(default=None)
+    upper: NDArray = attr.ib(default=None)
+    max_evals: int = 50
+    xs: T.List[NDArray] = attr.Factory(list)
+    ys: T.List[float] = attr.Factory(list)
+    done: bool = False
+    _pending: T.Optional[NDArray] = attr.ib(init=False, default=None)
+    _gen: T.Generator = attr.ib(init=False, default=None)
+
+    def __attrs_post_init__(self):
+        self.x0 = np.atleast_1d(np.asarray(self.x0, dtype=float))
+        self.step = np.broadcast_to(np.asarray(self.step, dtype=float), self.x0.shape)
+        if self.lower is None:
+            self.lower = np.full_like(self.x0, -np.inf)
+        if self.upper is None:
+            self.upper = np.full_like(self.x0, np.inf)
+        self.lower = np.asarray(self.lower, dtype=float)
+        self.upper = np.asarray(self.upper, dtype=float)
+        self._gen = self._search()
+        self._pending = self._clip(next(self._gen))
+
+    def _clip(self, x) -> NDArray:
+        return np.clip(np.asarray(x, dtype=float), self.lower, self.upper)
+
+    def ask(self) -> NDArray:
+        assert self._pending is not None, "Optimizer is done"
+        return self._pending.copy()
+
+    def tell(self, y: float):
+        assert self._pending is not None, "Optimizer is done"
+        self.xs.append(self._pending)
+        self.ys.append(float(y))
+        if len(self.ys) >= self.max_evals:
+            self._finish()
+            return
+        try:
+            self._pending = self._clip(self._gen.send(float(y)))
+        except StopIteration:
+            self._finish()
+
+    def _finish(self):
+        self.done = True
+        self._pending = None
+
+    @property
+    def best(self) -> T.Tuple[NDArray, float]:
+        i = int(np.argmax(self.ys))
+        return self.xs[i], self.ys[i]
+
+    @abc.abstractmethod
+    def _search(self) -> T.Generator[NDArray, float, None]:
+        pass
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class NelderMead(Optimizer):
+    """Downhill simplex, the initial simplex spans `step` along each axis."""
+
+    xtol: float = 1e-3
+    ftol: float = 1e-6
+
+    def _search(self):
+        n = len(self.x0)
+        simplex = [self.x0] + [self.x0 + np.eye(n)[i] * self.step[i] for i in range(n)]
+        simplex = [self._clip(p) for p in simplex]
+        # Work on the negative values, the simplex minimizes
+        fs = []
+        for p in simplex:
+            fs.append(-(yield p))
+        while True:
+            order = np.argsort(fs)
+            simplex = [simplex[i] for i in order]
+            fs = [fs[i] for i in order]
+            size = max(np.max(np.abs((p - simplex[0]) / self.step)) for p in simplex[1:])
+            if size < self.xtol or abs(fs[-1] - fs[0]) <= self.ftol * (abs(fs[0]) + 1e-12):
+                return
+            centroid = np.mean(simplex[:-1], 0)
+            xr = self._clip(centroid + (centroid - simplex[-1]))
+            fr = -(yield xr)
+            if fs[0] <= fr < fs[-2]:
+                simplex[-1], fs[-1] = xr, fr
+            elif fr < fs[0]:
+                xe = self._clip(centroid + 2 * (centroid - simplex[-1]))
+                fe = -(yield xe)
+                simplex[-1], fs[-1] = (xe, fe) if fe < fr else (xr, fr)
+            else:
+                if fr < fs[-1]:
+                    xc = self._clip(centroid + 0.5 * (xr - centroid))
+                else:
+                    xc = self._clip(centroid + 0.5 * (simplex[-1] - centroid))
+                fc = -(yield xc)
+                if fc < min(fr, fs[-1]):
+                    simplex[-1], fs[-1] = xc, fc
+                else:
+                    # shrink towards the best point
+                    for i in range(1, n + 1):
+                        simplex[i] = simplex[0] + 0.5 * (simplex[i] - simplex[0])
+                        fs[i] = -(yield simplex[i])
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class CoordinateSearch(Optimizer):
+    """Tries a step in both directions along each axis, halves the steps if
+    no direction improves."""
+
+    min_step: float = 1e-2
+    """Relative to the initial step."""
+
+    def _search(self):
+        x = self.x0.copy()
+        fx = yield x
+        step = self.step.copy()
+        while np.all(step >= self.min_step * self.step):
+            improved = False
+            for i in range(len(x)):
+                for sign in (1, -1):
+                    trial = x.copy()
+                    trial[i] += sign * step[i]
+                    trial = self._clip(trial)
+                    if np.array_equal(trial, x):
+                        continue
+                    ft = yield trial
+                    if ft > fx:
+                        x, fx, improved = trial, ft, True
+                        break
+            if not improved:
+                step = step / 2
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class BayesianOptimizer(Optimizer):
+    """Gaussian-process model with an RBF kernel and expected improvement.
+
+    The search region is given by the limits, infinite limits are replaced
+    by ``x0 +- 2 * step``. Starts with `n_init` Latin-hypercube points.
+    """
+
+    n_init: int = 5
+    length_scale: float = 0.2
+    """Kernel width relative to the search region."""
+    noise: float = 1e-2
+    """Variance of the measurement noise relative to the data variance."""
+    n_candidates: int = 2000
+    seed: T.Optional[int] = None
+
+    def _region(self) -> T.Tuple[NDArray, NDArray]:
+        lo = np.where(np.isfinite(self.lower), self.lower, self.x0 - 2 * self.step)
+        hi = np.where(np.isfinite(self.upper), self.upper, self.x0 + 2 * self.step)
+        return lo, hi
+
+    def _search(self):
+        rng = np.random.default_rng(self.seed)
+        lo, hi = self._region()
+        n = len(self.x0)
+        X = [(self.x0 - lo) / (hi - lo)]
+        Y = [(yield self.x0)]
+        # Latin hypercube in the unit cube
+        lhs = (rng.permuted(np.tile(np.arange(self.n_init - 1), (n, 1)), axis=1).T
+               + rng.random((self.n_init - 1, n))) / max(self.n_init - 1, 1)
+        for u in lhs:
+            X.append(u)
+            Y.append((yield lo + u * (hi - lo)))
+        while True:
+            u = self._next_point(np.array(X), np.array(Y), rng)
+            X.append(u)
+            Y.append((yield lo + u * (hi - lo)))
+
+    def _kernel(self, a: NDArray, b: NDArray) -> NDArray:
+        d2 = ((a[:, None, :] - b[None, :, :]) ** 2).sum(-1)
+        return np.exp(-0.5 * d2 / self.length_scale**2)
+
+    def predict(self, X: NDArray, Y: NDArray, Xs: NDArray) -> T.Tuple[NDArray, NDArray]:
+        """Posterior mean and std of the normalized GP at `Xs`."""
+        mu, sd = Y.mean(), Y.std() or 1.0
+        y = (Y - mu) / sd
+        K = self._kernel(X, X) + self.noise * np.eye(len(X))
+        L = np.linalg.cholesky(K)
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, y))
+        Ks = self._kernel(Xs, X)
+        mean = Ks @ alpha
+        v = np.linalg.solve(L, Ks.T)
+        var = np.clip(1 - (v**2).sum(0), 1e-12, None)
+        return mean * sd + mu, np.sqrt(var) * sd
+
+    def _next_point(self, X: NDArray, Y: NDArray, rng) -> NDArray:
+        from scipy.stats import norm
+
+        n = X.shape[1]
+        best = X[np.argmax(Y)]
+        cand = np.vstack(
+            (
+                rng.random((self.n_candidates, n)),
+                np.clip(best + rng.normal(0, 0.05, (self.n_candidates // 4, n)), 0, 1),
+            )
+        )
+        mean, std = self.predict(X, Y, cand)
+        z = (mean - Y.max()) / std
+        ei = (mean - Y.max()) * norm.cdf(z) + std * norm.pdf(z)
+        return cand[np.argmax(ei)]
+
+
+optimizers: T.Dict[str, T.Type[Optimizer]] = {
+    "Nelder-Mead": NelderMead,
+    "Coordinate": CoordinateSearch,
+    "Bayesian": BayesianOptimizer,
+}
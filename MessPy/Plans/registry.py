@@ -0,0 +1,69 @@
+"""Plans shown in the toolbar of the main window.
+
+The plan and view modules import heavy dependencies (lmfit, scipy, h5py,
+the shaper DAC), hence the toolbar only knows the name, icon and
+availability of each plan. The module of the starter dialog is imported when
+its button is used the first time.
+"""
+
+import importlib
+import typing as T
+
+import attr
+
+if T.TYPE_CHECKING:
+    from MessPy.ControlClasses import Controller
+
+
+def _always(controller: "Controller") -> bool:
+    return True
+
+
+def _has_sample_holder(controller: "Controller") -> bool:
+    return controller.sample_holder is not None
+
+
+def _has_shaper(controller: "Controller") -> bool:
+    return controller.shaper is not None
+
+
+def _has_folding_mirrors(controller: "Controller") -> bool:
+    return controller.shaper is not None and controller.shaper.fm1 is not None
+
+
+@attr.s(auto_attribs=True)
+class PlanEntry:
+    name: str
+    icon: str
+    """qtawesome name of the icon"""
+    module: str
+    """Module of the starter, relative to `MessPy.Plans`"""
+    starter: str
+    available: T.Callable[["Controller"], bool] = _always
+
+    def load(self):
+        """Imports the module and returns the starter class."""
+        mod = importlib.import_module(f"MessPy.Plans.{self.module}")
+        return getattr(mod, self.starter)
+
+
+plan_registry: T.List[PlanEntry] = [
+    PlanEntry("Pump Probe", "ei.graph", "PumpProbeViewer", "PumpProbeStarter"),
+    PlanEntry("Scan Spectrum", "ei.barcode", "ScanSpectrumView", "ScanSpectrumStarter"),
+    PlanEntry("Adaptive TZ", "ei.car", "AdaptiveTimeZeroView", "AdaptiveTZStarter"),
+    PlanEntry("Focus Scan", "fa5s.ruler-combined", "FocusScanView", "FocusScanStarter",
+              _has_sample_holder),
+    PlanEntry("Signal Image", "fa5s.image", "SignalImageView", "SignalImageStarter",
+              _has_sample_holder),
+    PlanEntry("Fast GVD Scan", "ei.car", "FastGVDPScanView", "FastGVDScanStarter",
+              _has_shaper),
+    PlanEntry("GVD Scan", "fa5s.stopwatch", "GVDScanView", "GVDScanStarter", _has_shaper),
+    PlanEntry("2D Measurement", "ei.graph", "AOMTwoDView", "AOMTwoDStarter", _has_shaper),
+    PlanEntry("Folding Mirror Scan", "fa5s.stopwatch", "ScanFoldingMirrorsView",
+              "ScanFoldingMirrorsStarter", _has_folding_mirrors),
+    PlanEntry("Optimize", "fa5s.crosshairs", "OptimizeView", "OptimizeStarter"),
+]
+
+
+def available_plans(controller: "Controller") -> T.List[PlanEntry]:
+    return [p for p in plan_registry if p.available(controller)]
@@ -0,0 +1,183 @@
+"""Ordering of the delay sweeps of a pump-probe experiment.
+
+A pump-probe plan cycles through center wavelengths (cwl) and polarization
+angles, doing one delay sweep per combination. Changing the grating and
+rotating the stage are slow, as is the long move back to the start of the
+delay list. `plan_scan_order` predicts the motion time of the possible
+orders with a simple cost model and picks the fastest one, which satisfies
+the drift rules:
+
+* The angle loop is always the outer one, since the cams store one scan over
+  all their wavelengths per angle.
+* With `alternate_delay`, the direction of the delay sweeps alternates, and
+  each (cwl, angle) combination is measured equally often in both
+  directions.
+"""
+
+import collections
+import itertools
+import typing as T
+
+import attr
+import numpy as np
+
+if T.TYPE_CHECKING:
+    from MessPy.ControlClasses import Controller
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class Sweep:
+    cwl_idx: int
+    angle_idx: int
+    backwards: bool
+
+
+@attr.s(auto_attribs=True)
+class MotionCosts:
+    """Rough times of the moves in seconds, used to compare orders."""
+
+    delay_fs_s: float = 20000.0
+    delay_settle: float = 0.02
+    point_time: float = 0.1
+    grating_nm_s: float = 100.0
+    grating_settle: float = 1.0
+    rot_deg_s: float = 10.0
+    rot_settle: float = 0.2
+    pre_offset_fs: float = 200.0
+
+    @classmethod
+    def from_controller(cls, controller: "Controller", shots: int, **kwargs) -> "MotionCosts":
+        """Uses the known speeds of the devices, assuming 1 kHz shots."""
+        from MessPy.Instruments.interfaces import mm_to_fs
+
+        costs = cls(point_time=shots / 1000.0, **kwargs)
+        dl = controller.delay_line._dl
+        if dl.speed_mm_s:
+            costs.delay_fs_s = mm_to_fs(dl.speed_mm_s * dl.beam_passes)
+        rs = controller.rot_stage
+        if rs is not None and rs.speed_deg_s:
+            costs.rot_deg_s = rs.speed_deg_s
+        return costs
+
+    def delay(self, a: float, b: float) -> float:
+        return abs(b - a) / self.delay_fs_s + self.delay_settle
+
+    def grating(self, a: float, b: float) -> float:
+        return 0.0 if a == b else abs(b - a) / self.grating_nm_s + self.grating_settle
+
+    def rotation(self, a: float, b: float) -> float:
+        return 0.0 if a == b else abs(b - a) / self.rot_deg_s + self.rot_settle
+
+
+@attr.s(auto_attribs=True, frozen=True)
+class ScanOrder:
+    """`cwl_serpentine` and `angle_serpentine` reverse the order of the
+    loop every time the outer loop advances, hence the setting at the
+    boundary is kept."""
+
+    cwl_serpentine: bool = False
+    angle_serpentine: bool = False
+    alternate_delay: bool = False
+
+    def pattern(self, n_cwl: int, n_angles: int) -> T.Optional[T.List[Sweep]]:
+        """Sweeps of two cycles, after which the order repeats.
+
+        Returns `None` if the sweep directions can not be balanced.
+        """
+        combos = []
+        block = 0
+        for cycle in range(2):
+            angles = range(n_angles)
+            if self.angle_serpentine and cycle % 2:
+                angles = angles[::-1]
+            for a in angles:
+                cwls = range(n_cwl)
+                if self.cwl_serpentine and block % 2:
+                    cwls = cwls[::-1]
+                block += 1
+                combos += [(k, a) for k in cwls]
+        if not self.alternate_delay:
+            return [Sweep(k, a, False) for k, a in combos]
+        n = len(combos) // 2
+        # The second cycle may need to start with the same direction
+        # the first one ended with.
+        for flip in (0, 1):
+            dirs = [bool((i + (flip if i >= n else 0)) % 2) for i in range(2 * n)]
+            backwards = collections.Counter(c for c, d in zip(combos, dirs) if d)
+            if all(backwards[c] == 1 for c in combos[:n]):
+                return [Sweep(k, a, d) for (k, a), d in zip(combos, dirs)]
+        return None
+
+    def iter_sweeps(self, n_cwl: int, n_angles: int) -> T.Iterator[Sweep]:
+        """Endless sequence of the sweeps."""
+        pattern = self.pattern(n_cwl, n_angles)
+        if pattern is None:
+            raise ValueError(f"{self} can not balance the sweep directions")
+        return itertools.cycle(pattern)
+
+
+def predict_time(
+    order: ScanOrder,
+    t_fs: np.ndarray,
+    cwls: T.Sequence[T.Sequence[float]],
+    angles: T.Sequence[float],
+    costs: MotionCosts,
+    n_sweeps: int,
+) -> float:
+    """Predicted duration of the first `n_sweeps` sweeps.
+
+    `cwls` are the center wavelengths of each cam, the cams step through
+    their lists together, like `PumpProbePlan` does.
+    """
+    n_cwl = int(np.lcm.reduce([len(c) for c in cwls])) if cwls else 1
+    angles = list(angles) or [0.0]
+    total = 0.0
+    cur_cwl, cur_angle, cur_delay = None, None, None
+    sweeps = order.iter_sweeps(n_cwl, len(angles))
+    for sweep in itertools.islice(sweeps, n_sweeps):
+        wls = [c[sweep.cwl_idx % len(c)] for c in cwls]
+        if cur_cwl is not None:
+            total += max(
+                (costs.grating(a, b) for a, b in zip(cur_cwl, wls)), default=0.0
+            )
+        angle = angles[sweep.angle_idx]
+        if cur_angle is not None:
+            total += costs.rotation(cur_angle, angle)
+        points = t_fs[::-1] if sweep.backwards else t_fs
+        sign = 1 if sweep.backwards else -1
+        pre = points[0] + sign * costs.pre_offset_fs
+        if cur_delay is not None:
+            total += costs.delay(cur_delay, pre)
+        total += costs.delay(pre, points[0])
+        total += sum(costs.delay(a, b) for a, b in zip(points[:-1], points[1:]))
+        total += len(points) * costs.point_time
+        cur_cwl, cur_angle, cur_delay = wls, angle, points[-1]
+    return total
+
+
+def plan_scan_order(
+    t_fs: np.ndarray,
+    cwls: T.Sequence[T.Sequence[float]],
+    angles: T.Sequence[float],
+    costs: MotionCosts,
+    alternate_delay: T.Optional[bool] = True,
+) -> T.Tuple[ScanOrder, float]:
+    """Returns the fastest order and its predicted time per cycle.
+
+    `alternate_delay=None` lets the planner choose the sweep direction.
+    """
+    t_fs = np.asarray(t_fs, dtype=float)
+    n_cwl = int(np.lcm.reduce([len(c) for c in cwls])) if cwls else 1
+    per_cycle = n_cwl * max(len(angles), 1)
+    directions = [False, True] if alternate_delay is None else [alternate_delay]
+    best = None
+    for cwl_s, angle_s, alt in itertools.product([False, True], [False, True], directions):
+        order = ScanOrder(cwl_s, angle_s, alt)
+        if order.pattern(n_cwl, max(len(angles), 1)) is None:
+            continue
+        # Two cycles, since the serpentine orders repeat after two cycles.
+        t = predict_time(order, t_fs, cwls, angles, costs, 2 * per_cycle) / 2
+        if best is None or t < best[1] - 1e-9:
+            best = (order, t)
+    assert best is not None
+    return best
@@ -3,6 +3,7 @@ from abc import abstractmethod
 import datetime
 import math
 import typing as T
+import time
 from itertools import cycle
 
 import pyqtgraph as pg
@@ -32,6 +33,8 @@ from PySide6.QtWidgets import (
 
 
 from MessPy.Config import config
+from MessPy.tracing import traced
+from MessPy import metrics
 from qtawesome import icon
 
 if T.TYPE_CHECKING:
@@ -327,6 +330,10 @@ class PlanStartDialog(QDialog, metaclass=QProtocolMetaMeta):
     def create_plan(self, controller: "Controller"):
         raise NotImplementedError
 
+    def describe_plan(self, plan) -> str:
+        """Additional html shown below the validity, e.g. the expected duration."""
+        return ""
+
     def load_defaults(self, fname=None):
         pass
 
@@ -363,8 +370,8 @@ class PlanStartDialog(QDialog, metaclass=QProtocolMetaMeta):
 
     def check_if_valid(self):
         try:
-            self.create_plan(self.controller)
-            self.plan_valid_lbl.setText("<h2>Plan valid</h2>")
+            plan = self.create_plan(self.controller)
+            self.plan_valid_lbl.setText("<h2>Plan valid</h2>" + self.describe_plan(plan))
             self.start_button.setEnabled(True)
             return True
         except Exception as e:
@@ -453,6 +460,7 @@ class ObserverPlot(pg.PlotWidget):
             self.timer.start(1000 // 60)
 
     @Slot()
+    @traced("ObserverPlot redraw", "gui")
     def update_data(self):
         if not self.do_update:
             return
@@ -539,6 +547,50 @@ class ValueLabels(QWidget):
             lbl.setText(self.fmt % getter())
 
 
+class MetricsView(QWidget):
+    """Shows the live metrics, the busy fractions are taken over the
+    refresh interval."""
+
+    def __init__(self, interval_ms: int = 1000, parent=None):
+        super(MetricsView, self).__init__(parent=parent)
+        self.lay = QFormLayout()
+        self.setLayout(self.lay)
+        self.labels: T.Dict[str, QLabel] = {}
+        self.last_busy: T.Dict[str, float] = {}
+        self.last_t = time.monotonic()
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.update_labels)
+        self.timer.start(interval_ms)
+
+    def set_row(self, name: str, text: str):
+        if name not in self.labels:
+            self.labels[name] = QLabel()
+            self.lay.addRow(name + ":", self.labels[name])
+        self.labels[name].setText(text)
+
+    @Slot()
+    def update_labels(self):
+        now = time.monotonic()
+        dt, self.last_t = now - self.last_t, now
+        for labels, rate in list(metrics.shot_rate.values.items()):
+            cam = dict(labels)["cam"]
+            eff = metrics.shot_efficiency.get(cam=cam) or 0
+            self.set_row(f"{cam} shots/s", f"{rate:.0f} ({100 * eff:.0f} %)")
+        for labels, total in list(metrics.busy_seconds.values.items()):
+            activity = dict(labels)["activity"]
+            busy = total - self.last_busy.get(activity, total)
+            self.last_busy[activity] = total
+            self.set_row(f"{activity.capitalize()} time", f"{100 * busy / dt:.0f} %")
+        dropped = sum(metrics.dropped_shots.values.values())
+        self.set_row("Dropped shots", f"{dropped:.0f}")
+        for labels, lag in list(metrics.frame_lag.values.items()):
+            self.set_row(f"{dict(labels)['cam']} frame lag", f"{lag:.0f}")
+        for labels, depth in list(metrics.queue_depth.values.items()):
+            self.set_row(f"{dict(labels)['queue']} queue", f"{depth:.0f}")
+        n_points = metrics.points.get() or 0
+        self.set_row("Points", f"{n_points:.0f}, {metrics.point_seconds.mean():.2f} s each")
+
+
 def make_groupbox(widgets, title="") -> QGroupBox:
     """Puts given widgets into a groupbox"""
     gb = QGroupBox()
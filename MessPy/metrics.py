@@ -0,0 +1,203 @@
+"""Live metrics of the acquisition: counters, gauges and histograms.
+
+The camera, controller and plan layers update the metrics defined at the
+end of this module. The main window shows them in a dock, and
+`registry.serve(port)` exports them in the Prometheus text format for long
+unattended runs. Updates are cheap and thread-safe, there is no sampling.
+"""
+
+import bisect
+import math
+import threading
+import time
+import typing as T
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import attr
+from loguru import logger
+
+Labels = T.Tuple[T.Tuple[str, str], ...]
+
+
+def _labels(kwargs: dict) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in kwargs.items()))
+
+
+def _fmt_labels(labels: Labels, extra: T.Optional[T.Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class Metric:
+    name: str
+    help: str = ""
+    values: T.Dict[Labels, T.Any] = attr.Factory(dict)
+    _lock: threading.Lock = attr.Factory(threading.Lock)
+
+    kind: T.ClassVar[str] = "untyped"
+
+    def get(self, **labels) -> T.Any:
+        return self.values.get(_labels(labels))
+
+    def lines(self) -> T.List[str]:
+        with self._lock:
+            return [f"{self.name}{_fmt_labels(k)} {v}" for k, v in self.values.items()]
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class Counter(Metric):
+    kind: T.ClassVar[str] = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _labels(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class Gauge(Metric):
+    kind: T.ClassVar[str] = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.values[_labels(labels)] = value
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class Histogram(Metric):
+    """Values are (bucket counts, sum, count), the buckets are cumulative
+    only in the export."""
+
+    buckets: T.Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10)
+
+    kind: T.ClassVar[str] = "histogram"
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        with self._lock:
+            counts, total, n = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0, 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.values[key] = (counts, total + value, n + 1)
+
+    def mean(self, **labels) -> float:
+        v = self.get(**labels)
+        return v[1] / v[2] if v else math.nan
+
+    def lines(self) -> T.List[str]:
+        out = []
+        with self._lock:
+            for key, (counts, total, n) in self.values.items():
+                acc = 0
+                for le, c in zip((*self.buckets, "+Inf"), counts):
+                    acc += c
+                    out.append(f"{self.name}_bucket{_fmt_labels(key, ('le', str(le)))} {acc}")
+                out.append(f"{self.name}_sum{_fmt_labels(key)} {total}")
+                out.append(f"{self.name}_count{_fmt_labels(key)} {n}")
+        return out
+
+
+@attr.s(auto_attribs=True, cmp=False)
+class MetricsRegistry:
+    metrics: T.Dict[str, Metric] = attr.Factory(dict)
+    server: T.Optional[ThreadingHTTPServer] = None
+
+    def _get(self, cls, name: str, help: str, **kwargs):
+        if name not in self.metrics:
+            self.metrics[name] = cls(name, help, **kwargs)
+        metric = self.metrics[name]
+        assert isinstance(metric, cls), f"{name} is a {metric.kind}"
+        return metric
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str = "") -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = "", **kwargs) -> Histogram:
+        return self._get(Histogram, name, help, **kwargs)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        out = []
+        for m in list(self.metrics.values()):
+            if m.help:
+                out.append(f"# HELP {m.name} {m.help}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+            out.extend(m.lines())
+        return "\n".join(out) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serves `render` at http://host:port/metrics in a thread."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(
+            target=self.server.serve_forever, name="metrics-http", daemon=True
+        ).start()
+        logger.info(f"Serving metrics at http://{host}:{self.server.server_port}/metrics")
+        return self.server
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+registry = MetricsRegistry()
+
+shots = registry.counter("messpy_shots_total", "Laser shots read by the cam")
+shot_rate = registry.gauge("messpy_shot_rate_hz", "Achieved shot rate, including dead time")
+shot_efficiency = registry.gauge(
+    "messpy_shot_efficiency", "Achieved shot rate relative to the laser repetition rate"
+)
+reading_seconds = registry.histogram("messpy_reading_seconds", "Duration of a reading")
+busy_seconds = registry.counter(
+    "messpy_busy_seconds_total", "Time spent acquiring, moving and saving"
+)
+rejected_shots = registry.counter(
+    "messpy_rejected_shots_total", "Outlier shots left out of the signals"
+)
+dropped_shots = registry.counter(
+    "messpy_dropped_shots_total", "Shots missing between consecutive blocks"
+)
+frame_lag = registry.gauge(
+    "messpy_frame_lag", "Frames acquired by the hardware but not read yet"
+)
+queue_depth = registry.gauge("messpy_queue_depth", "Blocks waiting in a stream queue")
+invalid_blocks = registry.counter(
+    "messpy_invalid_blocks_total", "Blocks with lost frames or triggers"
+)
+points = registry.counter("messpy_points_total", "Points measured by the plans")
+point_seconds = registry.histogram("messpy_point_seconds", "Duration of a point of a plan")
+
+
+def time_future(fut: T.Optional[Future], activity: str, **labels) -> T.Optional[Future]:
+    """Adds the time until `fut` is done to `busy_seconds`."""
+    if fut is None:
+        return fut
+    t0 = time.monotonic()
+    fut.add_done_callback(
+        lambda f: busy_seconds.inc(time.monotonic() - t0, activity=activity, **labels)
+    )
+    return fut
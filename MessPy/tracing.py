@@ -0,0 +1,157 @@
+"""Span tracing of the acquisition path.
+
+Spans record the wall-clock time of a named section together with the
+thread, they are kept in a ring buffer and can be exported as Chrome trace
+JSON, which is viewed with https://ui.perfetto.dev or chrome://tracing.
+
+    with span("get_spectra", "cam"):
+        ...
+
+    @traced("redraw", "gui")
+    def update_data(self): ...
+
+Tracing is off by default, then `span` returns a shared no-op context
+manager and `traced` functions only check a flag. Enable it by
+`tracer.enabled = True`, the config option `trace` or the environment
+variable `MESSPY_TRACE=1`.
+"""
+
+import collections
+import functools
+import json
+import os
+import threading
+import time
+import typing as T
+from concurrent.futures import Future
+from pathlib import Path
+
+import attr
+
+_clock = time.perf_counter_ns
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "cat", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, cat: str, args: dict):
+        self.tracer, self.name, self.cat, self.args = tracer, name, cat, args
+
+    def __enter__(self):
+        self.start = _clock()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.record(self.name, self.cat, self.start, _clock(), self.args)
+        return False
+
+
+@attr.s(auto_attribs=True)
+class Tracer:
+    enabled: bool = False
+    capacity: int = 100_000
+    """Number of spans kept, older ones are dropped."""
+    events: T.Deque[tuple] = attr.ib(init=False)
+    thread_names: T.Dict[int, str] = attr.Factory(dict)
+    t0: int = attr.Factory(_clock)
+
+    def __attrs_post_init__(self):
+        self.events = collections.deque(maxlen=self.capacity)
+
+    def span(self, name: str, cat: str = "", **args):
+        """Context manager timing its block."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, cat, args)
+
+    def traced(self, name: T.Optional[str] = None, cat: str = ""):
+        """Decorator timing each call of the function."""
+
+        def deco(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with Span(self, span_name, cat, {}):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return deco
+
+    def track(self, fut: T.Optional[Future], name: str, cat: str = "", **args):
+        """Records a span from now until `fut` is done, e.g. for a move."""
+        if not self.enabled or fut is None:
+            return fut
+        start, tid = _clock(), threading.get_ident()
+        self._name_thread(tid)
+        fut.add_done_callback(
+            lambda f: self.record(name, cat, start, _clock(), args, tid)
+        )
+        return fut
+
+    def record(self, name: str, cat: str, start: int, end: int,
+               args: T.Optional[dict] = None, tid: T.Optional[int] = None):
+        """Adds a finished span, times are `perf_counter_ns` values."""
+        if tid is None:
+            tid = threading.get_ident()
+            self._name_thread(tid)
+        self.events.append((name, cat, start, end, tid, args))
+
+    def _name_thread(self, tid: int):
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+
+    def clear(self):
+        self.events.clear()
+
+    def chrome_trace(self) -> dict:
+        """The spans in the Chrome trace event format, times in µs."""
+        pid = os.getpid()
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+             "args": {"name": tname}}
+            for tid, tname in list(self.thread_names.items())
+        ]
+        for name, cat, start, end, tid, args in list(self.events):
+            ev = {
+                "name": name,
+                "cat": cat,
+                "ph": "X",
+                "ts": (start - self.t0) / 1000,
+                "dur": (end - start) / 1000,
+                "pid": pid,
+                "tid": tid,
+            }
+            if args:
+                ev["args"] = {k: str(v) for k, v in args.items()}
+            events.append(ev)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome(self, path: T.Union[str, Path]) -> Path:
+        path = Path(path)
+        with path.open("w") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+
+tracer = Tracer(enabled=os.environ.get("MESSPY_TRACE", "") not in ("", "0"))
+span = tracer.span
+traced = tracer.traced
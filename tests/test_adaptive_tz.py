@@ -0,0 +1,56 @@
+import types
+
+import numpy as np
+import pytest
+
+from MessPy.Config import config
+from MessPy.Plans.AdaptiveTimeZeroPlan import AdaptiveTimeZeroPlan, gaussian_step
+
+T0 = 0.73
+
+
+class StepCam:
+    """Returns a step at T0 in the signal of the delay line position."""
+
+    def __init__(self, dl):
+        self.dl = dl
+        self.reads = 0
+        self.sigReadCompleted = types.SimpleNamespace(emit=lambda: None)
+
+    def set_shots(self, shots):
+        pass
+
+    def read_cam(self):
+        self.reads += 1
+        t = self.dl.pos / 1000
+        sig = np.zeros((3, 16))
+        sig[2] = gaussian_step(t, T0, 1, 0.5, 0.1) + np.random.normal(0, 0.005, 16)
+        return types.SimpleNamespace(signals=sig)
+
+
+class FakeDelay:
+    pos = 0.0
+
+    def set_pos(self, pos_fs, do_wait=True):
+        self.pos = pos_fs
+
+    def get_pos(self):
+        return self.pos
+
+
+@pytest.mark.parametrize("search", ["grid", "bisect"])
+def test_time_zero_search(qtbot, tmp_path, search):
+    config.data_directory = tmp_path
+    dl = FakeDelay()
+    cam = StepCam(dl)
+    plan = AdaptiveTimeZeroPlan(name="tz", cam=cam, delay_line=dl, search=search,
+                                current_step=0.2, max_diff=0.1, min_step=0.02)
+    for _ in plan.make_step_generator():
+        pass
+    x, y = plan.get_data()
+    assert np.all(np.diff(x) > 0)
+    if search == "bisect":
+        assert plan.t0 == pytest.approx(T0, abs=0.03)
+        assert cam.reads < 20
+    else:
+        assert cam.reads >= 50
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from MessPy.ControlClasses import Cam, CamGroup, InvalidBlockError
+from MessPy.Instruments.mocks import CamMock
+
+
+def test_cam_group():
+    cams = [Cam(CamMock(name="Mock1", shots=10)), Cam(CamMock(name="Mock2", shots=10))]
+    group = CamGroup(cams)
+    rd = group.read()
+    assert rd.aligned
+    assert rd.first_shot == 0
+    assert group.read().first_shot == 10
+
+    # Second cam misses 4 triggers at the start of the next block
+    cams[1].cam.skip_shots = 4
+    rd = group.read()
+    assert not rd.aligned
+    assert group.dropped == {"Mock2": 4}
+    assert rd.common == (24, 30)
+    assert rd.aligned_full_data("Mock1").shape[-1] == 6
+    np.testing.assert_array_equal(
+        rd.aligned_full_data("Mock2"), rd.readings["Mock2"].full_data[..., :6]
+    )
+
+    group.arm()
+    assert group.read().aligned
+
+
+def make_flaky(monkeypatch, cam, bad):
+    make_reading = cam.cam.make_reading
+
+    def flaky_reading():
+        rd = make_reading()
+        if bad[0]:
+            bad[0] -= 1
+            rd.valid, rd.reason = False, "lost trigger"
+        return rd
+
+    monkeypatch.setattr(cam.cam, "make_reading", flaky_reading)
+
+
+def test_reacquire_invalid(monkeypatch):
+    cam = Cam(CamMock(name="Mock1", shots=10))
+    bad = [2]
+    make_flaky(monkeypatch, cam, bad)
+    assert cam.read_cam().valid
+    assert bad == [0]
+
+    bad[0] = 3
+    with pytest.raises(InvalidBlockError):
+        cam.read_cam()
+
+
+def test_group_reacquire(monkeypatch):
+    cams = [Cam(CamMock(name="Mock1", shots=10)), Cam(CamMock(name="Mock2", shots=10))]
+    group = CamGroup(cams)
+    group.read()
+    make_flaky(monkeypatch, cams[1], [1])
+    rd = group.read()
+    # Both cams read again, hence they stay aligned
+    assert rd.aligned and rd.first_shot == 20
+    assert cams[0].cam.shot_counter == 40
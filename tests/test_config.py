@@ -0,0 +1,13 @@
+from MessPy.Config import Config
+
+
+def test_load_older_config(tmp_path):
+    old = Config(exp_settings={"Optimize": {"a": 1}}, max_reacquire=5)
+    # Written before the field was added
+    del old.__dict__["fft_workers"]
+    old.save(tmp_path / "config")
+    cfg = Config()
+    cfg.update_from(tmp_path / "config")
+    assert cfg.max_reacquire == 5
+    assert cfg.exp_settings == {"Optimize": {"a": 1}}
+    assert cfg.fft_workers == -1
@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from MessPy.Instruments.device_registry import DeviceRegistry
+
+
+def slow(value, t=0.1):
+    def factory(**deps):
+        time.sleep(t)
+        return value, sorted(deps)
+
+    return factory
+
+
+def test_parallel_with_dependencies():
+    reg = DeviceRegistry()
+    reg.add("a", slow("a"))
+    reg.add("b", slow("b"))
+    reg.add("c", slow("c"))
+    reg.add("d", slow("d"), depends=("a", "b"))
+    t0 = time.monotonic()
+    devices = reg.init_all()
+    # a, b and c in parallel, then d
+    assert time.monotonic() - t0 < 0.35
+    assert devices["d"] == ("d", ["a", "b"])
+    assert reg.records["d"].start >= max(reg.records[n].end for n in "ab")
+    assert reg.critical_path()[-1] == "d"
+    assert "Critical path" in reg.waterfall()
+
+
+def test_failures():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise IOError("no answer")
+        return "flaky"
+
+    def broken():
+        raise IOError("port missing")
+
+    reg = DeviceRegistry(mock_failed=True)
+    reg.add("flaky", flaky, retries=1)
+    reg.add("hanging", slow("never", 5), timeout=0.1, retries=1, fallback=lambda: "mock")
+    reg.add("broken", broken)
+    reg.add("dependent", slow("dep"), depends=("broken",))
+    devices = reg.init_all()
+    assert devices["flaky"] == "flaky"
+    assert reg.records["flaky"].attempts == 2
+    assert devices["hanging"] == "mock"
+    assert reg.records["hanging"].status == "mock"
+    # Not retried while the timed out attempt still runs
+    assert reg.records["hanging"].attempts == 1
+    assert devices["broken"] is None
+    assert reg.records["dependent"].status == "skipped"
+
+    reg.specs["broken"].required = True
+    with pytest.raises(RuntimeError):
+        reg.init_all()
+
+
+def test_cycle():
+    reg = DeviceRegistry()
+    reg.add("a", slow("a"), depends=("b",))
+    reg.add("b", slow("b"), depends=("a",))
+    with pytest.raises(ValueError):
+        reg.init_all()
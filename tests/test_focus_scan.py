@@ -0,0 +1,33 @@
+import numpy as np
+from pytest import fixture
+
+from MessPy.Config import config
+from MessPy.ControlClasses import Controller
+from MessPy.Plans.FocusScan import FocusScan
+
+
+@fixture
+def controller(qtbot):
+    return Controller()
+
+
+def test_adaptive_focus_scan(controller, tmp_path):
+    config.data_directory = tmp_path
+    plan = FocusScan(
+        name="focus",
+        cam=controller.cam,
+        fh=controller.sample_holder,
+        x_parameters=[0, 1.5, 0.02],
+        y_parameters=[0, 1.5, 0.02],
+        z_points=[0, 0.2],
+        shots=10,
+    )
+    assert plan.schedule() == [(0, "x"), (0, "y"), (1, "y"), (1, "x")]
+    for _ in plan.make_scan_gen():
+        pass
+    for name, scan in plan.scans.items():
+        assert len(scan.pos) <= 20
+        i = int(name[-1])
+        # Beam radius of the mock at the z position
+        w = 0.25 * np.sqrt(1 + ((plan.z_points[i] + 0.5) / 0.5) ** 2)
+        assert abs(abs(scan.fit_params[3]) - w) < 0.25 * w
@@ -0,0 +1,26 @@
+from MessPy.Instruments.frame_sync import FrameSync
+
+
+class FakeGrabber:
+    """Numbers the acquired frames from 0 like IMG_LAST_FRAME."""
+
+    def __init__(self):
+        self.last_frame = -1
+
+    def acquire(self, shots, lost=0):
+        self.last_frame += shots - lost
+
+
+def test_resync_after_lost_frame():
+    grabber, sync = FakeGrabber(), FrameSync()
+    shots = 10
+    problems = []
+    for lost in (0, 1, 0, 0):
+        assert grabber.last_frame + 1 == sync.frames
+        grabber.acquire(shots, lost)
+        problems.append(sync.end_block(shots, grabber.last_frame))
+    assert problems[0] is None
+    assert problems[1] == "frame grabber is -1 frames ahead"
+    # Only the block with the lost frame is invalid
+    assert problems[2:] == [None, None]
+    assert sync.first_shot == 29
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Import time of the main window module, measured with -X importtime.
+# The budget is generous, it catches eagerly imported plans, not noise.
+BUDGET_S = float(os.environ.get("MESSPY_IMPORT_BUDGET_S", 4.0))
+
+# Only needed once a plan is started
+LAZY_MODULES = [
+    "lmfit",
+    "h5py",
+    "MessPy.Plans.PlanBase",
+    "MessPy.Plans.PumpProbe",
+    "MessPy.Plans.AOMTwoPlan",
+    "MessPy.Plans.GVDScanView",
+]
+
+
+def import_times(module: str) -> dict:
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env,
+        cwd=Path(__file__).parent.parent,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_main_window_import_time():
+    times = import_times("MessPy.MessPy2D")
+    assert "MessPy.Plans.registry" in times
+    eager = [m for m in LAZY_MODULES if m in times]
+    assert not eager, f"Imported at startup: {eager}"
+    assert times["MessPy.MessPy2D"] < BUDGET_S
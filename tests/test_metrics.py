@@ -0,0 +1,41 @@
+import urllib.request
+from concurrent.futures import Future
+
+from MessPy.metrics import MetricsRegistry
+
+
+def test_render_and_serve():
+    reg = MetricsRegistry()
+    shots = reg.counter("shots_total", "Shots")
+    shots.inc(10, cam="A")
+    shots.inc(5, cam="A")
+    reg.gauge("lag").set(3, cam="B")
+    hist = reg.histogram("read_seconds", buckets=(0.1, 1))
+    for v in (0.05, 0.5, 2):
+        hist.observe(v)
+    assert reg.counter("shots_total") is shots
+    assert abs(hist.mean() - 2.55 / 3) < 1e-12
+
+    text = reg.render()
+    assert "# TYPE shots_total counter" in text
+    assert 'shots_total{cam="A"} 15' in text
+    assert 'lag{cam="B"} 3' in text
+    assert 'read_seconds_bucket{le="1"} 2' in text
+    assert 'read_seconds_bucket{le="+Inf"} 3' in text
+    assert "read_seconds_count 3" in text
+
+    server = reg.serve(port=0)
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as r:
+            assert r.read().decode() == reg.render()
+    finally:
+        reg.shutdown()
+
+
+def test_time_future():
+    from MessPy import metrics
+
+    fut = metrics.time_future(Future(), "test-move")
+    fut.set_result(None)
+    assert metrics.busy_seconds.get(activity="test-move") >= 0
@@ -0,0 +1,57 @@
+import time
+
+import attr
+import pytest
+
+from MessPy.Instruments.mocks import DelayLineMock, RotStageMock
+from MessPy.Instruments.motion import MotionService, _Watch, watch_device
+
+
+@attr.s(auto_attribs=True)
+class MovingDelayLine(DelayLineMock):
+    name: str = "MovingDelayLine"
+    speed_mm_s: float = 10.0
+    t_arrival: float = 0.0
+    polls: int = 0
+
+    def move_mm(self, mm, do_wait=True):
+        self.t_arrival = time.monotonic() + abs(mm - self.pos_mm) / self.speed_mm_s
+        self.pos_mm = mm
+
+    def is_moving(self):
+        self.polls += 1
+        return time.monotonic() < self.t_arrival
+
+
+def test_intervals():
+    ms = MotionService()
+    w = _Watch(lambda: True, None, 0.0, 1.0, None)
+    assert ms.next_interval(w, 0.0) == ms.slow_interval
+    assert ms.next_interval(w, 0.99) == pytest.approx(ms.fast_interval)
+    w.t_expected = None
+    w.polls = 100
+    assert ms.next_interval(w, 0.0) == ms.backoff_limit
+
+
+def test_move_completion(qtbot):
+    dl = MovingDelayLine()
+    # 0.2 mm, arrives after 20 ms
+    with qtbot.waitSignal(dl.sigMovementCompleted, timeout=2000):
+        fut = dl.move_fs(1334.3)
+    duration = fut.result()
+    assert 0.02 <= duration < 0.04
+    assert dl.polls < 10
+    assert not dl.is_moving()
+
+
+def test_timeout():
+    dl = MovingDelayLine(speed_mm_s=1.0)
+    dl.move_mm(1.0)
+    with pytest.raises(TimeoutError):
+        watch_device(dl, timeout=0.05).result(2)
+
+
+def test_rotation_stage_wait():
+    rs = RotStageMock()
+    rs.set_degrees_and_wait(10)
+    assert rs.get_degrees() == 10
@@ -0,0 +1,73 @@
+import h5py
+import numpy as np
+import pytest
+
+from MessPy.Config import config
+from MessPy.Plans.OptimizePlan import FunctionManipulator, ObjectivDetector, OptimizePlan, Parameter
+from MessPy.Plans.optimizers import optimizers
+
+OPT = np.array([1.0, -0.5])
+
+
+def peak(x):
+    return 10 - ((np.asarray(x) - OPT) ** 2).sum()
+
+
+@pytest.mark.parametrize("method", list(optimizers))
+def test_optimizers_find_peak(method):
+    kwargs = dict(seed=0) if method == "Bayesian" else {}
+    opt = optimizers[method](x0=[0, 0], step=[0.5, 0.5], lower=[-2, -2], upper=[2, 2],
+                             max_evals=40, **kwargs)
+    while not opt.done:
+        opt.tell(peak(opt.ask()))
+    x, y = opt.best
+    assert len(opt.ys) <= 40
+    assert y > 10 - 0.05
+
+
+class QuadraticObjective(ObjectivDetector):
+    def eval(self):
+        return peak(self.cam.pos)
+
+
+class Setter:
+    pos = np.zeros(2)
+
+    def __call__(self, *values):
+        self.pos = np.array(values)
+
+
+def test_optimize_plan(qtbot, tmp_path):
+    config.data_directory = tmp_path
+    setter = Setter()
+    mani = FunctionManipulator([Parameter("a", start_val=0, step=0.5),
+                                Parameter("b", start_val=0, step=0.5)], setter=setter)
+    plan = OptimizePlan(name="test", mani=mani, objective=QuadraticObjective(setter),
+                        method="Nelder-Mead", max_evals=60)
+    for _ in plan.make_step_generator():
+        pass
+    np.testing.assert_allclose(setter.pos, OPT, atol=0.05)
+    with h5py.File(plan.get_file_name()[0], "r") as f:
+        assert f["x"].shape == (len(plan.history_y), 2)
+        np.testing.assert_allclose(f["y"][...], plan.history_y)
+
+
+def test_optimize_starter(qtbot, tmp_path):
+    from MessPy.ControlClasses import Controller
+    from MessPy.Plans.OptimizeView import OptimizeStarter
+
+    config.data_directory = tmp_path
+    controller = Controller()
+    starter = OptimizeStarter(controller)
+    qtbot.addWidget(starter)
+    p = starter.paras.child("Exp. Settings")
+    p["Shots"] = 10
+    p["Step"] = 100.0
+    p["Max. evaluations"] = 3
+    plan = starter.create_plan(controller)
+    view = starter.viewer(plan)
+    qtbot.addWidget(view)
+    for _ in plan.make_step_generator():
+        pass
+    assert len(plan.history_y) == 3
+    assert "3/3 evaluations" in view.info_label.text()
@@ -0,0 +1,26 @@
+import collections
+
+import numpy as np
+
+from MessPy.Plans.scan_order import MotionCosts, ScanOrder, plan_scan_order, predict_time
+
+T_FS = np.arange(-1, 5, 0.1) * 1000
+CWLS = [[500, 600, 700]]
+ANGLES = [0, 45]
+
+
+def test_directions_balanced():
+    order, t = plan_scan_order(T_FS, CWLS, ANGLES, MotionCosts(), alternate_delay=True)
+    pattern = order.pattern(3, 2)
+    assert [s.backwards for s in pattern[:6]] == [False, True] * 3
+    counts = collections.Counter((s.cwl_idx, s.angle_idx, s.backwards) for s in pattern)
+    assert set(counts.values()) == {1}
+    assert len(counts) == 12
+
+
+def test_planned_order_is_faster():
+    costs = MotionCosts()
+    order, t = plan_scan_order(T_FS, CWLS, ANGLES, costs, alternate_delay=True)
+    naive = predict_time(ScanOrder(), T_FS, CWLS, ANGLES, costs, 12) / 2
+    assert t < naive
+    assert order.cwl_serpentine and order.angle_serpentine
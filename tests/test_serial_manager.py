@@ -0,0 +1,113 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+if sys.platform == "win32":
+    pytest.skip("pty not available", allow_module_level=True)
+
+from MessPy.Instruments.serial_manager import command_key, get_port
+
+
+class FakeSMC:
+    """Newport SMC-like controller behind a pty, answers after `delay` seconds."""
+
+    def __init__(self, delay=0.005):
+        self.master, slave = os.openpty()
+        self.name = os.ttyname(slave)
+        self.delay = delay
+        self.pos = 0.0
+        self.received = []
+        self.max_backlog = 0
+        self._stop = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def answer(self, cmd: str):
+        if cmd == "1TP":
+            return f"1TP{self.pos}"
+        elif cmd == "1MM?":
+            return "1MM33"
+        elif cmd.startswith("1PA"):
+            self.pos = float(cmd[3:])
+        elif cmd == "1SL?":
+            # Answers after the query timed out
+            time.sleep(0.3)
+            return "1SL-5"
+
+    def run(self):
+        buf = b""
+        while not self._stop:
+            buf += os.read(self.master, 1024)
+            self.max_backlog = max(self.max_backlog, buf.count(b"\r\n"))
+            while b"\r\n" in buf:
+                line, buf = buf.split(b"\r\n", 1)
+                self.received.append(line.decode())
+                ans = self.answer(line.decode())
+                if ans is not None:
+                    time.sleep(self.delay)
+                    os.write(self.master, ans.encode() + b"\r\n")
+
+
+@pytest.fixture
+def smc():
+    dev = FakeSMC()
+    port = get_port(dev.name, baudrate=115200, timeout=1)
+    yield dev, port
+    port.close()
+
+
+def test_command_key():
+    assert command_key(b"1PA-12.5") == "1PA"
+    assert command_key(b"1TP\r\n") == "1TP"
+
+
+def test_pipelined_queries(smc):
+    dev, port = smc
+    assert get_port(dev.name) is port
+    port.write("1PA12.5")
+    futs = [port.query("1TP") if i % 2 else port.query("1MM?") for i in range(10)]
+    answers = [f.result(2) for f in futs]
+    assert answers == [b"1MM33", b"1TP12.5"] * 5
+    # Queries were written before the previous answers arrived.
+    assert dev.max_backlog > 1
+    assert port.stats["1TP"].count == 5
+    assert port.stats["1MM?"].mean > 0
+
+
+def test_timeout(smc):
+    dev, port = smc
+    with pytest.raises(TimeoutError):
+        port.query("1XX", timeout=0.1).result(2)
+    assert port.ask("1TP") == b"1TP0.0"
+
+
+def test_late_answer_drained(smc):
+    dev, port = smc
+    port.drain_time = 0.5
+    with pytest.raises(TimeoutError):
+        port.query("1SL?", timeout=0.1).result(2)
+    assert port.ask("1TP") == b"1TP0.0"
+
+
+def test_late_answer_echo():
+    dev = FakeSMC()
+    port = get_port(dev.name, baudrate=115200, timeout=1, echoes_command=True)
+    with pytest.raises(TimeoutError):
+        port.query("1SL?", timeout=0.1).result(2)
+    # Written before the late answer arrived
+    assert port.ask("1TP") == b"1TP0.0"
+    port.close()
+
+
+def test_newport_delay(smc):
+    from MessPy.Instruments.delay_line_newport import NewportDelay
+
+    dev, port = smc
+    dl = NewportDelay(comport=dev.name)
+    assert dl.port is port
+    dl.move_mm(3.5)
+    assert dl.get_pos_mm() == 3.5
+    assert dl.controller_state().startswith("READY")
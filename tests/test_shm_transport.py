@@ -0,0 +1,90 @@
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+from MessPy.Instruments.shm_transport import (
+    BlockClient,
+    BlockServer,
+    PipelinedBlockClient,
+    ShmRing,
+)
+
+# 1000 shots of four 128 pixel lines
+BLOCK = np.random.randint(0, 2 << 14, (1000, 4 * 128), dtype=np.uint16)
+
+
+@pytest.fixture
+def server():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    srv = BlockServer(lambda: BLOCK, addr=f"tcp://127.0.0.1:{port}")
+    thr = threading.Thread(target=srv.serve_forever, daemon=True)
+    thr.start()
+    yield srv
+    BlockClient(srv.addr, use_shm=False).command("quit")
+    thr.join()
+
+
+def test_ring_views():
+    ring = ShmRing(n_slots=2, slot_bytes=BLOCK.nbytes, create=True)
+    other = ShmRing(name=ring.name, slot_bytes=BLOCK.nbytes)
+    slot, seq = ring.write(BLOCK)
+    np.testing.assert_array_equal(other.view(slot, BLOCK.shape, BLOCK.dtype), BLOCK)
+    with pytest.raises(ValueError):
+        ring.write(np.zeros(BLOCK.size + 1, dtype=BLOCK.dtype))
+    other.close()
+    ring.close()
+
+
+@pytest.mark.parametrize("use_shm", [False, True], ids=["tcp", "shm"])
+def test_transport_throughput(server, use_shm, benchmark):
+    client = BlockClient(server.addr, use_shm=use_shm)
+    arr = benchmark(client.read)
+    np.testing.assert_array_equal(arr, BLOCK)
+    assert client.command("unknown")[0] == "error"
+    del arr
+    client.close()
+
+
+def test_pipelined_client():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    shots = {"n": 10, "reads": 0}
+
+    def read_block():
+        shots["reads"] += 1
+        return np.full((shots["n"], 4), shots["reads"], dtype=np.uint16)
+
+    srv = BlockServer(
+        read_block,
+        addr=f"tcp://127.0.0.1:{port}",
+        commands={"set_shots": lambda n: shots.update(n=n) or n},
+    )
+    thr = threading.Thread(target=srv.serve_forever, daemon=True)
+    thr.start()
+    client = PipelinedBlockClient(srv.addr, timeout_ms=2000)
+    assert client.use_shm
+    assert client.read()[0, 0] == 1
+    # The second block was already requested while the first was processed.
+    assert client.read()[0, 0] == 2
+    # The prefetched third block was taken with the old shots and is dropped.
+    assert client.command("set_shots", 20) == 20
+    block = client.read()
+    assert block.shape == (20, 4)
+    assert block[0, 0] == 4
+    # After a move the block in flight is dropped, too
+    client.invalidate()
+    assert client.read()[0, 0] == 6
+    assert client.command("quit") == "quitting"
+    thr.join()
+    # The block in flight while quitting is still delivered.
+    assert client.read()[0, 0] == 7
+    client.timeout_ms = 50
+    with pytest.raises(TimeoutError):
+        client.read()
+    del block
+    client.close()
@@ -0,0 +1,61 @@
+import queue
+import threading
+
+import numpy as np
+import pytest
+
+from MessPy.Instruments.shot_ring import ShotRing
+
+
+class FakeDriver:
+    """Calls `add_shot` like the driver callback, each block is armed by `arm`."""
+
+    def __init__(self, shots):
+        self.armed = 0
+        self.n = 0
+        self.ring = ShotRing(shots=shots, pixel=8, n_buffers=4, on_block=self.arm)
+
+    def arm(self):
+        self.armed += 1
+
+    def run_blocks(self, n_blocks):
+        for _ in range(n_blocks * self.ring.shots):
+            self.ring.add_shot(np.full(8, self.n), self.n % 2)
+            self.n += 1
+
+
+def test_full_queue_drops_blocks():
+    drv = FakeDriver(shots=4)
+    drv.run_blocks(10)
+    assert drv.armed == 10
+    assert drv.ring.dropped_blocks == 8
+    first, aux = drv.ring.next_block(timeout=0.1)
+    second, _ = drv.ring.next_block(timeout=0.1)
+    # The queued blocks were not overwritten by the dropped ones.
+    np.testing.assert_array_equal(first[:, 0], np.arange(4))
+    np.testing.assert_array_equal(aux, [0, 1, 0, 1])
+    np.testing.assert_array_equal(second[:, 0], np.arange(4, 8))
+    # The returned copies stay valid while the ring is reused.
+    drv.run_blocks(4)
+    np.testing.assert_array_equal(first[:, 0], np.arange(4))
+    assert drv.ring.dropped_blocks == 10
+    for start in (40, 44):
+        block, _ = drv.ring.next_block(timeout=0.1)
+        np.testing.assert_array_equal(block[:, 0], start + np.arange(4))
+    with pytest.raises(queue.Empty):
+        drv.ring.next_block(timeout=0.05)
+
+
+def test_discard_skips_partial_block():
+    drv = FakeDriver(shots=4)
+    drv.run_blocks(1)
+    drv.ring.add_shot(np.full(8, -1.0))
+    drv.ring.discard()
+    # Completes the block started before the discard.
+    for _ in range(3):
+        drv.ring.add_shot(np.full(8, -1.0))
+    th = threading.Thread(target=drv.run_blocks, args=(1,))
+    th.start()
+    block, _ = drv.ring.next_block(timeout=1)
+    th.join()
+    np.testing.assert_array_equal(block[:, 0], np.arange(4, 8))
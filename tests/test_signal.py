@@ -1,10 +1,20 @@
 from MessPy.Instruments.signal_processing import (
     first,
+    check_pattern,
     fast_stats,
     fast_stats2d,
     fast_signal,
     fast_signal2d,
     fast_col_mean,
+    downsample_lines,
+    n_rejected,
+    outlier_mask,
+    KERNEL_SIGNATURES,
+    Reading,
+    Reading2D,
+    Spectrum,
+    warmup,
+    _aot,
 )
 import numpy as np
 from numpy.testing import assert_almost_equal
@@ -27,6 +37,18 @@ def test_first():
     assert first(arr, 4) == 5000
 
 
+def test_check_pattern():
+    chopper = np.tile([0.0, 4.0], 10)
+    assert check_pattern(chopper, 2, first(chopper, 1)) is None
+    # A lost trigger shifts the phase of the rest of the block
+    lost = np.delete(chopper, 7)
+    assert "first at shot 7" in check_pattern(lost, 2, first(lost, 1))
+    marker = np.zeros(24)
+    marker[2::4] = 3
+    assert check_pattern(marker, 4, 2) is None
+    assert check_pattern(marker, 4, 0) is not None
+
+
 def classic1d(x):
     mean, std, mi, ma = x.mean(), x.std(), x.min(), x.max()
     return mean, std, mi, ma
@@ -99,3 +121,136 @@ def test_col_mean():
     idx2 = np.tile(idx[..., None], arr.shape[2])
     true_val = np.average(arr, axis=0, weights=idx2)
     assert_almost_equal(true_val, fast_col_mean(arr, idx))
+
+
+def test_reject_outliers():
+    rng = np.random.default_rng(1)
+    arr = 100 + rng.normal(size=(128, 1001))
+    # Pumped shots are a bit darker, which must not count as outliers
+    arr[:, ::2] *= 0.99
+    arr[:, 7] += 5
+    arr[3, 500] = np.nan
+    keep = outlier_mask(arr, 5)
+    assert keep.dtype == bool and keep.shape == (1001,)
+    assert not keep[[6, 7, 500, 501, 1000]].any()
+    assert keep.sum() == 1001 - 5
+    np.testing.assert_array_equal(keep[::2][:500], keep[1::2])
+    # The unpaired last shot is not an outlier
+    assert n_rejected(keep) == 4
+    assert outlier_mask(arr, 0).all()
+
+    # An outlier in any line rejects the shot
+    ref = 100 + rng.normal(size=(128, 1001))
+    ref[:, 300] -= 5
+    keep = outlier_mask((arr, ref), 5)
+    assert not keep[[6, 7, 300, 301]].any()
+    assert n_rejected(keep) == 6
+
+
+def test_downsample_lines():
+    raw = np.random.randint(0, 2**16, (50, 2, 2400)).astype(np.uint16)
+    out = np.empty((2, 50, 390))
+    downsample_lines(raw, out, 100, 5, 400)
+    for line in range(2):
+        x = raw[:, line, 100:-100].reshape(50, -1, 5).mean(-1)
+        x = x - x[:, 400:].mean(keepdims=True)
+        assert_almost_equal(out[line], x[:, :390])
+
+
+def test_reading_stacks_lazily():
+    lines = [np.random.random((128, 50)) for _ in range(3)]
+    rd = Reading(
+        lines=np.zeros((3, 128)), stds=np.zeros((3, 128)), signals=np.zeros((1, 128)),
+        full_data=lines, shots=50, valid=True,
+    )
+    assert all(a is b for a, b in zip(rd.line_data, lines))
+    full = rd.full_data
+    assert full.shape == (3, 128, 50) and rd.full_data is full
+    np.testing.assert_array_equal(full[1], lines[1])
+
+
+def test_float32_precision(monkeypatch):
+    from MessPy.Config import config
+
+    rng = np.random.default_rng(0)
+    # 14 bit counts with a 1e-3 pump-probe modulation
+    data = rng.normal(8000, 30, size=(128, 2000))
+    data[:, ::2] *= 1.001
+    ref = Spectrum.create(data, frames=2, first_frame=0)
+    monkeypatch.setattr(config, "precision", "float32")
+    spec = Spectrum.create(data, frames=2, first_frame=0)
+    assert spec.data.dtype == spec.frame_data.dtype == np.float32
+    np.testing.assert_allclose(spec.mean, ref.mean, rtol=1e-6)
+    np.testing.assert_allclose(spec.std, ref.std, rtol=1e-4)
+    np.testing.assert_allclose(spec.signal, ref.signal, atol=1e-3)
+
+    t2 = np.arange(1000) * 0.02
+    ifr = np.cos(2 * np.pi * 1.5 * t2)[None, :] * np.exp(-t2 / 5) * 1e3
+    ifr = np.repeat(ifr, 128, 0)
+    r64 = Reading2D(spectra=ref, interferogram=ifr, t2_ps=t2)
+    r32 = Reading2D(spectra=spec, interferogram=ifr.astype(np.float32), t2_ps=t2)
+    assert r32.signal_2D.dtype == np.float32
+    err = np.abs(r32.signal_2D - r64.signal_2D).max()
+    assert err < 1e-5 * np.abs(r64.signal_2D).max()
+    monkeypatch.setattr(config, "precision", "float64")
+    # Float32 lines of the cams are not widened
+    assert Spectrum.create(spec.data).data is spec.data
+
+
+@pytest.mark.skipif(_aot is not None, reason="AOT kernels are not jitted")
+def test_warmup_covers_readings():
+    warmup()
+    compiled = {k: len(k.signatures) for k in KERNEL_SIGNATURES}
+    # The calls of the cams for a reading, see PhaseTecCam and ESLS
+    frames = np.random.randint(0, 2**14, (50, 128, 128)).astype(np.uint16)
+    valid = frames[:, 10:15, :].mean(0) > 100
+    for arr in (frames, frames.astype(np.float32), frames.astype(np.float64)):
+        fast_col_mean(arr[:, 10:15, :], valid)
+    ch = np.random.random((3, 50))
+    first(ch[0], 1)
+    Spectrum.create(np.random.random((128, 50)).astype(np.float32), frames=2, first_frame=0)
+    raw = np.random.randint(0, 2**16, (50, 2, 2400)).astype(np.uint16)
+    for dtype in (np.float32, np.float64):
+        downsample_lines(raw, np.empty((2, 50, 390), dtype=dtype), 100, 5, 400)
+    fast_signal2d(np.random.random((128, 50)))
+    assert {k: len(k.signatures) for k in KERNEL_SIGNATURES} == compiled
+
+
+@pytest.fixture
+def two_d_spectra():
+    # Two probe lines with 128 pixels, 400 t1 points and two frames each
+    rng = np.random.default_rng(2)
+    t1 = np.arange(400) * 0.02
+    specs = []
+    for _ in range(2):
+        f = 1000 + rng.normal(size=(128, 800))
+        f[:, ::2] *= 1 + 1e-3 * np.cos(2 * np.pi * 1.5 * t1) * np.exp(-t1 / 3)
+        specs.append(Spectrum(f, f.mean(1), f.std(1), None, frame_data=f))
+    return specs, t1
+
+
+def classic_2d(specs, t1):
+    out = []
+    for s in specs:
+        a = Reading2D.calc_interferogram(s, t1)
+        a[:, 0] *= 0.5
+        a = a * np.hanning(a.shape[1] * 2)[None, a.shape[1]:]
+        out.append(np.fft.rfft(a, a.shape[1] * 2, 1).real)
+    return out
+
+
+def test_classic_2d(two_d_spectra, benchmark):
+    benchmark(classic_2d, *two_d_spectra)
+
+
+def test_fast_2d(two_d_spectra, benchmark):
+    specs, t1 = two_d_spectra
+    readings = benchmark(Reading2D.from_spectra, specs, t1, 0, False)
+    for r, expected in zip(readings, classic_2d(specs, t1)):
+        assert_almost_equal(r.signal_2D, expected)
+        assert r.freqs.shape == (r.signal_2D.shape[1],)
+    single = Reading2D.from_spectrum(specs[1], t1, 0, False)
+    assert_almost_equal(single.signal_2D, readings[1].signal_2D)
+    # 400 * 3 points are padded to a size that is fast to transform
+    padded = Reading2D.from_spectrum(specs[0], t1, 0, False, upsample=3, fast_len=True)
+    assert padded.n_fft >= 1200 and padded.freqs.shape == (padded.signal_2D.shape[1],)
@@ -0,0 +1,77 @@
+import h5py
+import numpy as np
+import pytest
+from pytest import fixture
+
+from MessPy.Config import config
+from MessPy.ControlClasses import Controller
+from MessPy.Plans.SignalImagePlan import SignalImagePlan
+
+
+@fixture
+def controller(qtbot):
+    return Controller()
+
+
+def make_plan(controller, **kwargs):
+    x = np.arange(4) * 0.1
+    y = np.arange(3) * 0.1
+    X, Y = np.meshgrid(x, y)
+    return SignalImagePlan(
+        name="test",
+        cam=controller.cam.cam,
+        wavelengths=controller.cam.wavelengths,
+        xy_stage=controller.sample_holder,
+        positions=np.dstack((X, Y)),
+        shots=10,
+        **kwargs,
+    )
+
+
+def run(plan):
+    gen = plan.make_step_generator()
+    for _ in gen:
+        pass
+
+
+def test_point_scan(controller, tmp_path):
+    config.data_directory = tmp_path
+    plan = make_plan(controller, max_scan=3)
+    run(plan)
+    with h5py.File(plan.get_file_name()[0], "r") as f:
+        data = f["data"][...]
+        assert data.shape[:3] == (3, 3, 4)
+        np.testing.assert_allclose(f["mean"][...], data.mean(0))
+    np.testing.assert_allclose(plan.mean_signal, data.mean(0))
+    assert np.all(data != 0)
+
+
+def test_fly_scan(controller, tmp_path):
+    config.data_directory = tmp_path
+    plan = make_plan(controller, fly_scan=True, fly_turn_time=0.02, max_scan=1)
+    run(plan)
+    assert plan.fly_speed > 0
+    # Most pixels got at least one block, the edge pixels may be missed.
+    assert (plan.block_counts > 0).sum() >= 8
+    filled = plan.block_counts > 0
+    assert np.all(plan.mean_signal[filled] != 0)
+
+
+def test_fly_scan_raises_cam_error(controller, tmp_path, monkeypatch):
+    config.data_directory = tmp_path
+    plan = make_plan(controller, fly_scan=True, fly_speed=0.5, fly_turn_time=0.02)
+
+    def broken_reading():
+        raise IOError("cam lost")
+
+    monkeypatch.setattr(plan.cam, "make_reading", broken_reading)
+    with pytest.raises(IOError, match="cam lost"):
+        run(plan)
+
+
+def test_fly_scan_single_column_needs_speed(controller, tmp_path):
+    config.data_directory = tmp_path
+    plan = make_plan(controller, fly_scan=True)
+    plan.positions = plan.positions[:, :1]
+    with pytest.raises(ValueError, match="fly_speed"):
+        run(plan)
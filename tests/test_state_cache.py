@@ -0,0 +1,49 @@
+import threading
+import time
+
+import attr
+
+from MessPy.Instruments.mocks import DelayLineMock, RotStageMock
+
+
+@attr.s(auto_attribs=True)
+class SlowDelayLine(DelayLineMock):
+    name: str = "SlowDelayLine"
+    queries: int = 0
+
+    def get_pos_mm(self):
+        self.queries += 1
+        time.sleep(0.02)
+        return self.pos_mm
+
+
+def test_concurrent_readers_share_query():
+    dl = SlowDelayLine()
+    dl.state_cache.ttl["get_pos_mm"] = 1.0
+    threads = [threading.Thread(target=dl.get_pos_fs) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert dl.queries == 1
+    dl.get_pos_mm()
+    assert dl.queries == 1
+
+
+def test_motion_invalidates():
+    dl = SlowDelayLine()
+    dl.state_cache.ttl["get_pos_mm"] = 1.0
+    assert dl.get_pos_mm() == 0
+    dl.move_mm(2.0)
+    assert dl.get_pos_mm() == 2.0
+    assert dl.queries == 2
+
+
+def test_signal_feeds_cache():
+    rs = RotStageMock()
+    rs.state_cache.ttl["get_degrees"] = 1.0
+    rs.sigDegreesChanged.emit(12.0)
+    assert rs.get_degrees() == 12.0
+    assert rs.state_cache.misses == 0
+    rs.set_degrees(20)
+    assert rs.get_degrees() == 20
@@ -0,0 +1,51 @@
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+from MessPy.tracing import Tracer
+
+
+def test_disabled_records_nothing():
+    t = Tracer()
+
+    @t.traced("f")
+    def f(x):
+        return 2 * x
+
+    with t.span("block"):
+        assert f(2) == 4
+    t.track(Future(), "move")
+    assert len(t.events) == 0
+
+
+def test_spans_and_chrome_export(tmp_path):
+    t = Tracer(enabled=True, capacity=5)
+
+    @t.traced(cat="test")
+    def work():
+        time.sleep(0.01)
+
+    with t.span("outer", "test", point=1):
+        work()
+    th = threading.Thread(target=work, name="worker")
+    th.start()
+    th.join()
+    fut = t.track(Future(), "move", "motion")
+    fut.set_result(None)
+
+    names = [e[0] for e in t.events]
+    assert names == [work.__qualname__, "outer", work.__qualname__, "move"]
+    trace = json.loads(t.export_chrome(tmp_path / "trace.json").read_text())
+    spans = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+    outer = next(e for e in spans if e["name"] == "outer")
+    inner = spans[0]
+    assert outer["ts"] <= inner["ts"] and inner["dur"] >= 10_000
+    assert outer["args"] == {"point": "1"}
+    thread_names = {e["args"]["name"] for e in trace["traceEvents"] if e["ph"] == "M"}
+    assert "worker" in thread_names
+
+    for i in range(10):
+        with t.span(f"s{i}"):
+            pass
+    assert len(t.events) == 5
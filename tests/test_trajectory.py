@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from MessPy.Instruments.mocks import StageMock
+from MessPy.Instruments.trajectory import (
+    LissajousTrajectory,
+    RasterTrajectory,
+    SerpentineTrajectory,
+    SpiralTrajectory,
+)
+
+
+def test_serpentine():
+    traj = SerpentineTrajectory(0, 1, 0, 2, n_lines=3, speed=10, t_turn=0.1)
+    assert traj.duration == pytest.approx(0.5)
+    t = np.array([0, 0.1, 0.15, 0.25, 0.5])
+    pos = traj.positions(t)
+    np.testing.assert_allclose(pos[:, 0], [0, 1, 1, 0.5, 1])
+    np.testing.assert_allclose(pos[:, 1], [0, 0, 0.5, 1, 2])
+    np.testing.assert_array_equal(traj.line_of(t), [0, 0, -1, 1, 2])
+
+
+def test_raster_flyback():
+    traj = RasterTrajectory(0, 1, 0, 1, n_lines=2, speed=10, flyback_speed=20)
+    pos = traj.positions(np.array([0.1, 0.125, 0.15, 0.25]))
+    np.testing.assert_allclose(pos, [[1, 0], [0.5, 0.5], [0, 1], [1, 1]], atol=1e-12)
+
+
+def test_lissajous_spiral():
+    circle = LissajousTrajectory(amp=(1, 1), freq=(1, 1))
+    r = np.hypot(*circle.positions(np.linspace(0, 1, 20)).T)
+    np.testing.assert_allclose(r, 1)
+    spiral = SpiralTrajectory(r_max=1, pitch=0.1, speed=5)
+    end = spiral.positions(np.array([spiral.duration, 2 * spiral.duration]))
+    np.testing.assert_allclose(np.hypot(*end.T), 1)
+
+
+def test_runner_stage_mock():
+    stage = StageMock()
+    traj = SerpentineTrajectory(0, 0.2, 0, 0.1, n_lines=2, speed=2, t_turn=0.02)
+    runner = stage.run_trajectory(traj, rate=200)
+    n = runner.future.result(5)
+    log = runner.log()
+    assert n == len(log["times"]) > 10
+    assert np.all(np.diff(log["times"]) > 0)
+    np.testing.assert_allclose(log["actual"], log["setpoints"])
+    t_mid = runner.t0 + traj.t_line / 2
+    np.testing.assert_allclose(runner.positions_at([t_mid])[0], [0.1, 0], atol=0.02)
+    assert stage.get_pos_mm() == pytest.approx((0, 0.1))
+
+
+def test_runner_stop():
+    stage = StageMock()
+    runner = stage.run_trajectory(LissajousTrajectory(amp=(1, 1), freq=(1, 1)))
+    stage.stop_trajectory()
+    assert runner.future.done()